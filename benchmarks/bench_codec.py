@@ -0,0 +1,73 @@
+"""Benchmark: JSON backends on multi-MB turn payloads.
+
+For each backend available to ``aye.codec`` (orjson, stdlib) and each
+payload size, times the four JSON steps of a turn:
+
+* encode: the streamed ``cli_invoke`` request body (``api.iter_json_body``);
+* response: decoding the response envelope;
+* answer: decoding the ``assistant_response`` string inside it;
+* metadata: writing and reading a snapshot ``metadata.json``.
+
+    python benchmarks/bench_codec.py --sizes-mb 1,8,32
+"""
+import argparse
+import time
+from typing import Any, Callable, Dict, List
+
+from aye import api, codec
+
+
+def make_payload(size_mb: float, file_bytes: int = 8 * 1024) -> Dict[str, Any]:
+    """A request with about *size_mb* MB of Python-like sources, some non-ASCII."""
+    body = "".join(f"def func_{i}(x):\n    return x + {i}  # café ü\n" for i in range(file_bytes // 40))
+    files = max(1, int(size_mb * 1024 * 1024) // len(body))
+    return {"user_id": "bench", "chat_id": -1, "message": "benchmark",
+            "source_files": {f"src/pkg{i // 100}/mod{i}.py": body for i in range(files)}}
+
+
+def make_response(payload: Dict[str, Any]) -> bytes:
+    """The response envelope echoing every source, as the server sends it."""
+    answer = {"answer_summary": "done",
+              "source_files": [{"file_name": p, "file_content": c} for p, c in payload["source_files"].items()]}
+    return codec.dumpb({"chat_id": 1, "assistant_response": codec.dumps(answer)})
+
+
+def _best(fn: Callable[[], Any], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes-mb", default="1,8,32", help="comma-separated payload sizes")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    sizes: List[float] = [float(s) for s in args.sizes_mb.split(",") if s.strip()]
+    backends = [b for b in codec.BACKENDS if b != "orjson" or codec.orjson is not None]
+    default = codec.backend
+
+    print(f"{'MB':>6} {'backend':>8} {'encode':>9} {'response':>9} {'answer':>9} {'metadata':>9}   (best ms)")
+    for size in sizes:
+        payload = make_payload(size)
+        raw = make_response(payload)
+        meta = {"timestamp": "20260101T000000",
+                "files": [{"original": p, "snapshot": f"snap/{p}"} for p in payload["source_files"]]}
+        for name in backends:
+            codec.set_backend(name)
+            envelope = codec.loads(raw)
+            row = [
+                _best(lambda: b"".join(api.iter_json_body(payload)), args.repeat),
+                _best(lambda: codec.loads(raw), args.repeat),
+                _best(lambda: codec.loads(envelope["assistant_response"]), args.repeat),
+                _best(lambda: codec.loads(codec.dumpb(meta, indent=True)), args.repeat),
+            ]
+            print(f"{size:6.0f} {name:>8}" + "".join(f"{t * 1000:9.1f}" for t in row))
+    codec.set_backend(default)
+
+
+if __name__ == "__main__":
+    main()
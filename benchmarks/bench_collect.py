@@ -0,0 +1,116 @@
+"""Benchmark: single-pass pruning walk vs. the previous per-mask ``rglob``.
+
+Builds a synthetic project with a small source tree next to a large vendored
+dependency directory (ignored via ``.gitignore``) and a hidden virtualenv,
+then times both collection strategies. With ``--git`` the tree is also
+committed to a repository and enumeration by walk is compared with
+enumeration from ``.git/index`` (whose untracked scan re-lists only
+directories modified since the previous call).
+
+    python benchmarks/bench_collect.py --vendored 50000 --masks "*.py,*.js,*.ts"
+    python benchmarks/bench_collect.py --sources 20000 --git
+"""
+import argparse
+import subprocess
+import tempfile
+import time
+from itertools import chain
+from pathlib import Path
+from typing import Dict, List
+
+from aye.ignore import IgnoreMatcher
+from aye.source_collector import _enumerate_git, _enumerate_walk, _is_hidden, collect_sources
+
+
+def build_tree(root: Path, sources: int, vendored: int) -> None:
+    (root / ".gitignore").write_text("node_modules/\n__pycache__/\n")
+    for i in range(sources):
+        pkg = root / "src" / f"pkg{i % 20}"
+        pkg.mkdir(parents=True, exist_ok=True)
+        (pkg / f"mod{i}.py").write_text(f"def f{i}():\n    return {i}\n")
+    for i in range(vendored):
+        pkg = root / "node_modules" / f"dep{i % 500}" / "lib"
+        pkg.mkdir(parents=True, exist_ok=True)
+        ext = (".js", ".ts", ".py")[i % 3]
+        (pkg / f"file{i}{ext}").write_text("module.exports = {};\n")
+    for i in range(vendored // 5):
+        pkg = root / ".venv" / "lib" / f"site{i % 100}"
+        pkg.mkdir(parents=True, exist_ok=True)
+        (pkg / f"vendored{i}.py").write_text("x = 1\n")
+
+
+def legacy_collect(root: Path, file_mask: str) -> Dict[str, str]:
+    """The previous strategy: one full rglob per mask, filtering afterwards."""
+    matcher = IgnoreMatcher(root)
+    masks = [m.strip() for m in file_mask.split(",") if m.strip()]
+    sources: Dict[str, str] = {}
+    for path in set(chain.from_iterable(root.rglob(m) for m in masks)):
+        rel = path.relative_to(root)
+        if _is_hidden(rel) or not path.is_file():
+            continue
+        if matcher.is_ignored(rel.as_posix()):
+            continue
+        sources[rel.as_posix()] = path.read_text(encoding="utf-8")
+    return sources
+
+
+def _best_of(fn, repeat: int) -> float:
+    timings: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sources", type=int, default=500, help="project source files")
+    parser.add_argument("--vendored", type=int, default=30000, help="files under node_modules/")
+    parser.add_argument("--masks", default="*.py,*.js,*.ts")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--git", action="store_true", help="also compare walk and git index enumeration")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        print(f"Building tree: {args.sources} sources, {args.vendored} vendored files ...")
+        build_tree(root, args.sources, args.vendored)
+
+        legacy = legacy_collect(root, args.masks)
+        current = collect_sources(str(root), args.masks)
+        assert legacy == current, "strategies disagree on the collected files"
+
+        t_legacy = _best_of(lambda: legacy_collect(root, args.masks), args.repeat)
+        t_walk = _best_of(lambda: collect_sources(str(root), args.masks), args.repeat)
+
+        print(f"files collected : {len(current)}")
+        print(f"per-mask rglob  : {t_legacy * 1000:9.1f} ms")
+        print(f"pruning walk    : {t_walk * 1000:9.1f} ms")
+        print(f"speedup         : {t_legacy / t_walk:9.1f}x")
+
+        if args.git:
+            bench_git(root, args)
+
+
+def bench_git(root: Path, args: argparse.Namespace) -> None:
+    subprocess.run(["git", "init", "-q"], cwd=root, check=True)
+    subprocess.run(["git", "add", "-A"], cwd=root, check=True)
+    (root / "src" / "untracked.py").write_text("x = 1\n")
+    time.sleep(2.1)  # Directory listings this fresh are not cached
+    masks = [m.strip() for m in args.masks.split(",") if m.strip()]
+    matcher = IgnoreMatcher(root)
+
+    def paths(candidates):
+        return sorted(c[0] for c in candidates)
+
+    assert paths(_enumerate_walk(root, masks, matcher, True)) == paths(_enumerate_git(root, masks, matcher, True))
+    t_walk = _best_of(lambda: _enumerate_walk(root, masks, matcher, True), args.repeat)
+    t_git = _best_of(lambda: _enumerate_git(root, masks, matcher, True), args.repeat)
+    print(f"enumerate, walk : {t_walk * 1000:9.1f} ms")
+    print(f"enumerate, git  : {t_git * 1000:9.1f} ms")
+    print(f"speedup         : {t_walk / t_git:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
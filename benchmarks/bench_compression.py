@@ -0,0 +1,62 @@
+"""Benchmark: upload time of compressed vs. uncompressed request bodies.
+
+Sends the same ``cli_invoke`` payload (the sources of a real tree: the aye
+package plus part of the standard library by default) to the local stand-in
+backend over a throttled uplink, once per request encoding.
+
+    python benchmarks/bench_compression.py --uplink-mbit 20 ~/src/myproject
+"""
+import argparse
+import sysconfig
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import aye
+from aye import api, config
+from aye.source_collector import collect_sources
+
+from mock_backend import MockBackend
+
+
+def _collect(roots: List[Path]) -> Dict[str, str]:
+    sources: Dict[str, str] = {}
+    for root in roots:
+        for path, content in collect_sources(str(root), "*.py", skipped={}).items():
+            sources[f"{root.name}/{path}"] = content
+    return sources
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("roots", nargs="*", type=Path, help="trees whose sources make up the payload")
+    parser.add_argument("--uplink-mbit", type=float, default=20.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    stdlib = Path(sysconfig.get_paths()["stdlib"])
+    roots = args.roots or [Path(aye.__file__).resolve().parent, stdlib / "asyncio", stdlib / "email"]
+    sources = _collect([r.expanduser().resolve() for r in roots])
+
+    with MockBackend(uplink_mbit=args.uplink_mbit) as backend:
+        api.BASE_URL = backend.url
+        api._auth_header = {"Authorization": "Bearer benchmark"}
+        print(f"{len(sources)} files, uplink {args.uplink_mbit} Mbit/s, encodings {backend.encodings}")
+        print(f"{'encoding':>10} {'best ms':>10} {'speedup':>8}")
+        baseline = None
+        for encoding in ("none",) + backend.encodings:
+            # In-memory only: nothing is written to .aye/config.json
+            config._config["upload_compression"] = encoding
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                api.cli_invoke(message="benchmark", source_files=sources)
+                timings.append(time.perf_counter() - start)
+            best = min(timings)
+            baseline = baseline or best
+            print(f"{encoding:>10} {best * 1000:10.0f} {baseline / best:7.1f}x")
+        api.close_clients()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Benchmark: ``source_files`` payload in "full" vs. "outline" context mode.
+
+Collects the Python files of one or more real repositories (the aye source
+tree and the standard library by default) and reports the JSON payload size
+with every file in full against the payload with all but the focus files
+replaced by their outlines.
+
+    python benchmarks/bench_outline.py ~/src/django ~/src/requests --focus 5
+"""
+import argparse
+import json
+import sysconfig
+import time
+from pathlib import Path
+from typing import List
+
+import aye
+from aye.outline import _cache, outline_sources
+from aye.source_collector import collect_sources
+
+
+def _payload_bytes(sources) -> int:
+    return len(json.dumps(sources).encode("utf-8"))
+
+
+def bench_repo(root: Path, focus: int) -> None:
+    sources = collect_sources(str(root), "*.py", skipped={})
+    if not sources:
+        print(f"{root}: no Python files")
+        return
+    # Largest files as focus: the least favourable case for outlining
+    focus_set = set(sorted(sources, key=lambda p: -len(sources[p]))[:focus])
+
+    _cache.clear()
+    start = time.perf_counter()
+    outlined = outline_sources(sources, focus_set)
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    outline_sources(sources, focus_set)
+    warm = time.perf_counter() - start
+
+    full_bytes = _payload_bytes(sources)
+    outline_bytes = _payload_bytes(outlined)
+    print(f"{root}")
+    print(f"  files           : {len(sources)} ({len(focus_set)} in focus)")
+    print(f"  full payload    : {full_bytes / 1024:10.1f} KiB")
+    print(f"  outline payload : {outline_bytes / 1024:10.1f} KiB")
+    print(f"  reduction       : {full_bytes / outline_bytes:10.1f}x")
+    print(f"  outline cold    : {cold * 1000:10.1f} ms")
+    print(f"  outline cached  : {warm * 1000:10.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("roots", nargs="*", type=Path, help="repositories to measure")
+    parser.add_argument("--focus", type=int, default=5, help="files kept in full")
+    args = parser.parse_args()
+
+    roots: List[Path] = args.roots or [
+        Path(aye.__file__).resolve().parent,
+        Path(sysconfig.get_paths()["stdlib"]) / "asyncio",
+        Path(sysconfig.get_paths()["stdlib"]) / "email",
+    ]
+    for root in roots:
+        bench_repo(root.expanduser().resolve(), args.focus)
+
+
+if __name__ == "__main__":
+    main()
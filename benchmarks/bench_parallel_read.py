@@ -0,0 +1,59 @@
+"""Benchmark: wall-clock time of collect_sources versus reader thread count.
+
+Local disks answer from the page cache in microseconds, so per-file latency
+of a network filesystem is emulated by sleeping inside each read (the sleep
+releases the GIL exactly like a blocking NFS ``read`` would).
+
+    python benchmarks/bench_parallel_read.py --files 2000 --latency-ms 2
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from aye import source_collector
+from aye.source_collector import collect_sources
+
+
+def build_tree(root: Path, files: int) -> None:
+    for i in range(files):
+        pkg = root / f"pkg{i % 50}"
+        pkg.mkdir(parents=True, exist_ok=True)
+        (pkg / f"mod{i}.py").write_text(f"VALUE_{i} = {i}\n" * 40)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="emulated per-file read latency")
+    parser.add_argument("--workers", default="1,2,4,8,16,32")
+    args = parser.parse_args()
+
+    read_file = source_collector._read_file
+
+    def slow_read_file(path, *rest):
+        time.sleep(args.latency_ms / 1000)
+        return read_file(path, *rest)
+
+    source_collector._read_file = slow_read_file
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        build_tree(root, args.files)
+        baseline = None
+        reference = None
+        print(f"{args.files} files, {args.latency_ms} ms emulated latency per read")
+        print(f"{'workers':>8} {'wall ms':>10} {'speedup':>8}")
+        for workers in (int(w) for w in args.workers.split(",")):
+            start = time.perf_counter()
+            sources = collect_sources(str(root), "*.py", max_workers=workers)
+            elapsed = time.perf_counter() - start
+            if reference is None:
+                reference, baseline = sources, elapsed
+            # Output must be identical (content and key order) for every worker count
+            assert list(sources.items()) == list(reference.items())
+            print(f"{workers:>8} {elapsed * 1000:>10.1f} {baseline / elapsed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Benchmark: peak memory of building the ``cli_invoke`` request body.
+
+Compares the previous path (every file read into a string, then the whole
+payload serialized into one bytes object, as ``httpx``'s ``json=`` does)
+with lazy references for large files and the streaming body encoder.
+Memory is measured with ``tracemalloc``, so only Python allocations count.
+
+    python benchmarks/bench_payload_memory.py --files 40 --file-kib 768
+"""
+import argparse
+import json
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from aye.api import iter_json_body
+from aye.source_collector import collect_sources
+
+
+def build_tree(root: Path, files: int, file_kib: int) -> None:
+    line = "def handler(request):  # padding padding padding padding\n"
+    body = line * (file_kib * 1024 // len(line))
+    for i in range(files):
+        (root / f"module{i}.py").write_text(body)
+
+
+def _measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, peak, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--file-kib", type=int, default=768, help="size of each file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        build_tree(root, args.files, args.file_kib)
+        limits = dict(max_file_bytes=2 ** 30, max_total_bytes=2 ** 40, skipped={})
+
+        def eager() -> int:
+            sources = collect_sources(str(root), "*.py", lazy_bytes=2 ** 30, **limits)
+            payload = {"chat_id": -1, "message": "hi", "source_files": sources}
+            return len(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+        def streamed() -> int:
+            sources = collect_sources(str(root), "*.py", **limits)
+            payload = {"chat_id": -1, "message": "hi", "source_files": sources}
+            return sum(len(chunk) for chunk in iter_json_body(payload))
+
+        size_a, peak_a, t_a = _measure(eager)
+        size_b, peak_b, t_b = _measure(streamed)
+        assert size_a == size_b, "encoders disagree on the payload size"
+
+        mib = 1024 * 1024
+        print(f"payload         : {size_a / mib:9.1f} MiB in {args.files} files")
+        print(f"eager peak      : {peak_a / mib:9.1f} MiB  ({t_a * 1000:.0f} ms)")
+        print(f"streamed peak   : {peak_b / mib:9.1f} MiB  ({t_b * 1000:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Benchmark: snapshot disk usage and time over many AI turns.
+
+Simulates --turns turns on a synthetic project. Each turn rewrites a few
+lines in --edits of the --files modules, and every --revert-every turns
+one file is reverted to an earlier version. The same edit sequence is
+replayed against:
+
+* legacy: the version 1 layout (a full copy of every changed file per
+  batch, plus a ``latest/`` copy of the newest batch);
+* store: ``snapshot.apply_updates`` over the content-addressed store;
+* deltas: the same with ``snapshot_delta_depth`` set (reverse deltas);
+* packed: the store with ``snapshot_auto_pack`` set (cold batches in packs).
+
+Reports bytes and files on disk, the mean / p95 snapshot time and the
+mean time of ``restore_snapshot`` over --restores batches spread across
+the history (older batches of the deltas layout sit deeper in a chain).
+
+    python benchmarks/bench_snapshots.py --turns 1000 --files 20 --lines 2000 --delta-depth 16
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from aye import config, snapshot
+
+
+def make_module(index: int, lines: int) -> List[str]:
+    return [f"def func_{index}_{i}(x):  return x * {i}  # line {i}\n" for i in range(lines)]
+
+
+def legacy_apply(root: Path, updates: List[Dict[str, str]], ordinal: int) -> None:
+    """Snapshot and write the way version 1 did: copy into the batch and into latest/."""
+    ts = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    batch = root / f"{ordinal:03d}_{ts}"
+    batch.mkdir(parents=True)
+    files = [Path(u["file_name"]).resolve() for u in updates]
+    entries = []
+    for src in files:
+        shutil.copy2(src, batch / src.name)
+        entries.append({"original": str(src), "snapshot": str(batch / src.name)})
+    (batch / "metadata.json").write_text(json.dumps({"timestamp": ts, "files": entries}, indent=2))
+    latest = root / "latest"
+    if latest.exists():
+        shutil.rmtree(latest)
+    latest.mkdir()
+    for src in files:
+        shutil.copy2(src, latest / src.name)
+    for u in updates:
+        Path(u["file_name"]).write_text(u["file_content"])
+
+
+def disk_usage(root: Path) -> Dict[str, int]:
+    files = [p for p in root.rglob("*") if p.is_file()] if root.exists() else []
+    return {"bytes": sum(p.stat().st_size for p in files), "files": len(files)}
+
+
+def edit_plan(args: argparse.Namespace) -> List[List[Dict[str, str]]]:
+    """The per-turn updates, generated once so every layout sees the same turns."""
+    rng = random.Random(args.seed)
+    modules = {f"mod{i:03d}.py": make_module(i, args.lines) for i in range(args.files)}
+    history: Dict[str, List[str]] = {name: ["".join(lines)] for name, lines in modules.items()}
+    plan = []
+    for turn in range(args.turns):
+        updates = []
+        for name in rng.sample(sorted(modules), args.edits):
+            if args.revert_every and turn % args.revert_every == 0 and len(history[name]) > 2:
+                content = rng.choice(history[name][:-1])  # The assistant undoes an edit
+                modules[name] = content.splitlines(keepends=True)
+            else:
+                lines = modules[name]
+                for _ in range(3):
+                    lines[rng.randrange(len(lines))] = f"# turn {turn} edit {rng.random():.6f}\n"
+                content = "".join(lines)
+            history[name].append(content)
+            updates.append({"file_name": name, "file_content": content})
+        plan.append(updates)
+    return plan
+
+
+def run(name: str, plan: List[List[Dict[str, str]]], args: argparse.Namespace,
+        apply: Callable[[Path, List[Dict[str, str]], int], None]) -> None:
+    with tempfile.TemporaryDirectory(prefix="aye-bench-snap-") as tmp:
+        work = Path(tmp)
+        snap_root = work / ".aye" / "snapshots"
+        snapshot.SNAP_ROOT = snap_root
+        snapshot.LATEST_SNAP_DIR = snap_root / "latest"
+        for i in range(args.files):
+            (work / f"mod{i:03d}.py").write_text("".join(make_module(i, args.lines)))
+        cwd = os.getcwd()
+        os.chdir(work)
+        try:
+            timings = []
+            for turn, updates in enumerate(plan, start=1):
+                start = time.perf_counter()
+                apply(snap_root, updates, turn)
+                timings.append(time.perf_counter() - start)
+            usage = disk_usage(snap_root)
+            restores = []
+            step = max(len(plan) // max(args.restores, 1), 1)
+            for ordinal in range(1, len(plan) + 1, step):
+                start = time.perf_counter()
+                snapshot.restore_snapshot(str(ordinal))
+                restores.append(time.perf_counter() - start)
+        finally:
+            os.chdir(cwd)
+        p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+        print(f"{name:>8} {usage['bytes'] / 1e6:10.1f} {usage['files']:8} "
+              f"{statistics.mean(timings) * 1000:9.2f} {p95 * 1000:9.2f} "
+              f"{statistics.mean(restores) * 1000:10.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=1000)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--lines", type=int, default=2000, help="lines per module")
+    parser.add_argument("--edits", type=int, default=3, help="files edited per turn")
+    parser.add_argument("--revert-every", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--delta-depth", type=int, default=16, help="snapshot_delta_depth of the deltas layout")
+    parser.add_argument("--pack-every", type=int, default=50, help="snapshot_auto_pack of the packed layout")
+    parser.add_argument("--restores", type=int, default=50, help="batches restored per layout")
+    args = parser.parse_args()
+
+    plan = edit_plan(args)
+    print(f"{args.turns} turns, {args.edits} of {args.files} files x {args.lines} lines edited per turn")
+    print(f"{'layout':>8} {'MB':>10} {'files':>8} {'mean ms':>9} {'p95 ms':>9} {'restore ms':>10}")
+    run("legacy", plan, args, legacy_apply)
+    store_apply = lambda root, updates, turn: snapshot.apply_updates(updates)  # noqa: E731
+    config._config.pop("snapshot_delta_depth", None)
+    run("store", plan, args, store_apply)
+    config._config["snapshot_delta_depth"] = args.delta_depth  # In memory only, not saved
+    run("deltas", plan, args, store_apply)
+    config._config.pop("snapshot_delta_depth")
+    config._config["snapshot_auto_pack"] = args.pack_every
+    run("packed", plan, args, store_apply)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Benchmark: end-to-end chat turns against the local stand-in backend.
+
+Builds synthetic repositories (100, 10k and 100k files by default), then
+for each runs a few turns two ways:
+
+* stage by stage, to attribute time: collect (``collect_sources`` with the
+  session cache), encode (JSON body), network (POST and read the reply,
+  including the backend's emulated latency), parse, filter (compare edited
+  files with disk), snapshot and write (``apply_updates``);
+* end to end, through ``process_chat_message`` (collection and upload
+  overlap) followed by ``apply_updates``.
+
+    python benchmarks/bench_turn.py --sizes 100,10000 --latency 0.2 --uplink-mbit 50
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from aye import api, snapshot
+from aye.service import filter_unchanged_files, process_chat_message
+from aye.source_cache import SourceCache
+from aye.source_collector import collect_sources
+
+from mock_backend import MockBackend
+
+STAGES = ("collect", "encode", "network", "parse", "filter", "snapshot", "write")
+
+
+def build_repo(root: Path, files: int, file_bytes: int) -> None:
+    """Write *files* Python modules of about *file_bytes* each, 100 per package."""
+    body = "".join(f"def func_{i}(x):\n    return x + {i}\n\n" for i in range(max(1, file_bytes // 32)))
+    for i in range(files):
+        pkg = root / "src" / f"pkg{i // 100:04d}"
+        if i % 100 == 0:
+            pkg.mkdir(parents=True, exist_ok=True)
+        (pkg / f"mod{i:06d}.py").write_text(f'"""Module {i}."""\n' + body)
+
+
+def _timed(timings: Dict[str, float], stage: str, fn: Callable, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+    return result
+
+
+def staged_turn(root: Path, cache: SourceCache, prompt: str) -> Dict[str, float]:
+    """Run one turn one stage at a time and return ``{stage: seconds}``."""
+    timings: Dict[str, float] = {}
+    sources = _timed(timings, "collect", collect_sources, str(root), "*.py", cache=cache, skipped={})
+    payload = {"user_id": "bench", "chat_id": -1, "message": prompt, "source_files": sources}
+    body = _timed(timings, "encode", lambda: b"".join(api.iter_json_body(payload)))
+
+    def post() -> bytes:
+        resp = api.get_client().post(f"{api.BASE_URL}/invoke_cli", content=body,
+                                     headers={**api._auth_headers(), "Content-Type": "application/json"})
+        resp.raise_for_status()
+        return resp.content
+
+    raw = _timed(timings, "network", post)
+    answer = _timed(timings, "parse", lambda: json.loads(json.loads(raw)["assistant_response"]))
+    changed = _timed(timings, "filter", filter_unchanged_files, answer["source_files"])
+    paths = [Path(item["file_name"]) for item in changed]
+    if paths:
+        _timed(timings, "snapshot", snapshot.create_snapshot, paths)
+    start = time.perf_counter()
+    for item in changed:
+        Path(item["file_name"]).write_text(item["file_content"])
+    timings["write"] = time.perf_counter() - start
+    return timings
+
+
+def end_to_end_turn(root: Path, cache: SourceCache, prompt: str) -> Tuple[float, Dict[str, float]]:
+    """Run one turn like the REPL does; return its total and the pipeline's own timings."""
+    start = time.perf_counter()
+    result = process_chat_message(prompt, None, root, "*.py", cache=cache)
+    if result["changed_files"]:
+        snapshot.apply_updates(result["changed_files"])
+    return time.perf_counter() - start, result["timings"]
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:9.1f}"
+
+
+def run(size: int, args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory(prefix="aye-bench-") as tmp:
+        root = Path(tmp)
+        start = time.perf_counter()
+        build_repo(root, size, args.file_bytes)
+        print(f"\n{size} files ({time.perf_counter() - start:.1f} s to build)")
+        # Snapshots go into the throwaway repository, not the current project
+        snapshot.SNAP_ROOT = root / ".aye" / "snapshots"
+        snapshot.LATEST_SNAP_DIR = snapshot.SNAP_ROOT / "latest"
+        cwd = os.getcwd()
+        os.chdir(root)  # Answers name files relative to the repository
+        try:
+            cache = SourceCache(root / ".aye" / "source_cache.json")
+            print(f"{'turn':>6}" + "".join(f"{s:>10}" for s in STAGES) + f"{'e2e':>10}")
+            for turn in range(args.turns):
+                staged = staged_turn(root, cache, f"benchmark turn {turn}")
+                total, _ = end_to_end_turn(root, cache, f"benchmark turn {turn}")
+                print(f"{turn:>6}" + "".join(f"{_ms(staged.get(s, 0.0)):>10}" for s in STAGES)
+                      + f"{_ms(total):>10}")
+        finally:
+            os.chdir(cwd)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="100,10000,100000", help="comma-separated repository sizes")
+    parser.add_argument("--file-bytes", type=int, default=600)
+    parser.add_argument("--turns", type=int, default=3, help="turns per size; the first one is cold")
+    parser.add_argument("--latency", type=float, default=0.0, help="backend time to first byte (s)")
+    parser.add_argument("--uplink-mbit", type=float, default=None)
+    parser.add_argument("--downlink-mbit", type=float, default=None)
+    parser.add_argument("--answer-files", type=int, default=3)
+    args = parser.parse_args()
+    sizes: List[int] = [int(s) for s in args.sizes.split(",") if s.strip()]
+
+    with MockBackend(uplink_mbit=args.uplink_mbit, downlink_mbit=args.downlink_mbit,
+                     latency=args.latency, answer_files=args.answer_files) as backend:
+        api.BASE_URL = backend.url
+        api._auth_header = {"Authorization": "Bearer benchmark"}
+        print(f"latency {args.latency} s, uplink {args.uplink_mbit or '∞'} Mbit/s, times in ms")
+        for size in sizes:
+            run(size, args)
+        api.close_clients()
+
+
+if __name__ == "__main__":
+    main()
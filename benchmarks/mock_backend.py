@@ -0,0 +1,239 @@
+"""Local stand-in for the aye backend, with configurable latency and bandwidth.
+
+Implements just enough of the API for benchmarks and tests: ``POST
+/invoke_cli`` (plain, chunked, gzip or zstd request bodies, buffered or
+NDJSON-streamed answers), ``POST /plugins`` and ``GET /time``.
+
+* Request bodies are read at most at ``--uplink-mbit`` and responses
+  written at most at ``--downlink-mbit``.
+* ``--latency`` seconds pass before every response starts (the model's
+  "thinking" time).
+* The answer edits ``--answer-files`` of the uploaded files (appending a
+  line to each, so the client sees real changes) and pads the summary to
+  ``--summary-bytes``. ``--plugins``/``--plugin-bytes`` size the plugin
+  manifest.
+
+    python benchmarks/mock_backend.py --port 8765 --uplink-mbit 20 --latency 0.5
+
+Point the client at it by editing ``aye.api.BASE_URL`` (benchmarks do this
+in-process).
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+
+def _decoders() -> Dict[str, object]:
+    decoders = {"gzip": gzip.decompress}
+    try:
+        import zstandard
+        decoders["zstd"] = lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    except ImportError:
+        pass
+    return decoders
+
+
+class _Throttle:
+    """Token bucket shared by all connections: the emulated uplink."""
+
+    def __init__(self, bytes_per_second: Optional[float]):
+        self.rate = bytes_per_second
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def consume(self, n: int) -> None:
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._next = max(self._next, now) + n / self.rate
+            delay = self._next - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive
+    server: "MockBackend"
+
+    def log_message(self, format, *args):  # noqa: A002 - quiet by default
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _read(self, n: int) -> bytes:
+        parts: List[bytes] = []
+        while n > 0:
+            block = self.rfile.read(min(n, 16 * 1024))
+            if not block:
+                break
+            self.server.throttle.consume(len(block))
+            parts.append(block)
+            n -= len(block)
+        return b"".join(parts)
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            parts: List[bytes] = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return b"".join(parts)
+                parts.append(self._read(size))
+                self.rfile.readline()
+        return self._read(int(self.headers.get("Content-Length", 0)))
+
+    def _write(self, data: bytes) -> None:
+        for start in range(0, len(data), 16 * 1024):
+            block = data[start:start + 16 * 1024]
+            self.server.downlink.consume(len(block))
+            self.wfile.write(block)
+
+    def _reply(self, status: int, body: Dict, extra: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Accept-Encoding", ", ".join(self.server.encodings))
+        for key, value in (extra or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self._write(data)
+
+    def _reply_stream(self, answer_text: str, done: Dict) -> None:
+        """Send the answer as NDJSON delta events, then a done event."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Accept-Encoding", ", ".join(self.server.encodings))
+        self.end_headers()
+        events = [{"type": "delta", "text": answer_text[i:i + 256]} for i in range(0, len(answer_text), 256)]
+        for event in events + [dict(done, type="done")]:
+            line = (json.dumps(event) + "\n").encode("utf-8")
+            self._write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_GET(self):
+        if self.path == "/time":
+            self._reply(200, {"timestamp": int(time.time())})
+        else:
+            self._reply(404, {"detail": "not found"})
+
+    def do_POST(self):
+        raw = self._read_body()
+        encoding = self.headers.get("Content-Encoding", "identity").lower()
+        if encoding != "identity":
+            decoder = _decoders().get(encoding) if encoding in self.server.encodings else None
+            if decoder is None:
+                self._reply(415, {"detail": f"unsupported Content-Encoding {encoding}"})
+                return
+            raw = decoder(raw)
+        self.server.requests.append((self.path, len(raw), encoding))
+        time.sleep(self.server.latency)
+        if self.path == "/plugins":
+            self._reply(200, self.server.plugin_manifest())
+            return
+        if self.path != "/invoke_cli":
+            self._reply(404, {"detail": "not found"})
+            return
+        payload = json.loads(raw)
+        chat_id = payload.get("chat_id", -1)
+        answer = self.server.answer(payload)
+        done = {"chat_id": chat_id if chat_id > 0 else 1}
+        if "application/x-ndjson" in self.headers.get("Accept", "") and self.server.stream:
+            self._reply_stream(json.dumps(answer), done)
+        else:
+            self._reply(200, dict(done, assistant_response=json.dumps(answer)))
+
+
+class MockBackend(ThreadingHTTPServer):
+    """In-process stand-in server; use as a context manager."""
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, uplink_mbit: Optional[float] = None,
+                 encodings: Tuple[str, ...] = ("zstd", "gzip"), verbose: bool = False,
+                 downlink_mbit: Optional[float] = None, latency: float = 0.0,
+                 answer_files: int = 3, summary_bytes: int = 200, stream: bool = True,
+                 plugins: int = 0, plugin_bytes: int = 4096):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.throttle = _Throttle(uplink_mbit * 1_000_000 / 8 if uplink_mbit else None)
+        self.downlink = _Throttle(downlink_mbit * 1_000_000 / 8 if downlink_mbit else None)
+        self.encodings = tuple(e for e in encodings if e in _decoders())
+        self.verbose = verbose
+        self.latency = latency
+        self.answer_files = answer_files
+        self.summary_bytes = summary_bytes
+        self.stream = stream
+        self.plugins = plugins
+        self.plugin_bytes = plugin_bytes
+        # (path, decoded body bytes, content encoding) per request
+        self.requests: List[Tuple[str, int, str]] = []
+        self._thread: Optional[threading.Thread] = None
+
+    def answer(self, payload: Dict) -> Dict:
+        """Build an ``assistant_response`` that edits some of the uploaded files."""
+        sources = payload.get("source_files", {})
+        summary = f"Received {len(sources)} file(s). Updated the first {self.answer_files}."
+        summary += " Details follow." * max(0, (self.summary_bytes - len(summary)) // 16)
+        edited = [
+            {"file_name": path, "file_content": content + f"# edited by mock turn {len(self.requests)}\n"}
+            for path, content in sorted(sources.items())[:self.answer_files]
+        ]
+        return {"answer_summary": summary, "source_files": edited}
+
+    def plugin_manifest(self) -> Dict:
+        manifest = {}
+        for i in range(self.plugins):
+            content = f"# mock plugin {i}\n" + "#" * max(0, self.plugin_bytes - 20) + "\n"
+            manifest[f"mock_plugin_{i}.py"] = {
+                "sha256": hashlib.sha256(content.encode("utf-8")).hexdigest(),
+                "content": content,
+            }
+        return manifest
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "MockBackend":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--uplink-mbit", type=float, default=None, help="emulated uplink bandwidth")
+    parser.add_argument("--downlink-mbit", type=float, default=None, help="emulated downlink bandwidth")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before each response starts")
+    parser.add_argument("--answer-files", type=int, default=3, help="uploaded files edited per answer")
+    parser.add_argument("--summary-bytes", type=int, default=200)
+    parser.add_argument("--no-stream", action="store_true", help="always answer with buffered JSON")
+    parser.add_argument("--plugins", type=int, default=0, help="plugins in the /plugins manifest")
+    parser.add_argument("--plugin-bytes", type=int, default=4096)
+    args = parser.parse_args()
+    with MockBackend(args.port, args.uplink_mbit, verbose=True, downlink_mbit=args.downlink_mbit,
+                     latency=args.latency, answer_files=args.answer_files,
+                     summary_bytes=args.summary_bytes, stream=not args.no_stream,
+                     plugins=args.plugins, plugin_bytes=args.plugin_bytes) as backend:
+        print(f"Mock backend listening on {backend.url} (Ctrl-C to stop)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,11 @@ from .service import (
     handle_restore_cmd,
     handle_prune_cmd,
     handle_cleanup_cmd,
+    handle_snap_migrate_cmd,
+    handle_snap_reindex_cmd,
+    handle_snap_pack_cmd,
+    handle_cache_stats_cmd,
+    handle_cache_clear_cmd,
     handle_config_list,
     handle_config_set,
     handle_config_get,
@@ -27,9 +32,11 @@ app = typer.Typer(help="Aye: AI‑powered coding assistant for the terminal")
 # Create subcommands
 auth_app = typer.Typer(help="Authentication commands")
 snap_app = typer.Typer(help="Snapshot management commands")
+cache_app = typer.Typer(help="Response cache commands")
 
 app.add_typer(auth_app, name="auth")
 app.add_typer(snap_app, name="snap")
+app.add_typer(cache_app, name="cache")
 
 # ----------------------------------------------------------------------
 # Authentication commands
@@ -177,6 +184,72 @@ def cleanup(
     handle_cleanup_cmd(days)
 
 
+@snap_app.command()
+def migrate():
+    """
+    Move snapshots taken by older versions (full file copies) into the
+    deduplicated object store.
+    
+    Examples: \n
+    aye snap migrate \n
+    """
+    handle_snap_migrate_cmd()
+
+
+@snap_app.command()
+def reindex():
+    """
+    Rebuild the snapshot index from the snapshot directories (after
+    copying or editing them by hand).
+    
+    Examples: \n
+    aye snap reindex \n
+    """
+    handle_snap_reindex_cmd()
+
+
+@snap_app.command()
+def pack(
+    keep: int = typer.Option(50, "--keep", "-k", help="Number of recent snapshots to leave unpacked (default: 50)"),
+    all_packs: bool = typer.Option(False, "--all", help="Also merge existing packs and drop unused data"),
+):
+    """
+    Pack older snapshots into indexed pack files (fewer files on disk);
+    packed snapshots can still be listed, shown, diffed and restored.
+    
+    Examples: \n
+    aye snap pack \n
+    aye snap pack --keep 20 \n
+    aye snap pack --all \n
+    """
+    handle_snap_pack_cmd(keep, all_packs)
+
+
+# ----------------------------------------------------------------------
+# Response cache commands
+# ----------------------------------------------------------------------
+@cache_app.command("stats")
+def cache_stats():
+    """
+    Show the number, size and hit rate of cached responses.
+    
+    Examples: \n
+    aye cache stats \n
+    """
+    handle_cache_stats_cmd()
+
+
+@cache_app.command("clear")
+def cache_clear():
+    """
+    Delete all cached responses.
+    
+    Examples: \n
+    aye cache clear \n
+    """
+    handle_cache_clear_cmd()
+
+
 # ----------------------------------------------------------------------
 # Configuration management commands
 # ----------------------------------------------------------------------
@@ -199,6 +272,20 @@ def config(
     aye config list \n
     aye config get file_mask \n
     aye config set file_mask "*.py,*.js" \n
+    aye config set collect_workers 16 \n
+    aye config set max_file_bytes 2097152 \n
+    aye config set context_mode outline \n
+    aye config set delta_upload true \n
+    aye config set http2 true \n
+    aye config set upload_compression gzip \n
+    aye config set show_timings true \n
+    aye config set read_timeout 600 \n
+    aye config set max_retries 5 \n
+    aye config set cassette_mode record \n
+    aye config set response_cache true \n
+    aye config set snapshot_compression none \n
+    aye config set snapshot_delta_depth 16 \n
+    aye config set snapshot_auto_pack 100 \n
     aye config delete file_mask \n
     """
     if action == "list":
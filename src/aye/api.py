@@ -1,49 +1,662 @@
-import json
-from typing import Any, Dict
+import asyncio
+import queue
+import threading
+import time
+import uuid
+import zlib
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional, Set, Tuple
 
 import httpx
+from . import codec
 from .auth import get_token
+from .cassette import active_cassette
+from .config import get_value
+from .delta import DeltaState
+from .resilience import RETRY_ERRORS, RETRY_STATUSES, CircuitBreaker, breaker, max_retries, retry_delay
+from .lazy_source import LazySource, SourceFeed, sent_hash, source_hash, source_size
+from .response_stream import STREAM_ACCEPT, aread_streamed_response, is_streamed, read_streamed_response
 
 # -------------------------------------------------
 # 👉  EDIT THIS TO POINT TO YOUR SERVICE
 # -------------------------------------------------
 BASE_URL = "https://api.acrotron.com"
-TIMEOUT = 30.0
+# Per-phase timeouts in seconds (`aye config set read_timeout 600`, ...). A
+# dead host fails fast on connect, while a long generation may take minutes
+# between response bytes.
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 300.0
+DEFAULT_WRITE_TIMEOUT = 60.0
+DEFAULT_POOL_TIMEOUT = 10.0
+# Idle pooled connections are kept this long, so consecutive REPL turns
+# reuse one TCP/TLS connection instead of paying a new handshake each time
+KEEPALIVE_EXPIRY = 300.0
+MAX_CONNECTIONS = 10
+# Request bodies smaller than this are sent uncompressed (`aye config set compression_min_bytes N`)
+DEFAULT_COMPRESSION_MIN_BYTES = 16 * 1024
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+# Request bodies are sent in pieces of about this size
+STREAM_CHUNK_BYTES = 64 * 1024
+# Strings longer than this (in characters) are escaped a slice at a time
+_STRING_SLICE = 16 * 1024
+# Encoded body chunks buffered ahead of the socket by the async uploader
+BODY_QUEUE_CHUNKS = 8
+
+
+# Process-wide pooled clients, created on first use and closed by close_clients()
+_client_lock = threading.Lock()
+_sync_client: Optional[httpx.Client] = None
+_async_client: Optional[httpx.AsyncClient] = None
+_async_client_loop: Optional[asyncio.AbstractEventLoop] = None
+# Authorization header, read from the environment or ~/.ayecfg once per process
+_auth_header: Optional[Dict[str, str]] = None
+# Request encodings each server advertised in an Accept-Encoding response header
+# (RFC 7694), and those it rejected with 415, keyed by BASE_URL
+_server_encodings: Dict[str, Tuple[str, ...]] = {}
+_refused_encodings: Dict[str, Set[str]] = {}
 
 
 def _auth_headers() -> Dict[str, str]:
-    token = get_token()
-    if not token:
-        raise RuntimeError("No auth token – run `aye login` first.")
-    return {"Authorization": f"Bearer {token}"}
+    global _auth_header
+    if _auth_header is None:
+        token = get_token()
+        if not token:
+            raise RuntimeError("No auth token – run `aye login` first.")
+        _auth_header = {"Authorization": f"Bearer {token}"}
+    return _auth_header
+
+
+def reset_auth() -> None:
+    """Forget the cached auth header (after login, logout or a rejected token)."""
+    global _auth_header
+    _auth_header = None
+
+
+def _http2_enabled() -> bool:
+    """HTTP/2 is opt-in (``aye config set http2 true``) and needs the ``h2`` package."""
+    if not get_value("http2", False):
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _timeout(key: str, default: float) -> Optional[float]:
+    value = get_value(key, default)
+    return None if value is None else float(value)  # null: wait forever
+
+
+def _client_options() -> Dict[str, Any]:
+    return {
+        "timeout": httpx.Timeout(
+            connect=_timeout("connect_timeout", DEFAULT_CONNECT_TIMEOUT),
+            read=_timeout("read_timeout", DEFAULT_READ_TIMEOUT),
+            write=_timeout("write_timeout", DEFAULT_WRITE_TIMEOUT),
+            pool=_timeout("pool_timeout", DEFAULT_POOL_TIMEOUT),
+        ),
+        "verify": False,
+        "http2": _http2_enabled(),
+        "limits": httpx.Limits(max_connections=MAX_CONNECTIONS, keepalive_expiry=KEEPALIVE_EXPIRY),
+    }
+
+
+def get_client() -> httpx.Client:
+    """Return the shared keep-alive client, creating it on first use."""
+    global _sync_client
+    with _client_lock:
+        if _sync_client is None or _sync_client.is_closed:
+            _sync_client = httpx.Client(**_client_options())
+        return _sync_client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Return the shared keep-alive async client, creating it on first use.
+
+    The async client's connections belong to the event loop that first used
+    them; call ``aclose_clients`` from that loop before it ends. Called from
+    a different loop, a fresh client is created for that loop.
+    """
+    global _async_client, _async_client_loop
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    with _client_lock:
+        stale = _async_client is not None and loop is not None and _async_client_loop not in (None, loop)
+        if _async_client is None or _async_client.is_closed or stale:
+            _async_client = httpx.AsyncClient(**_client_options())
+            _async_client_loop = loop
+        elif _async_client_loop is None:
+            _async_client_loop = loop
+        return _async_client
+
+
+async def aclose_clients() -> None:
+    """Close the async client, if it belongs to the running event loop."""
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    with _client_lock:
+        if _async_client_loop not in (None, loop):
+            return  # Another loop's client: closing it here would break that loop
+        client, _async_client, _async_client_loop = _async_client, None, None
+    if client is not None:
+        await client.aclose()
+
+
+def close_clients() -> None:
+    """Close the pooled clients and their connections (called at REPL exit)."""
+    global _sync_client, _async_client, _async_client_loop
+    with _client_lock:
+        sync_client, _sync_client = _sync_client, None
+        async_client, _async_client, _async_client_loop = _async_client, None, None
+    if sync_client is not None:
+        sync_client.close()
+    if async_client is not None and not async_client.is_closed:
+        try:
+            asyncio.run(async_client.aclose())
+        except RuntimeError:
+            pass  # Its loop is gone or still running; the process is exiting anyway
+
+
+_dumps = codec.dumps
+
+
+def _encode_json(value: Any) -> Iterator[str]:
+    """Yield the compact JSON encoding of *value* in pieces.
+
+    Long strings are escaped a slice at a time and ``LazySource`` values are
+    streamed from disk, so no piece is much larger than a read chunk.
+    """
+    if isinstance(value, LazySource):
+        yield '"'
+        for text in value.iter_text():
+            for start in range(0, len(text), _STRING_SLICE):
+                yield _dumps(text[start:start + _STRING_SLICE])[1:-1]
+        yield '"'
+    elif isinstance(value, str) and len(value) > _STRING_SLICE:
+        yield '"'
+        for start in range(0, len(value), _STRING_SLICE):
+            yield _dumps(value[start:start + _STRING_SLICE])[1:-1]
+        yield '"'
+    elif isinstance(value, (dict, SourceFeed)):
+        # A SourceFeed yields its files while they are still being read
+        yield "{"
+        for i, (key, item) in enumerate(value.items()):
+            yield ("," if i else "") + _dumps(str(key)) + ":"
+            yield from _encode_json(item)
+        yield "}"
+    elif isinstance(value, (list, tuple)):
+        yield "["
+        for i, item in enumerate(value):
+            if i:
+                yield ","
+            yield from _encode_json(item)
+        yield "]"
+    else:
+        yield _dumps(value)
+
+
+def iter_json_body(payload: Any, chunk_bytes: int = STREAM_CHUNK_BYTES) -> Iterator[bytes]:
+    """Yield *payload* as UTF-8 JSON in chunks of roughly *chunk_bytes*.
+
+    Used as a streaming request body: the serialized payload is produced
+    while it is sent instead of being built as one bytes object.
+    """
+    parts = []
+    size = 0
+    for piece in _encode_json(payload):
+        data = piece.encode("utf-8")
+        parts.append(data)
+        size += len(data)
+        if size >= chunk_bytes:
+            yield b"".join(parts)
+            parts = []
+            size = 0
+    if parts:
+        yield b"".join(parts)
+
+
+def _available_encodings() -> Tuple[str, ...]:
+    """Request encodings this client can produce, most effective first."""
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return ("gzip",)
+    return ("zstd", "gzip")
+
+
+def _choose_encoding(size: int) -> Optional[str]:
+    """Pick the Content-Encoding for a request body of about *size* bytes.
+
+    ``upload_compression`` is ``"auto"`` (default: compress only once the
+    server advertised support), ``"gzip"``, ``"zstd"`` or ``"none"``.
+    """
+    mode = get_value("upload_compression", "auto")
+    if mode in (None, "none", "identity"):
+        return None
+    if size < int(get_value("compression_min_bytes", DEFAULT_COMPRESSION_MIN_BYTES)):
+        return None
+    refused = _refused_encodings.get(BASE_URL, set())
+    candidates = [e for e in _available_encodings() if e not in refused]
+    if mode == "auto":
+        advertised = _server_encodings.get(BASE_URL, ())
+        candidates = [e for e in candidates if e in advertised]
+    elif mode in candidates:
+        candidates = [mode]
+    return candidates[0] if candidates else None
+
+
+def _compress(chunks: Iterator[bytes], encoding: str) -> Iterator[bytes]:
+    """Compress a streamed body incrementally, one chunk at a time."""
+    if encoding == "zstd":
+        import zstandard
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _estimate_size(value: Any) -> int:
+    """Approximate encoded size of *value* without reading lazy sources."""
+    if isinstance(value, dict):
+        return sum(len(str(k)) + _estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(_estimate_size(v) for v in value)
+    if isinstance(value, LazySource):
+        return source_size(value)
+    if isinstance(value, SourceFeed):
+        # Stat size of the planned files; without it the body is sent uncompressed
+        return value.size_hint or 0
+    if isinstance(value, str):
+        return len(value)
+    return 8
+
+
+def _note_accept_encoding(resp: httpx.Response) -> None:
+    header = resp.headers.get("accept-encoding")
+    if header is not None:
+        _server_encodings[BASE_URL] = tuple(
+            token.split(";")[0].strip().lower() for token in header.split(",") if token.strip()
+        )
+
+
+def _raise_for_status(resp: httpx.Response) -> None:
+    if resp.status_code in (401, 403):
+        reset_auth()  # Pick up a token refreshed by `aye auth login` on the next call
+    resp.raise_for_status()
+
+
+def _request_body(payload: Dict[str, Any], size: int,
+                  headers: Dict[str, str]) -> Tuple[Iterator[bytes], Optional[str]]:
+    """Return the streamed (and possibly compressed) body and its Content-Encoding."""
+    body = iter_json_body(payload)
+    encoding = _choose_encoding(size)
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+        body = _compress(body, encoding)
+    return body, encoding
+
+
+def _post_json(url: str, payload: Dict[str, Any],
+               on_summary: Optional[Callable[[str], None]] = None,
+               on_file: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """POST *payload* as a streamed JSON body and return the decoded response.
 
+    Passing *on_summary* or *on_file* asks for a streamed response (see
+    ``response_stream``); servers answering with plain JSON still work.
+    Transient failures are retried with one ``Idempotency-Key`` (see
+    ``resilience``) as long as no part of the response has been used.
+    """
+    size = _estimate_size(payload)
+    streaming = (on_summary is not None or on_file is not None) and get_value("stream_responses", True)
+    circuit = breaker(BASE_URL)
+    idempotency_key = uuid.uuid4().hex
+    attempt = 0
+    while True:
+        circuit.check()
+        headers = {**_auth_headers(), "Content-Type": "application/json", "Idempotency-Key": idempotency_key}
+        if streaming:
+            headers["Accept"] = STREAM_ACCEPT
+        # Streamed body: files are read, encoded and compressed as the request goes out
+        body, encoding = _request_body(payload, size, headers)
+        delivered = False
+        try:
+            with get_client().stream("POST", url, content=body, headers=headers) as resp:
+                _note_accept_encoding(resp)
+                if resp.status_code == 415 and encoding is not None:
+                    # The server cannot decode this encoding: never use it again, resend
+                    _refused_encodings.setdefault(BASE_URL, set()).add(encoding)
+                    continue
+                if _failed(resp, circuit) and resp.status_code in RETRY_STATUSES and attempt < max_retries():
+                    resp.read()
+                    time.sleep(retry_delay(attempt, resp))
+                    attempt += 1
+                    continue
+                delivered = True
+                if resp.is_error:
+                    resp.read()
+                    _raise_for_status(resp)
+                if is_streamed(resp):
+                    return read_streamed_response(resp, on_summary, on_file)
+                resp.read()
+                return codec.loads(resp.content)
+        except RETRY_ERRORS:
+            if delivered:
+                raise  # Part of the answer was already used: not safe to repeat
+            circuit.failure()
+            if attempt >= max_retries():
+                raise
+            time.sleep(retry_delay(attempt))
+            attempt += 1
 
-def cli_invoke(user_id="v@acrotron.com", chat_id=-1, message="", source_files={}):
+
+def _failed(resp: httpx.Response, circuit: CircuitBreaker) -> bool:
+    """Report the response status to the breaker; True for a server-side failure."""
+    if resp.status_code >= 500 or resp.status_code == 429:
+        circuit.failure()
+        return True
+    circuit.success()
+    return False
+
+
+_BODY_END = object()
+
+
+async def _aiter_in_thread(chunks: Iterator[bytes],
+                           on_sent: Optional[Callable[[], None]] = None) -> AsyncIterator[bytes]:
+    """Produce *chunks* in a worker thread and yield them to the event loop.
+
+    Reading lazy sources, JSON encoding and compression run in the thread
+    while earlier chunks are being written to the socket. At most
+    ``BODY_QUEUE_CHUNKS`` chunks are buffered ahead. *on_sent* is called once
+    the last chunk has been handed to the connection.
+    """
+    loop = asyncio.get_running_loop()
+    pending: "queue.Queue[object]" = queue.Queue(BODY_QUEUE_CHUNKS)
+    stop = threading.Event()
+
+    def put(item: object) -> bool:
+        while not stop.is_set():
+            try:
+                pending.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        try:
+            for chunk in chunks:
+                if not put(chunk):
+                    return
+        except BaseException as exc:  # Re-raised on the event loop side
+            put(exc)
+            return
+        put(_BODY_END)
+
+    threading.Thread(target=produce, name="aye-body", daemon=True).start()
+    try:
+        while True:
+            item = await loop.run_in_executor(None, pending.get)
+            if item is _BODY_END:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+        if on_sent is not None:
+            on_sent()
+    finally:
+        stop.set()
+        try:
+            pending.put_nowait(_BODY_END)  # Wake a getter still waiting in the executor
+        except queue.Full:
+            pass
+
+
+async def _apost_json(url: str, payload: Dict[str, Any],
+                      on_summary: Optional[Callable[[str], None]] = None,
+                      on_file: Optional[Callable[[Dict[str, Any]], None]] = None,
+                      on_stage: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """Async counterpart of ``_post_json`` on the shared ``httpx.AsyncClient``.
+
+    *on_stage* is called with ``"sent"`` once the body is out and with
+    ``"headers"`` when the response headers arrive.
+    """
+    feed = payload.get("source_files")
+    if isinstance(feed, SourceFeed):
+        # Enumeration is a quick stat pass; the reads it plans still overlap the upload
+        await asyncio.get_running_loop().run_in_executor(None, feed.wait_planned)
+    size = _estimate_size(payload)
+    streaming = (on_summary is not None or on_file is not None) and get_value("stream_responses", True)
+    sent = (lambda: on_stage("sent")) if on_stage is not None else None
+    circuit = breaker(BASE_URL)
+    idempotency_key = uuid.uuid4().hex
+    attempt = 0
+    while True:
+        circuit.check()
+        headers = {**_auth_headers(), "Content-Type": "application/json", "Idempotency-Key": idempotency_key}
+        if streaming:
+            headers["Accept"] = STREAM_ACCEPT
+        body, encoding = _request_body(payload, size, headers)
+        delivered = False
+        try:
+            async with get_async_client().stream("POST", url, content=_aiter_in_thread(body, sent),
+                                                 headers=headers) as resp:
+                if on_stage is not None:
+                    on_stage("headers")
+                _note_accept_encoding(resp)
+                if resp.status_code == 415 and encoding is not None:
+                    _refused_encodings.setdefault(BASE_URL, set()).add(encoding)
+                    payload = await _replayable(payload)
+                    continue
+                if _failed(resp, circuit) and resp.status_code in RETRY_STATUSES and attempt < max_retries():
+                    await resp.aread()
+                    payload = await _replayable(payload)
+                    await asyncio.sleep(retry_delay(attempt, resp))
+                    attempt += 1
+                    continue
+                delivered = True
+                if resp.is_error:
+                    await resp.aread()
+                    _raise_for_status(resp)
+                if is_streamed(resp):
+                    return await aread_streamed_response(resp, on_summary, on_file)
+                await resp.aread()
+                return codec.loads(resp.content)
+        except RETRY_ERRORS:
+            if delivered:
+                raise
+            circuit.failure()
+            if attempt >= max_retries():
+                raise
+            payload = await _replayable(payload)
+            await asyncio.sleep(retry_delay(attempt))
+            attempt += 1
+
+
+async def _replayable(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Return *payload* with a ``SourceFeed`` (readable once) replaced by what it collected."""
+    feed = payload.get("source_files")
+    if not isinstance(feed, SourceFeed):
+        return payload
+    sources = await asyncio.get_running_loop().run_in_executor(None, feed.result)
+    return {**payload, "source_files": sources}
+
+
+class _SentManifest(dict):
+    """``path -> sha256`` manifest whose lazy entries hash the text actually sent.
+
+    ``source_manifest`` is encoded after ``source_files``, so a lazy file
+    that changed after collection is listed under the hash of the bytes the
+    server received, not of the text seen at collection time.
+    """
+
+    def __init__(self, manifest: Dict[str, str], source_files: Dict[str, Any]):
+        super().__init__(manifest)
+        self._sources = source_files
+
+    def items(self):
+        for path in self:
+            yield path, sent_hash(self._sources[path])
+
+
+def _delta_payload(payload: Dict[str, Any], chat_id: int,
+                   delta: DeltaState) -> _SentManifest:
+    """Add a ``source_manifest`` to *payload* and drop files the chat already holds."""
+    source_files = payload["source_files"]
+    manifest = {path: source_hash(content) for path, content in source_files.items()}
+    known = delta.sent_hashes(chat_id) if chat_id > 0 and delta.supported(BASE_URL) else set()
+    payload["source_manifest"] = _SentManifest(manifest, source_files)
+    payload["source_files"] = {p: c for p, c in source_files.items() if manifest[p] not in known}
+    return payload["source_manifest"]
+
+
+def _resend_payload(resp: Dict[str, Any], payload: Dict[str, Any], source_files: Dict[str, Any],
+                    manifest: _SentManifest, chat_id: int, delta: DeltaState) -> Optional[Dict[str, Any]]:
+    """Return the payload re-sending the files the server reported missing, if any."""
+    missing = resp.get("missing_hashes")
+    if not missing:
+        return None
+    delta.forget(chat_id)
+    wanted = set(missing)
+    return {**payload, "source_files": {p: source_files[p] for p, h in manifest.items() if h in wanted}}
+
+
+def _record_delta(resp: Dict[str, Any], manifest: _SentManifest, chat_id: int,
+                  delta: DeltaState, resent: bool) -> None:
+    if resent and resp.get("missing_hashes"):
+        raise RuntimeError("Server still reports missing source content after resending it.")
+    acknowledged = bool(resp.get("delta"))
+    delta.set_supported(BASE_URL, acknowledged)
+    if acknowledged:
+        # Hashes of what was actually sent, so a file edited mid-send is not
+        # remembered under a hash its content never had
+        delta.record(resp.get("chat_id") or chat_id, [h for _, h in manifest.items()])
+
+
+def cli_invoke(user_id="v@acrotron.com", chat_id=-1, message="", source_files={},
+               delta: Optional[DeltaState] = None,
+               on_summary: Optional[Callable[[str], None]] = None,
+               on_file: Optional[Callable[[Dict[str, Any]], None]] = None):
+    """Send a prompt with its source files and return the decoded response.
+
+    With *on_summary* / *on_file* callbacks the server may stream its answer;
+    ``assistant_response`` is then returned already parsed instead of as a
+    JSON string.
+
+    With a *delta* state, the request carries a ``source_manifest`` of
+    ``path -> sha256`` and the text only of files whose hash this chat has
+    not received yet. A server that honours manifests answers with
+    ``"delta": true``, or with ``missing_hashes`` when it lost content it was
+    expected to hold; those files are then sent again in a second request.
+
+    With a cassette configured (see ``aye.cassette``) the exchange is
+    recorded, or answered from the recording without touching the network.
+    """
+    cassette = active_cassette()
+    if cassette is not None and cassette.mode == "replay":
+        return cassette.replay(message, source_files, on_summary, on_file)
+    resp = _invoke(user_id, chat_id, message, source_files, delta, on_summary, on_file)
+    if cassette is not None:
+        cassette.record(chat_id, message, source_files, resp)
+    return resp
+
+
+def _invoke(user_id, chat_id, message, source_files, delta, on_summary, on_file):
+    url = f"{BASE_URL}/invoke_cli"
     payload = {"user_id": user_id, "chat_id": chat_id, "message": message, "source_files": source_files}
+    if delta is None:
+        return _post_json(url, payload, on_summary, on_file)
 
+    manifest = _delta_payload(payload, chat_id, delta)
+    resp = _post_json(url, payload, on_summary, on_file)
+    resend = _resend_payload(resp, payload, source_files, manifest, chat_id, delta)
+    if resend is not None:
+        resp = _post_json(url, resend, on_summary, on_file)
+    _record_delta(resp, manifest, chat_id, delta, resend is not None)
+    return resp
+
+
+async def acli_invoke(user_id="v@acrotron.com", chat_id=-1, message="", source_files={},
+                      delta: Optional[DeltaState] = None,
+                      on_summary: Optional[Callable[[str], None]] = None,
+                      on_file: Optional[Callable[[Dict[str, Any]], None]] = None,
+                      on_stage: Optional[Callable[[str], None]] = None):
+    """Async counterpart of ``cli_invoke`` on the shared ``httpx.AsyncClient``.
+
+    *source_files* may also be a ``SourceFeed`` still being filled by a
+    collector thread; its files are sent as they arrive. Delta uploads need
+    the complete map up front, so a feed is not accepted with *delta*.
+    *on_stage* receives ``"sent"`` and ``"headers"`` as the request progresses.
+    """
+    cassette = active_cassette()
+    if cassette is not None and cassette.mode == "replay":
+        sources = (await _replayable({"source_files": source_files}))["source_files"]
+        return cassette.replay(message, sources, on_summary, on_file)
+    resp = await _ainvoke(user_id, chat_id, message, source_files, delta, on_summary, on_file, on_stage)
+    if cassette is not None:
+        sources = (await _replayable({"source_files": source_files}))["source_files"]
+        await asyncio.get_running_loop().run_in_executor(
+            None, cassette.record, chat_id, message, sources, resp)
+    return resp
+
+
+async def _ainvoke(user_id, chat_id, message, source_files, delta, on_summary, on_file, on_stage):
     url = f"{BASE_URL}/invoke_cli"
+    payload = {"user_id": user_id, "chat_id": chat_id, "message": message, "source_files": source_files}
+    if delta is None:
+        return await _apost_json(url, payload, on_summary, on_file, on_stage)
+    if isinstance(source_files, SourceFeed):
+        raise TypeError("Delta uploads need the complete source map, not a SourceFeed.")
+
+    manifest = _delta_payload(payload, chat_id, delta)
+    resp = await _apost_json(url, payload, on_summary, on_file, on_stage)
+    resend = _resend_payload(resp, payload, source_files, manifest, chat_id, delta)
+    if resend is not None:
+        resp = await _apost_json(url, resend, on_summary, on_file, on_stage)
+    _record_delta(resp, manifest, chat_id, delta, resend is not None)
+    return resp
+
 
-    with httpx.Client(timeout=TIMEOUT, verify=False) as client:
-        resp = client.post(url, json=payload, headers=_auth_headers())
-        resp.raise_for_status()
-        return resp.json()
+def _send(method: str, url: str, **kwargs: Any) -> httpx.Response:
+    """Send a small idempotent request, retrying transient failures."""
+    circuit = breaker(BASE_URL)
+    attempt = 0
+    while True:
+        circuit.check()
+        resp = None
+        try:
+            resp = get_client().request(method, url, **kwargs)
+        except RETRY_ERRORS:
+            circuit.failure()
+            if attempt >= max_retries():
+                raise
+        else:
+            if not _failed(resp, circuit) or resp.status_code not in RETRY_STATUSES or attempt >= max_retries():
+                return resp
+        time.sleep(retry_delay(attempt, resp))
+        attempt += 1
 
 
 def fetch_plugin_manifest():
     """Fetch the plugin manifest from the server."""
     url = f"{BASE_URL}/plugins"
-    
-    with httpx.Client(timeout=TIMEOUT, verify=False) as client:
-        resp = client.post(url, headers=_auth_headers())
-        resp.raise_for_status()
-        return resp.json()
+
+    resp = _send("POST", url, headers=_auth_headers())
+    _raise_for_status(resp)
+    return codec.loads(resp.content)
 
 
 def fetch_server_time() -> int:
     """Fetch the current server timestamp."""
     url = f"{BASE_URL}/time"
-    
-    with httpx.Client(timeout=TIMEOUT, verify=False) as client:
-        resp = client.get(url)
-        resp.raise_for_status()
-        return resp.json()['timestamp']
+
+    resp = _send("GET", url)
+    resp.raise_for_status()
+    return codec.loads(resp.content)['timestamp']
@@ -0,0 +1,150 @@
+# cassette.py
+"""Record and replay ``invoke_cli`` exchanges for offline regression runs.
+
+In ``record`` mode every ``api.cli_invoke`` request is forwarded as usual
+and stored with its response; in ``replay`` mode responses come from the
+cassette and the network is never touched. Enable with::
+
+    aye config set cassette .aye/cassettes/session1
+    aye config set cassette_mode record      # or replay
+
+or with the ``AYE_CASSETTE`` / ``AYE_CASSETTE_MODE`` environment variables,
+which take precedence (handy in CI).
+
+A cassette is a directory holding ``interactions.jsonl`` (one request
+summary and response per line) and ``objects/``: source file contents,
+zlib-compressed and named by their sha256, so a file sent unchanged in
+many turns is stored once. Requests are matched by a hash of the prompt
+and the ``path -> sha256`` map of the sources; ``chat_id`` is left out
+because the server assigns it. Identical requests are replayed in the
+order they were recorded.
+"""
+import hashlib
+import json
+import os
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from . import codec
+from .config import get_value
+from .lazy_source import SourceValue, source_hash, source_text
+
+INTERACTIONS_FILE = "interactions.jsonl"
+OBJECTS_DIR = "objects"
+CASSETTE_VERSION = 1
+MODES = ("record", "replay")
+
+
+class CassetteMissError(RuntimeError):
+    """A replayed request has no recorded response left."""
+
+
+def request_key(message: str, manifest: Dict[str, str]) -> str:
+    """Normalized hash of a request: prompt plus the ``path -> sha256`` source manifest."""
+    canonical = json.dumps({"message": message, "sources": manifest}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """One cassette directory, opened for recording or replay."""
+
+    def __init__(self, path: Path, mode: str):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode {mode!r}; expected one of {', '.join(MODES)}")
+        self.path = Path(path)
+        self.mode = mode
+        self._lock = threading.Lock()
+        # key -> recorded responses not yet replayed, in recording order
+        self._pending: Optional[Dict[str, List[Dict[str, Any]]]] = None
+
+    # Recording ----------------------------------------------------------
+    def _store_object(self, content: SourceValue) -> str:
+        # Hash the text as stored: a lazy file may have changed since collection
+        data = source_text(content).encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        obj = self.path / OBJECTS_DIR / digest[:2] / digest[2:]
+        if not obj.exists():
+            obj.parent.mkdir(parents=True, exist_ok=True)
+            tmp = obj.with_suffix(".tmp")
+            tmp.write_bytes(zlib.compress(data))
+            os.replace(tmp, obj)
+        return digest
+
+    def record(self, chat_id: int, message: str, sources: Dict[str, SourceValue],
+               response: Dict[str, Any]) -> None:
+        """Append one exchange; source contents go to the object store."""
+        with self._lock:
+            manifest = {path: self._store_object(content) for path, content in sorted(sources.items())}
+            entry = {
+                "version": CASSETTE_VERSION,
+                "key": request_key(message, manifest),
+                "request": {"chat_id": chat_id, "message": message, "source_manifest": manifest},
+                "response": response,
+            }
+            self.path.mkdir(parents=True, exist_ok=True)
+            with open(self.path / INTERACTIONS_FILE, "a", encoding="utf-8") as f:
+                f.write(codec.dumps(entry) + "\n")
+
+    def load_object(self, digest: str) -> str:
+        """Return recorded source content by hash."""
+        obj = self.path / OBJECTS_DIR / digest[:2] / digest[2:]
+        return zlib.decompress(obj.read_bytes()).decode("utf-8")
+
+    # Replay -------------------------------------------------------------
+    def _load(self) -> Dict[str, List[Dict[str, Any]]]:
+        pending: Dict[str, List[Dict[str, Any]]] = {}
+        try:
+            lines = (self.path / INTERACTIONS_FILE).read_text(encoding="utf-8").splitlines()
+        except OSError:
+            lines = []
+        for line in lines:
+            if line.strip():
+                entry = codec.loads(line)
+                pending.setdefault(entry["key"], []).append(entry["response"])
+        return pending
+
+    def replay(self, message: str, sources: Dict[str, SourceValue],
+               on_summary: Optional[Callable[[str], None]] = None,
+               on_file: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Return the next recorded response for this request.
+
+        A response recorded from a stream (``assistant_response`` already
+        parsed) is fed to *on_summary* / *on_file* as a stream would be.
+        """
+        key = request_key(message, {path: source_hash(content) for path, content in sources.items()})
+        with self._lock:
+            if self._pending is None:
+                self._pending = self._load()
+            queue = self._pending.get(key)
+            if not queue:
+                raise CassetteMissError(
+                    f"No recorded response in {self.path} for this request (key {key[:12]}…)."
+                )
+            response = queue.pop(0)
+        answer = response.get("assistant_response")
+        if isinstance(answer, dict):
+            if on_summary is not None and answer.get("answer_summary"):
+                on_summary(answer["answer_summary"])
+            if on_file is not None:
+                for item in answer.get("source_files", []):
+                    on_file(item)
+        return response
+
+
+_cassettes: Dict[tuple, Cassette] = {}
+_cassettes_lock = threading.Lock()
+
+
+def active_cassette() -> Optional[Cassette]:
+    """Return the cassette selected by the environment or config, if any."""
+    path = os.environ.get("AYE_CASSETTE") or get_value("cassette")
+    mode = os.environ.get("AYE_CASSETTE_MODE") or get_value("cassette_mode")
+    if not path or not mode:
+        return None
+    key = (str(Path(path).expanduser().resolve()), mode)
+    with _cassettes_lock:
+        if key not in _cassettes:
+            _cassettes[key] = Cassette(Path(key[0]), mode)
+        return _cassettes[key]
@@ -0,0 +1,56 @@
+# codec.py
+"""JSON encoding and decoding for requests, responses and on-disk state.
+
+Uses ``orjson`` when it is installed (``pip install aye-cli[fast]``) and
+the standard library otherwise; both produce the same compact UTF-8 JSON
+for the values aye handles. ``set_backend`` switches explicitly, e.g. for
+benchmarks or to rule the accelerator out when debugging.
+
+Decoding errors are ``json.JSONDecodeError`` with either backend
+(``orjson.JSONDecodeError`` subclasses it), exported as ``DecodeError``.
+"""
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+DecodeError = json.JSONDecodeError
+BACKENDS = ("orjson", "stdlib")
+
+backend = "orjson" if orjson is not None else "stdlib"
+
+
+def set_backend(name: str) -> None:
+    """Select ``"orjson"`` or ``"stdlib"``; raises ``ValueError`` if unavailable."""
+    global backend
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown JSON backend {name!r}; expected one of {', '.join(BACKENDS)}")
+    if name == "orjson" and orjson is None:
+        raise ValueError("orjson is not installed")
+    backend = name
+
+
+def dumpb(value: Any, indent: bool = False) -> bytes:
+    """Encode *value* as UTF-8 JSON: compact, or with two-space *indent*."""
+    if backend == "orjson":
+        return orjson.dumps(value, option=orjson.OPT_INDENT_2 if indent else 0)
+    return dumps(value, indent).encode("utf-8")
+
+
+def dumps(value: Any, indent: bool = False) -> str:
+    """Encode *value* as a JSON string: compact, or with two-space *indent*."""
+    if backend == "orjson":
+        return dumpb(value, indent).decode("utf-8")
+    if indent:
+        return json.dumps(value, ensure_ascii=False, indent=2, allow_nan=False)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), allow_nan=False)
+
+
+def loads(data: Union[str, bytes, bytearray]) -> Any:
+    """Decode a JSON document from text or UTF-8 bytes."""
+    if backend == "orjson":
+        return orjson.loads(data)
+    return json.loads(data)
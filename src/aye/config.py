@@ -1,8 +1,9 @@
 # config.py
-import json
 from pathlib import Path
 from typing import Any, Dict
 
+from . import codec
+
 # Configuration file path
 CONFIG_FILE = Path(".aye/config.json").resolve()
 
@@ -14,15 +15,15 @@ def load_config() -> None:
     """Load configuration from file if it exists."""
     if CONFIG_FILE.exists():
         try:
-            _config.update(json.loads(CONFIG_FILE.read_text()))
-        except json.JSONDecodeError:
+            _config.update(codec.loads(CONFIG_FILE.read_bytes()))
+        except codec.DecodeError:
             pass  # Ignore invalid config files
 
 
 def save_config() -> None:
     """Save configuration to file."""
     CONFIG_FILE.parent.mkdir(parents=True, exist_ok=True)
-    CONFIG_FILE.write_text(json.dumps(_config, indent=2))
+    CONFIG_FILE.write_bytes(codec.dumpb(_config, indent=True))
 
 
 def get_value(key: str, default: Any = None) -> Any:
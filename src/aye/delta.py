@@ -0,0 +1,91 @@
+# delta.py
+"""Bookkeeping for negotiated delta uploads.
+
+With ``delta_upload`` enabled, ``api.cli_invoke`` sends a manifest of
+``path -> sha256`` on every turn and the full text only of files whose hash
+has not yet been sent in the same chat. This module remembers, per chat and
+per server, which hashes went out and whether the server honours manifests.
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Set
+
+STATE_FILE = Path(".aye/delta_state.json").resolve()
+STATE_VERSION = 1
+# Chats remembered; the least recently used ones are dropped first
+MAX_CHATS = 32
+
+
+class DeltaState:
+    """Which content hashes each chat has already received, persisted under ``.aye/``."""
+
+    def __init__(self, state_file: Path = STATE_FILE):
+        self.state_file = state_file
+        # chat id (as str) -> {"hashes": [...], "used": epoch seconds}
+        self._chats: Dict[str, Dict[str, Any]] = {}
+        # server base URL -> whether it acknowledged a manifest
+        self._servers: Dict[str, bool] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        if not self.state_file.is_file():
+            return
+        try:
+            data = json.loads(self.state_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if data.get("version") == STATE_VERSION:
+            self._chats = data.get("chats", {})
+            self._servers = data.get("servers", {})
+
+    def supported(self, server: str) -> Optional[bool]:
+        """Return whether *server* honours manifests, or None if never asked."""
+        with self._lock:
+            return self._servers.get(server)
+
+    def set_supported(self, server: str, value: bool) -> None:
+        with self._lock:
+            if self._servers.get(server) != value:
+                self._servers[server] = value
+                self._dirty = True
+
+    def sent_hashes(self, chat_id: int) -> Set[str]:
+        """Return the hashes whose content *chat_id* already holds."""
+        with self._lock:
+            chat = self._chats.get(str(chat_id))
+            return set(chat["hashes"]) if chat is not None else set()
+
+    def record(self, chat_id: int, hashes: Iterable[str]) -> None:
+        """Remember that *chat_id* now holds the content of *hashes*."""
+        with self._lock:
+            chat = self._chats.setdefault(str(chat_id), {"hashes": []})
+            chat["hashes"] = sorted(set(chat["hashes"]).union(hashes))
+            chat["used"] = time.time()
+            if len(self._chats) > MAX_CHATS:
+                oldest = sorted(self._chats, key=lambda c: self._chats[c].get("used", 0))
+                for stale in oldest[:len(self._chats) - MAX_CHATS]:
+                    del self._chats[stale]
+            self._dirty = True
+
+    def forget(self, chat_id: int) -> None:
+        """Drop everything recorded for *chat_id* (the server lost its copy)."""
+        with self._lock:
+            if self._chats.pop(str(chat_id), None) is not None:
+                self._dirty = True
+
+    def save(self) -> None:
+        """Persist the state atomically if it changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"version": STATE_VERSION, "chats": self._chats, "servers": self._servers}
+            self.state_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.state_file.with_suffix(".tmp")
+            tmp_file.write_text(json.dumps(data), encoding="utf-8")
+            os.replace(tmp_file, self.state_file)
+            self._dirty = False
@@ -0,0 +1,173 @@
+# git_index.py
+"""Read ``.git/index`` directly, without running ``git``.
+
+The index already records every tracked path together with the stat data
+git last saw and the blob id of its content. ``collect_sources`` uses it to
+enumerate tracked files and to recognise files whose content is known
+without reading them.
+"""
+import os
+import struct
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from .ignore import find_repo_root
+
+_HEADER = struct.Struct(">4sII")
+# ctime s/ns, mtime s/ns, dev, ino, mode, uid, gid, size
+_STAT = struct.Struct(">10I")
+
+# Parsed index cache: index path -> ((mtime_ns, size), (entries, index mtime_ns))
+_INDEX_CACHE: Dict[str, Tuple[Tuple[int, int], Tuple[Dict[str, "IndexEntry"], int]]] = {}
+
+
+class IndexEntry(NamedTuple):
+    mtime_ns: int
+    ino: int
+    mode: int
+    size: int  # Truncated to 32 bits, as stored by git
+    blob: str  # Hex object id of the staged content
+
+
+def _git_dir(repo_root: Path) -> Optional[Path]:
+    """Resolve the git directory, following ``gitdir:`` files used by worktrees."""
+    dot_git = repo_root / ".git"
+    if dot_git.is_dir():
+        return dot_git
+    try:
+        text = dot_git.read_text(encoding="utf-8").strip()
+    except (OSError, UnicodeDecodeError):
+        return None
+    if not text.startswith("gitdir:"):
+        return None
+    git_dir = Path(text[len("gitdir:"):].strip())
+    return git_dir if git_dir.is_absolute() else (repo_root / git_dir).resolve()
+
+
+def _hash_size(git_dir: Path) -> int:
+    try:
+        config = (git_dir / "config").read_text(encoding="utf-8").lower()
+    except (OSError, UnicodeDecodeError):
+        return 20
+    return 32 if "objectformat = sha256" in config else 20
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    """Decode the offset-encoded varint used by index v4 path compression."""
+    byte = data[pos]
+    pos += 1
+    value = byte & 0x7F
+    while byte & 0x80:
+        value += 1
+        byte = data[pos]
+        pos += 1
+        value = (value << 7) + (byte & 0x7F)
+    return value, pos
+
+
+def parse_index(data: bytes, hash_size: int = 20) -> Dict[str, IndexEntry]:
+    """Parse the entries of an index file (versions 2, 3 and 4).
+
+    Only stage-0 entries with real content are returned; conflicted and
+    intent-to-add paths are left for the untracked scan to pick up.
+    """
+    signature, version, count = _HEADER.unpack_from(data, 0)
+    if signature != b"DIRC" or version not in (2, 3, 4):
+        raise ValueError(f"unsupported git index (version {version})")
+    entries: Dict[str, IndexEntry] = {}
+    null_blob = b"\0" * hash_size
+    pos = _HEADER.size
+    prev_path = b""
+    for _ in range(count):
+        start = pos
+        (_c_s, _c_ns, m_s, m_ns, _dev, ino, mode, _uid, _gid, size) = _STAT.unpack_from(data, pos)
+        pos += _STAT.size
+        blob = data[pos:pos + hash_size]
+        pos += hash_size
+        flags, = struct.unpack_from(">H", data, pos)
+        pos += 2
+        extended = 0
+        if version >= 3 and flags & 0x4000:
+            extended, = struct.unpack_from(">H", data, pos)
+            pos += 2
+        if version == 4:
+            strip, pos = _read_varint(data, pos)
+            end = data.index(b"\0", pos)
+            path = prev_path[:len(prev_path) - strip] + data[pos:end]
+            pos = end + 1
+        else:
+            end = data.index(b"\0", pos)
+            path = data[pos:end]
+            # Entries are NUL-padded to a multiple of eight bytes
+            pos = start + ((end - start) // 8 + 1) * 8
+        prev_path = path
+
+        stage = (flags >> 12) & 0x3
+        intent_to_add = extended & 0x2000
+        if stage or intent_to_add or blob == null_blob:
+            continue
+        entries[path.decode("utf-8", "surrogateescape")] = IndexEntry(
+            mtime_ns=m_s * 1_000_000_000 + m_ns,
+            ino=ino,
+            mode=mode,
+            size=size,
+            blob=blob.hex(),
+        )
+    return entries
+
+
+def read_index(repo_root: Path) -> Optional[Tuple[Dict[str, IndexEntry], int]]:
+    """Return ``(entries, index_mtime_ns)`` for *repo_root*, or None if unavailable.
+
+    Parsed indexes are cached by the index file's ``(mtime_ns, size)``.
+    """
+    git_dir = _git_dir(repo_root)
+    if git_dir is None:
+        return None
+    index_path = git_dir / "index"
+    key = str(index_path)
+    try:
+        st = os.stat(key)
+    except OSError:
+        return None
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _INDEX_CACHE.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    try:
+        entries = parse_index(index_path.read_bytes(), _hash_size(git_dir))
+    except (OSError, ValueError, struct.error, IndexError):
+        return None
+    result = (entries, st.st_mtime_ns)
+    _INDEX_CACHE[key] = (stamp, result)
+    return result
+
+
+def is_clean(entry: IndexEntry, st: os.stat_result, index_mtime_ns: int) -> bool:
+    """Return True if *st* proves the file still holds the staged blob.
+
+    Like git, a file modified in the same instant the index was written is
+    "racily clean" and is not trusted.
+    """
+    return (
+        entry.size == st.st_size & 0xFFFFFFFF
+        and entry.mtime_ns == st.st_mtime_ns
+        and entry.ino in (0, st.st_ino & 0xFFFFFFFF)
+        and st.st_mtime_ns < index_mtime_ns
+    )
+
+
+def tracked_under(base_path: Path) -> Optional[Tuple[Dict[str, IndexEntry], int]]:
+    """Return index entries below *base_path* keyed relative to it, or None if not a repository."""
+    repo_root = find_repo_root(base_path)
+    if repo_root is None:
+        return None
+    result = read_index(repo_root)
+    if result is None:
+        return None
+    entries, index_mtime_ns = result
+    prefix = base_path.relative_to(repo_root).as_posix()
+    if prefix == ".":
+        return entries, index_mtime_ns
+    prefix += "/"
+    return {p[len(prefix):]: e for p, e in entries.items() if p.startswith(prefix)}, index_mtime_ns
@@ -0,0 +1,316 @@
+# ignore.py
+"""Compiled ``.gitignore`` / ``.ayeignore`` matching.
+
+Each ignore file is compiled once into a few combined regular expressions
+scoped to the directory it lives in; compiled files are cached by
+``(path, mtime_ns, size)`` so repeated collections only pay for a ``stat``.
+"""
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Pattern, Tuple
+
+# Per-directory ignore files, lowest precedence first
+IGNORE_FILES = (".gitignore", ".ayeignore")
+
+# Compiled rule cache: path -> ((mtime_ns, size), rules)
+_COMPILED: Dict[str, Tuple[Tuple[int, int], Optional["IgnoreRules"]]] = {}
+
+
+def _translate_segment(seg: str) -> str:
+    """Translate one path segment of a glob (no slashes) into a regex."""
+    i, n = 0, len(seg)
+    res: List[str] = []
+    while i < n:
+        c = seg[i]
+        i += 1
+        if c == "*":
+            while i < n and seg[i] == "*":
+                i += 1
+            res.append("[^/]*")
+        elif c == "?":
+            res.append("[^/]")
+        elif c == "\\" and i < n:
+            res.append(re.escape(seg[i]))
+            i += 1
+        elif c == "[":
+            j = i
+            if j < n and seg[j] in "!^":
+                j += 1
+            if j < n and seg[j] == "]":
+                j += 1
+            while j < n and seg[j] != "]":
+                j += 1
+            if j >= n:
+                res.append("\\[")
+            else:
+                stuff = seg[i:j].replace("\\", "\\\\")
+                if stuff[:1] in ("!", "^"):
+                    stuff = "^" + stuff[1:]
+                res.append(f"[{stuff}]")
+                i = j + 1
+        else:
+            res.append(re.escape(c))
+    return "".join(res)
+
+
+_GLOB_CHARS = frozenset("*?[\\")
+
+
+def parse_pattern(line: str) -> Optional[Tuple[str, str, bool, bool]]:
+    """Parse one gitignore line into ``(kind, value, negate, dir_only)``.
+
+    ``kind`` selects the cheapest way to test the rule:
+
+    * ``"name"``   – exact basename (``value`` is the literal name),
+    * ``"suffix"`` – ``*<literal>`` basename glob (``value`` is the suffix),
+    * ``"base"``   – any other slash-free glob, as a regex over the basename,
+    * ``"path"``   – anchored glob, as a regex over the path relative to the
+      directory holding the ignore file.
+
+    Returns None for blank lines and comments.
+    """
+    line = line.rstrip("\r\n")
+    # Trailing spaces are ignored unless escaped with a backslash
+    stripped = line.rstrip(" ")
+    if stripped.endswith("\\") and len(stripped) < len(line):
+        stripped += " "
+    line = stripped
+    if not line or line.startswith("#"):
+        return None
+
+    negate = False
+    if line.startswith("!"):
+        negate = True
+        line = line[1:]
+    elif line.startswith("\\!") or line.startswith("\\#"):
+        line = line[1:]
+
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+
+    # A slash anywhere but the end anchors the pattern to this directory
+    if "/" not in line:
+        if not _GLOB_CHARS.intersection(line):
+            return "name", line, negate, dir_only
+        if line.startswith("*") and not _GLOB_CHARS.intersection(line[1:]):
+            return "suffix", line[1:], negate, dir_only
+        return "base", _translate_segment(line), negate, dir_only
+
+    line = line.lstrip("/")
+    regex = ""
+    need_sep = False
+    parts = line.split("/")
+    for idx, seg in enumerate(parts):
+        if seg == "**":
+            if idx == len(parts) - 1:
+                regex += "/.*" if need_sep else ".*"
+            else:
+                regex += "/(?:.*/)?" if need_sep else "(?:.*/)?"
+                need_sep = False
+            continue
+        if need_sep:
+            regex += "/"
+        regex += _translate_segment(seg)
+        need_sep = True
+    return "path", regex, negate, dir_only
+
+
+class _RuleSet:
+    """A run of same-polarity rules, combined for a single test per path."""
+
+    __slots__ = ("names", "suffixes", "base_re", "path_re")
+
+    def __init__(self, rules: List[Tuple[str, str]]):
+        self.names = frozenset(v for k, v in rules if k == "name")
+        self.suffixes = tuple(v for k, v in rules if k == "suffix")
+        self.base_re = self._join([v for k, v in rules if k == "base"])
+        self.path_re = self._join([v for k, v in rules if k == "path"])
+
+    @staticmethod
+    def _join(regexes: List[str]) -> Optional[Pattern[str]]:
+        return re.compile("(?:" + "|".join(regexes) + ")\\Z") if regexes else None
+
+    def __bool__(self) -> bool:
+        return bool(self.names or self.suffixes or self.base_re or self.path_re)
+
+    def hit(self, rel_path: str, name: str) -> bool:
+        return (
+            name in self.names
+            or (bool(self.suffixes) and name.endswith(self.suffixes))
+            or (self.base_re is not None and self.base_re.match(name) is not None)
+            or (self.path_re is not None and self.path_re.match(rel_path) is not None)
+        )
+
+
+class IgnoreRules:
+    """The rules of a single ignore file, compiled into combined matchers.
+
+    Consecutive rules with the same polarity share one matcher; the groups
+    are evaluated last-to-first so the last matching rule wins, as in git.
+    """
+
+    __slots__ = ("_groups",)
+
+    def __init__(self, lines: List[str]):
+        # Each group: (negate, rules for any entry, rules for directories only)
+        self._groups: List[Tuple[bool, Optional[_RuleSet], Optional[_RuleSet]]] = []
+        current: Optional[Tuple[bool, List[Tuple[str, str]], List[Tuple[str, str]]]] = None
+        for line in lines:
+            parsed = parse_pattern(line)
+            if parsed is None:
+                continue
+            kind, value, negate, dir_only = parsed
+            if current is None or current[0] != negate:
+                if current is not None:
+                    self._groups.append(self._compile_group(current))
+                current = (negate, [], [])
+            (current[2] if dir_only else current[1]).append((kind, value))
+        if current is not None:
+            self._groups.append(self._compile_group(current))
+        self._groups.reverse()
+
+    @staticmethod
+    def _compile_group(group):
+        negate, any_rules, dir_rules = group
+        return negate, _RuleSet(any_rules) or None, _RuleSet(dir_rules) or None
+
+    def __bool__(self) -> bool:
+        return bool(self._groups)
+
+    def match(self, rel_path: str, is_dir: bool) -> Optional[bool]:
+        """Return True (ignored), False (re-included) or None (no rule matched)."""
+        name = rel_path.rpartition("/")[2]
+        for negate, any_rules, dir_rules in self._groups:
+            if (any_rules is not None and any_rules.hit(rel_path, name)) or \
+                    (is_dir and dir_rules is not None and dir_rules.hit(rel_path, name)):
+                return not negate
+        return None
+
+
+def load_ignore_file(path: Path) -> Optional[IgnoreRules]:
+    """Return compiled rules for *path*, or None if it is missing or empty."""
+    key = str(path)
+    try:
+        st = os.stat(key)
+    except OSError:
+        _COMPILED.pop(key, None)
+        return None
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _COMPILED.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    try:
+        lines = path.read_text(encoding="utf-8").splitlines()
+    except (OSError, UnicodeDecodeError):
+        # If we can't read the file, proceed without its ignore patterns
+        lines = []
+    rules = IgnoreRules(lines) or None
+    _COMPILED[key] = (stamp, rules)
+    return rules
+
+
+def find_repo_root(path: Path) -> Optional[Path]:
+    """Return the closest directory at or above *path* that contains ``.git``."""
+    for candidate in (path, *path.parents):
+        if (candidate / ".git").exists():
+            return candidate
+    return None
+
+
+# A chain entry: (chars to strip from the base-relative path, prefix to add, rules)
+_ChainEntry = Tuple[int, str, IgnoreRules]
+
+
+class IgnoreMatcher:
+    """Answers "is this path ignored?" for paths relative to *root*.
+
+    Ignore files are honoured in *root*, in every directory below it, and in
+    the ancestors of *root* up to the enclosing repository root (never past
+    it). Deeper files take precedence over shallower ones.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root.resolve()
+        self._chains: Dict[str, List[_ChainEntry]] = {}
+        self._dirs: Dict[str, bool] = {}
+        self._base_chain = self._ancestor_chain()
+
+    def _ancestor_chain(self) -> List[_ChainEntry]:
+        repo_root = find_repo_root(self.root)
+        chain: List[_ChainEntry] = []
+        if repo_root is None:
+            return chain
+        ancestors = [repo_root]
+        for parent in reversed(self.root.relative_to(repo_root).parents):
+            if str(parent) != ".":
+                ancestors.append(repo_root / parent)
+        # The repo-wide exclude file has the lowest precedence of all
+        exclude = load_ignore_file(repo_root / ".git" / "info" / "exclude")
+        if exclude is not None:
+            chain.append((0, self._prefix_from(repo_root), exclude))
+        for ancestor in ancestors:
+            if ancestor == self.root:
+                continue
+            prefix = self._prefix_from(ancestor)
+            for name in IGNORE_FILES:
+                rules = load_ignore_file(ancestor / name)
+                if rules is not None:
+                    chain.append((0, prefix, rules))
+        return chain
+
+    def _prefix_from(self, ancestor: Path) -> str:
+        """Return the path of *root* relative to *ancestor*, with a trailing slash."""
+        rel = self.root.relative_to(ancestor).as_posix()
+        return "" if rel == "." else rel + "/"
+
+    def _chain_for(self, rel_dir: str) -> List[_ChainEntry]:
+        """Return the rule chain (shallowest first) that applies inside *rel_dir*."""
+        chain = self._chains.get(rel_dir)
+        if chain is not None:
+            return chain
+        if rel_dir:
+            parent = rel_dir.rpartition("/")[0]
+            chain = list(self._chain_for(parent))
+            strip = len(rel_dir) + 1
+        else:
+            chain = list(self._base_chain)
+            strip = 0
+        directory = self.root / rel_dir if rel_dir else self.root
+        for name in IGNORE_FILES:
+            rules = load_ignore_file(directory / name)
+            if rules is not None:
+                chain.append((strip, "", rules))
+        self._chains[rel_dir] = chain
+        return chain
+
+    def match_entry(self, rel_path: str, is_dir: bool) -> bool:
+        """Check a single entry, assuming its parent directories are not ignored.
+
+        This is what a pruning directory walker needs: it never descends into
+        ignored directories, so only the entry itself has to be tested.
+        """
+        rel_dir = rel_path.rpartition("/")[0]
+        for strip, prefix, rules in reversed(self._chain_for(rel_dir)):
+            result = rules.match(prefix + rel_path[strip:], is_dir)
+            if result is not None:
+                return result
+        return False
+
+    def dir_ignored(self, rel_dir: str) -> bool:
+        """Return True if directory *rel_dir* or any of its parents is ignored (memoized)."""
+        if not rel_dir:
+            return False
+        cached = self._dirs.get(rel_dir)
+        if cached is None:
+            cached = self.dir_ignored(rel_dir.rpartition("/")[0]) or self.match_entry(rel_dir, True)
+            self._dirs[rel_dir] = cached
+        return cached
+
+    def is_ignored(self, rel_path: str, is_dir: bool = False) -> bool:
+        """Return True if *rel_path* or any of its parent directories is ignored."""
+        if self.dir_ignored(rel_path.rpartition("/")[0]):
+            return True
+        return self.match_entry(rel_path, is_dir)
@@ -0,0 +1,208 @@
+# lazy_source.py
+"""References to large source files whose text is read only when sent.
+
+``collect_sources`` returns a ``LazySource`` instead of a string for files
+over ``lazy_source_bytes``; the request encoder in ``api`` streams their text
+straight from a memory map into the request body, so neither the collected
+map nor the serialized payload ever holds a full copy of them.
+
+A ``SourceFeed`` goes one step further: it stands in for the whole
+``source_files`` map while a collector thread is still reading, so the
+request body can go out while later files are read.
+"""
+import codecs
+import hashlib
+import io
+import mmap
+import os
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from .source_cache import content_hash
+
+# Files larger than this are collected as lazy references (`aye config set lazy_source_bytes N`)
+DEFAULT_LAZY_SOURCE_BYTES = 256 * 1024
+# Bytes decoded per step when streaming a lazy file
+READ_CHUNK_BYTES = 64 * 1024
+
+
+def iter_file_text(path: str, errors: str = "strict",
+                   chunk_bytes: int = READ_CHUNK_BYTES) -> Iterator[str]:
+    """Yield the UTF-8 text of *path* in chunks, with universal newlines.
+
+    Large files are memory-mapped so pages are faulted in on demand and never
+    copied as a whole; ``\\r\\n`` split across two chunks is still translated.
+    """
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder("utf-8")(errors), translate=True)
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        except (OSError, ValueError):
+            mapped = None
+        if mapped is not None:
+            with mapped:
+                view = memoryview(mapped)
+                try:
+                    for offset in range(0, len(view), chunk_bytes):
+                        text = decoder.decode(view[offset:offset + chunk_bytes])
+                        if text:
+                            yield text
+                finally:
+                    view.release()
+        else:
+            for block in iter(lambda: f.read(chunk_bytes), b""):
+                text = decoder.decode(block)
+                if text:
+                    yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+class LazySource:
+    """A collected source file that is read from disk only when needed.
+
+    *size* is the size on disk at collection time and *sha256* the hash of
+    the decoded text then, so ranking and caching can treat the reference
+    like its content without reading it. The file may change before it is
+    sent; *read_sha256* is the hash of the text the last full read produced.
+    """
+
+    __slots__ = ("path", "size", "sha256", "read_sha256")
+
+    def __init__(self, path: str, size: int, sha256: str):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self.read_sha256: Optional[str] = None
+
+    def iter_text(self, chunk_bytes: int = READ_CHUNK_BYTES) -> Iterator[str]:
+        # Content changed since collection must not break a request mid-stream
+        digest = hashlib.sha256()
+        for text in iter_file_text(self.path, errors="replace", chunk_bytes=chunk_bytes):
+            digest.update(text.encode("utf-8"))
+            yield text
+        self.read_sha256 = digest.hexdigest()
+
+    def read(self) -> str:
+        return "".join(self.iter_text())
+
+    def __repr__(self) -> str:
+        return f"LazySource({self.path!r}, size={self.size})"
+
+
+SourceValue = Union[str, LazySource]
+
+
+def source_text(value: SourceValue) -> str:
+    """Return the text of a collected source, reading lazy references."""
+    return value.read() if isinstance(value, LazySource) else value
+
+
+def source_size(value: SourceValue) -> int:
+    """Return the size in bytes of a collected source without reading it."""
+    return value.size if isinstance(value, LazySource) else len(value.encode("utf-8"))
+
+
+def source_hash(value: SourceValue) -> str:
+    """Return the sha256 of a collected source's text without reading lazy references."""
+    if isinstance(value, LazySource):
+        return value.sha256
+    return content_hash(value)
+
+
+def sent_hash(value: SourceValue) -> str:
+    """Return the sha256 of the text last streamed for *value*.
+
+    Differs from ``source_hash`` only for a lazy reference whose file
+    changed between collection and sending.
+    """
+    if isinstance(value, LazySource) and value.read_sha256 is not None:
+        return value.read_sha256
+    return source_hash(value)
+
+
+class FeedCancelled(Exception):
+    """Raised in the collector thread when the consumer of a ``SourceFeed`` gave up."""
+
+
+class SourceFeed:
+    """Collected sources handed from a collector thread to the request encoder.
+
+    The collector calls ``plan`` with the stat size of the files it will
+    read, ``put`` for each file as soon as it is read and ``close`` when
+    done; the encoder iterates ``items()`` while that is still going on.
+    ``size_hint`` is the planned payload size in bytes, once known.
+    Everything fed is also kept in ``sources`` so a request can be resent.
+    Any number of readers may iterate at once (a retry replays the feed
+    while the abandoned upload thread can still be waiting in it).
+    """
+
+    def __init__(self, size_hint: Optional[int] = None):
+        self.size_hint = size_hint
+        self.sources: Dict[str, SourceValue] = {}
+        self._arrived: List[Tuple[str, SourceValue]] = []
+        self._changed = threading.Condition()
+        self._done = False
+        self._error: Optional[BaseException] = None
+        self._cancelled = False
+        self._planned = threading.Event()
+        if size_hint is not None:
+            self._planned.set()
+
+    # Collector side -----------------------------------------------------
+    def plan(self, total_bytes: int) -> None:
+        self.size_hint = total_bytes
+        self._planned.set()
+
+    def put(self, path: str, content: SourceValue) -> None:
+        if self._cancelled:
+            raise FeedCancelled()
+        with self._changed:
+            self.sources[path] = content
+            self._arrived.append((path, content))
+            self._changed.notify_all()
+
+    def close(self, error: Optional[BaseException] = None) -> None:
+        """Mark the feed complete; *error* is re-raised in the consumers."""
+        with self._changed:
+            self._done = True
+            self._error = error
+            self._changed.notify_all()
+        self._planned.set()
+
+    # Consumer side ------------------------------------------------------
+    def wait_planned(self) -> Optional[int]:
+        """Block until the collector knows its payload size (or finished) and return it."""
+        self._planned.wait()
+        return self.size_hint
+
+    def cancel(self) -> None:
+        """Stop the collector at its next ``put``."""
+        self._cancelled = True
+
+    def items(self) -> Iterator[Tuple[str, SourceValue]]:
+        """Yield ``(path, content)`` as files arrive; each call yields every file once."""
+        seen = 0
+        while True:
+            with self._changed:
+                while seen == len(self._arrived) and not self._done:
+                    self._changed.wait()
+                batch = self._arrived[seen:]
+                done, error = self._done, self._error
+            seen += len(batch)
+            yield from batch
+            if done and seen == len(self._arrived):
+                if error is not None:
+                    raise error
+                return
+
+    def result(self) -> Dict[str, SourceValue]:
+        """Wait for the collector to finish and return every fed source."""
+        with self._changed:
+            while not self._done:
+                self._changed.wait()
+        if self._error is not None:
+            raise self._error
+        return self.sources
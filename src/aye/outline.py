@@ -0,0 +1,116 @@
+# outline.py
+"""Compact outlines of Python files for the "outline" context mode.
+
+Files outside the prompt's focus are sent as their imports, class/def
+signatures, docstrings and module constants instead of their full text,
+which keeps cross-module awareness at a fraction of the payload.
+"""
+import ast
+import inspect
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+
+from .config import get_value
+from .lazy_source import SourceValue, source_hash, source_size, source_text
+from .relevance import focus_files
+
+# First line of every outline, so the assistant never mistakes it for the file
+OUTLINE_HEADER = "# [aye outline] Bodies omitted; request this file by name to see it in full.\n"
+# Default number of best-ranked files sent in full besides the ones named in the prompt
+DEFAULT_FOCUS_FILES = 5
+# Assigned values longer than this are elided
+_MAX_VALUE_CHARS = 80
+_CACHE_SIZE = 4096
+
+# content sha256 -> outline (None if the file does not parse)
+_cache: "OrderedDict[str, Optional[str]]" = OrderedDict()
+
+
+def _docstring_stmt(node: ast.AST) -> List[ast.stmt]:
+    """Return *node*'s docstring cut down to its summary paragraph, if it has one."""
+    body = getattr(node, "body", [])
+    if body and isinstance(body[0], ast.Expr) and isinstance(getattr(body[0], "value", None), ast.Constant) \
+            and isinstance(body[0].value.value, str):
+        summary = inspect.cleandoc(body[0].value.value).split("\n\n", 1)[0]
+        return [ast.Expr(value=ast.Constant(value=summary))]
+    return []
+
+
+def _ellipsis() -> ast.stmt:
+    return ast.Expr(value=ast.Constant(value=Ellipsis))
+
+
+def _shorten_assign(node: ast.stmt) -> ast.stmt:
+    value = getattr(node, "value", None)
+    if value is not None and len(ast.unparse(value)) > _MAX_VALUE_CHARS:
+        node.value = ast.Constant(value=Ellipsis)
+    return node
+
+
+def _is_constant_assign(node: ast.stmt) -> bool:
+    targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+    return all(isinstance(t, ast.Name) and t.id.isupper() for t in targets)
+
+
+def _outline_body(body: List[ast.stmt], in_class: bool) -> List[ast.stmt]:
+    out: List[ast.stmt] = []
+    for node in body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            out.append(node)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            node.body = _docstring_stmt(node) + [_ellipsis()]
+            out.append(node)
+        elif isinstance(node, ast.ClassDef):
+            node.body = _docstring_stmt(node) + _outline_body(node.body, in_class=True)
+            if not node.body:
+                node.body = [_ellipsis()]
+            out.append(node)
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)) and (in_class or _is_constant_assign(node)):
+            out.append(_shorten_assign(node))
+    return out
+
+
+def outline_python(source: SourceValue) -> Optional[str]:
+    """Return the outline of Python *source*, or None if it does not parse.
+
+    Results are cached by content hash for the lifetime of the process, so
+    a lazy reference is only read on a cache miss.
+    """
+    key = source_hash(source)
+    if key in _cache:
+        _cache.move_to_end(key)
+        return _cache[key]
+    try:
+        tree = ast.parse(source_text(source))
+        tree.body = _docstring_stmt(tree) + _outline_body(tree.body, in_class=False)
+        result: Optional[str] = OUTLINE_HEADER + ast.unparse(tree) + "\n"
+    except (SyntaxError, ValueError, RecursionError):
+        result = None
+    _cache[key] = result
+    if len(_cache) > _CACHE_SIZE:
+        _cache.popitem(last=False)
+    return result
+
+
+def outline_sources(sources: Dict[str, SourceValue], focus: Set[str]) -> Dict[str, SourceValue]:
+    """Replace every Python file outside *focus* with its outline, when that is smaller."""
+    result: Dict[str, SourceValue] = {}
+    for path, content in sources.items():
+        if path not in focus and path.endswith((".py", ".pyi")):
+            outline = outline_python(content)
+            if outline is not None and len(outline.encode("utf-8")) < source_size(content):
+                result[path] = outline
+                continue
+        result[path] = content
+    return result
+
+
+def apply_context_mode(prompt: str, sources: Dict[str, SourceValue],
+                       mode: Optional[str] = None) -> Dict[str, SourceValue]:
+    """Apply the ``context_mode`` config value ("full" or "outline") to *sources*."""
+    if mode is None:
+        mode = get_value("context_mode", "full")
+    if mode != "outline":
+        return sources
+    k = int(get_value("context_focus_files", DEFAULT_FOCUS_FILES))
+    return outline_sources(sources, focus_files(prompt, sources, k))
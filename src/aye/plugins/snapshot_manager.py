@@ -1,14 +1,26 @@
-import json
-import shutil
 from datetime import datetime
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 
+from aye.snapshot_index import get_index
+from aye.snapshot_store import (
+    BlobStore,
+    auto_pack_keep,
+    batch_ordinal,
+    collect_garbage,
+    delta_depth,
+    deltify_previous,
+    entry_digest,
+    entry_exists,
+    file_digest,
+    pack,
+    restore_entry,
+    snapshot_files,
+)
 from .base import Plugin
 from rich import print as rprint
 
 SNAP_ROOT = Path(".aye/snapshots").resolve()
-LATEST_SNAP_DIR = SNAP_ROOT / "latest"
 
 
 class SnapshotManagerPlugin(Plugin):
@@ -20,71 +32,27 @@ class SnapshotManagerPlugin(Plugin):
         """Initialize the snapshot manager plugin."""
         pass
 
+    def _index(self):
+        return get_index(SNAP_ROOT)
+
     def _get_next_ordinal(self) -> int:
-        """Get the next ordinal number by checking existing snapshot directories."""
-        if not SNAP_ROOT.is_dir():
-            return 1
-        
-        ordinals = []
-        for batch_dir in SNAP_ROOT.iterdir():
-            if batch_dir.is_dir() and "_" in batch_dir.name and batch_dir.name != "latest":
-                try:
-                    ordinal = int(batch_dir.name.split("_")[0])
-                    ordinals.append(ordinal)
-                except ValueError:
-                    continue
-        
-        return max(ordinals, default=0) + 1
+        """Get the next ordinal number from the snapshot index."""
+        latest = self._index().latest()
+        return (latest[0] if latest else 0) + 1
 
     def _get_latest_snapshot_dir(self) -> Optional[Path]:
-        """Get the latest snapshot directory by finding the one with the highest ordinal."""
-        if not SNAP_ROOT.is_dir():
-            return None
-        
-        snapshot_dirs = []
-        for batch_dir in SNAP_ROOT.iterdir():
-            if batch_dir.is_dir() and "_" in batch_dir.name and batch_dir.name != "latest":
-                try:
-                    ordinal = int(batch_dir.name.split("_")[0])
-                    snapshot_dirs.append((ordinal, batch_dir))
-                except ValueError:
-                    continue
-        
-        if not snapshot_dirs:
-            return None
-        
-        snapshot_dirs.sort(key=lambda x: x[0])
-        return snapshot_dirs[-1][1]
-
-    def _ensure_batch_dir(self, ts: str) -> Path:
-        """Create (or return) the batch directory for a given timestamp."""
-        ordinal = self._get_next_ordinal()
-        ordinal_str = f"{ordinal:03d}"
-        batch_dir_name = f"{ordinal_str}_{ts}"
-        batch_dir = SNAP_ROOT / batch_dir_name
-        batch_dir.mkdir(parents=True, exist_ok=True)
-        return batch_dir
+        """Get the latest snapshot directory (the one with the highest ordinal)."""
+        latest = self._index().latest()
+        return SNAP_ROOT / latest[1] if latest else None
 
     def _list_all_snapshots_with_metadata(self) -> List[str]:
         """List all snapshots in descending order with file names from metadata."""
-        if not SNAP_ROOT.is_dir():
-            return []
-
-        timestamps = [p.name for p in SNAP_ROOT.iterdir() if p.is_dir() and p.name != "latest"]
-        timestamps.sort(reverse=True)
         result = []
-        for ts in timestamps:
-            if "_" in ts:
-                ordinal_part, timestamp_part = ts.split("_", 1)
-                formatted_ts = f"{ordinal_part} ({timestamp_part})"
-            else:
-                formatted_ts = ts
-                
-            meta_path = SNAP_ROOT / ts / "metadata.json"
-            if meta_path.exists():
-                meta = json.loads(meta_path.read_text())
-                files = [Path(entry["original"]).name for entry in meta["files"]]
-                files_str = ",".join(files)
+        for _, name, files in self._index().batches():
+            ordinal_part, timestamp_part = name.split("_", 1)
+            formatted_ts = f"{ordinal_part} ({timestamp_part})"
+            if files is not None:
+                files_str = ",".join(Path(entry["original"]).name for entry in files)
                 result.append(f"{formatted_ts}  {files_str}")
             else:
                 result.append(f"{formatted_ts}  (metadata missing)")
@@ -96,106 +64,61 @@ class SnapshotManagerPlugin(Plugin):
             raise ValueError("No files supplied for snapshot")
 
         changed_files = []
-        latest_snap_dir = self._get_latest_snapshot_dir()
-        
+        latest_batch = self._index().latest()
+        latest: Dict[str, Any] = {}
+        if latest_batch is not None and latest_batch[2] is not None:
+            latest = {entry["original"]: entry for entry in latest_batch[2]}
+
         for src_path in file_paths:
             src_path = src_path.resolve()
-            if src_path.is_file():
-                current_content = src_path.read_text()
-                if latest_snap_dir is not None:
-                    snapshot_content_path = latest_snap_dir / src_path.name
-                    if snapshot_content_path.exists():
-                        snapshot_content = snapshot_content_path.read_text()
-                        if current_content == snapshot_content:
-                            continue
-                changed_files.append(src_path)
-            else:
-                changed_files.append(src_path)
+            entry = latest.get(str(src_path))
+            if src_path.is_file() and entry is not None:
+                if file_digest(src_path.read_bytes()) == entry_digest(entry):
+                    continue
+            changed_files.append(src_path)
         
         if not changed_files:
             return ""
 
         ts = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
-        batch_dir = self._ensure_batch_dir(ts)
-
-        meta_entries: List[Dict[str, Any]] = []
-
-        for src_path in changed_files:
-            dest_path = batch_dir / src_path.name
-
-            if src_path.is_file():
-                shutil.copy2(src_path, dest_path)
-            else:
-                dest_path.write_text("")
-
-            meta_entries.append(
-                {"original": str(src_path), "snapshot": str(dest_path)}
-            )
-
-        meta = {"timestamp": ts, "files": meta_entries}
-        (batch_dir / "metadata.json").write_text(json.dumps(meta, indent=2))
-
-        if LATEST_SNAP_DIR.exists():
-            shutil.rmtree(LATEST_SNAP_DIR)
-        
-        LATEST_SNAP_DIR.mkdir(parents=True, exist_ok=True)
-        for src_path in changed_files:
-            dest_path = LATEST_SNAP_DIR / src_path.name
-            if src_path.is_file():
-                shutil.copy2(src_path, dest_path)
-            else:
-                dest_path.write_text("")
-
-        return batch_dir.name
+        store = BlobStore(SNAP_ROOT)
+        meta_entries = snapshot_files(store, changed_files)
+        depth = delta_depth()
+        if depth:
+            for entry in meta_entries:
+                history = [e for _, e in self._index().history(entry["original"])]
+                deltify_previous(store, entry, history, depth)
+        name = self._index().add_batch(ts, meta_entries)
+
+        keep = auto_pack_keep()
+        if keep and batch_ordinal(SNAP_ROOT / name) % keep == 0:
+            packed, _, removed = pack(SNAP_ROOT, keep)
+            if packed or removed:
+                self._index().rebuild()  # Packed batches moved out of their directories
+        return name
 
     def list_snapshots(self, file: Optional[Path] = None) -> List[str]:
         """List snapshots for a file or all snapshots."""
         if file is None:
             return self._list_all_snapshots_with_metadata()
-        
-        if not SNAP_ROOT.is_dir():
-            return []
-
-        snapshots = []
-        for batch_dir in SNAP_ROOT.iterdir():
-            if batch_dir.is_dir() and batch_dir.name != "latest":
-                meta_path = batch_dir / "metadata.json"
-                if meta_path.exists():
-                    meta = json.loads(meta_path.read_text())
-                    for entry in meta["files"]:
-                        if Path(entry["original"]) == file.resolve():
-                            snapshots.append((batch_dir.name, entry["snapshot"]))
-        snapshots.sort(key=lambda x: x[0], reverse=True)
-        return snapshots
+        return self._index().history(str(file.resolve()))
 
     def restore_snapshot(self, ordinal: Optional[str] = None, file_name: Optional[str] = None) -> None:
         """Restore files from a snapshot."""
+        index = self._index()
         if ordinal is None:
-            timestamps = self.list_snapshots()
-            if not timestamps:
-                raise ValueError("No snapshots found")
-            ordinal = timestamps[0].split()[0].split("(")[0] if timestamps else None
-            if not ordinal:
+            batch = index.latest()
+            if batch is None:
                 raise ValueError("No snapshots found")
+            ordinal = batch[1].split("_")[0]
+        else:
+            batch = index.find(int(ordinal)) if ordinal.isdigit() else None
 
-        batch_dir = None
-        if ordinal.isdigit() and len(ordinal) == 3:
-            for dir_path in SNAP_ROOT.iterdir():
-                if dir_path.is_dir() and dir_path.name.startswith(f"{ordinal}_"):
-                    batch_dir = dir_path
-                    break
-        
-        if batch_dir is None:
+        if batch is None:
             raise ValueError(f"Snapshot with ordinal {ordinal} not found")
-
-        meta_file = batch_dir / "metadata.json"
-        if not meta_file.is_file():
-            raise ValueError(f"Metadata missing for snapshot {ordinal}")
-
-        try:
-            meta = json.loads(meta_file.read_text())
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Invalid metadata for snapshot {ordinal}: {e}")
+        if batch[2] is None:
+            raise ValueError(f"Metadata missing or invalid for snapshot {ordinal}")
+        meta = {"files": batch[2]}
 
         if file_name is not None:
             filtered_entries = [
@@ -206,17 +129,16 @@ class SnapshotManagerPlugin(Plugin):
                 raise ValueError(f"File '{file_name}' not found in snapshot {ordinal}")
             meta["files"] = filtered_entries
 
+        store = BlobStore(SNAP_ROOT)
         for entry in meta["files"]:
             original = Path(entry["original"])
-            snapshot_path = Path(entry["snapshot"])
             
-            if not snapshot_path.exists():
-                print(f"Warning: snapshot file missing – {snapshot_path}")
+            if not entry_exists(store, entry):
+                print(f"Warning: snapshot content missing – {entry.get('blob') or entry.get('snapshot')}")
                 continue
                 
             try:
-                original.parent.mkdir(parents=True, exist_ok=True)
-                shutil.copy2(snapshot_path, original)
+                restore_entry(store, entry, original)
             except Exception as e:
                 print(f"Warning: failed to restore {original}: {e}")
                 continue
@@ -243,36 +165,24 @@ class SnapshotManagerPlugin(Plugin):
 
     def prune_snapshots(self, keep_count: int = 10) -> int:
         """Delete all but the most recent N snapshots. Returns number of deleted snapshots."""
-        if not SNAP_ROOT.is_dir():
-            return 0
-
-        snapshots = []
-        for batch_dir in SNAP_ROOT.iterdir():
-            if batch_dir.is_dir() and "_" in batch_dir.name and batch_dir.name != "latest":
-                try:
-                    ts_part = batch_dir.name.split("_", 1)[1]
-                    snapshot_time = datetime.strptime(ts_part, "%Y%m%dT%H%M%S")
-                    snapshots.append((snapshot_time, batch_dir))
-                except (ValueError, IndexError):
-                    continue
-
-        # Sort by timestamp (oldest first)
-        snapshots.sort(key=lambda x: x[0])
+        index = self._index()
+        snapshots = index.batches()  # Newest first
         
         if len(snapshots) <= keep_count:
             return 0
         
         # Delete the oldest snapshots
-        to_delete = snapshots[:-keep_count]
+        to_delete = snapshots[keep_count:]
         deleted_count = 0
         
-        for _, snapshot_dir in to_delete:
+        for ordinal, _, _ in to_delete:
             try:
-                shutil.rmtree(snapshot_dir)
+                index.remove(ordinal)
                 deleted_count += 1
             except Exception:
                 continue
-        
+
+        collect_garbage(SNAP_ROOT)
         return deleted_count
 
     def _handle_history_command(self) -> None:
@@ -0,0 +1,233 @@
+# relevance.py
+"""Prompt-relevance ranking of collected sources.
+
+A small BM25 index over identifiers and path components decides which
+files to send with a prompt when the full tree does not fit the configured
+budget. The index is persisted under ``.aye/`` and updated incrementally:
+only files whose content hash changed are re-tokenized.
+"""
+import json
+import math
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .config import get_value
+from .lazy_source import SourceValue, source_hash, source_size, source_text
+
+INDEX_FILE = Path(".aye/relevance_index.json").resolve()
+INDEX_VERSION = 1
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# Path components count as this many occurrences of a term
+PATH_WEIGHT = 3
+
+_WORD_RE = re.compile(r"[A-Za-z][A-Za-z0-9_]*")
+_CAMEL_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+_STOPWORDS = frozenset("""
+    a an and are as at be by can do does for from has have how i if in into is it its me
+    my not of on or our please should so that the their then there these this to us was
+    we what when where which why will with you your self none true false def class import
+    return pass else elif try except raise lambda
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Split *text* into lowercase terms: whole identifiers plus their camel/snake parts."""
+    terms: List[str] = []
+    for word in _WORD_RE.findall(text):
+        lower = word.lower()
+        parts = [p.lower() for chunk in word.split("_") for p in _CAMEL_RE.findall(chunk)]
+        if len(parts) > 1 and lower not in _STOPWORDS:
+            terms.append(lower)
+        terms.extend(p for p in parts if len(p) > 1 and p not in _STOPWORDS)
+    return terms
+
+
+def _term_counts(path: str, content: str) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for term in tokenize(content):
+        counts[term] = counts.get(term, 0) + 1
+    for term in tokenize(path.replace("/", " ").replace(".", " ")):
+        counts[term] = counts.get(term, 0) + PATH_WEIGHT
+    return counts
+
+
+class RelevanceIndex:
+    """Incrementally maintained BM25 index over a set of source files.
+
+    Documents are stored as sparse term-frequency maps; an inverted index
+    (term -> {path: tf}) makes scoring cost proportional to the postings of
+    the query terms rather than to the size of the repository.
+    """
+
+    def __init__(self, index_file: Path = INDEX_FILE):
+        self.index_file = index_file
+        # path -> {"hash": str, "len": int, "tf": {term: count}}
+        self._docs: Dict[str, Dict] = {}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._total_len = 0
+        self._dirty = False
+        self._load()
+
+    def _load(self) -> None:
+        if not self.index_file.is_file():
+            return
+        try:
+            data = json.loads(self.index_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if data.get("version") != INDEX_VERSION:
+            return
+        for path, doc in data.get("docs", {}).items():
+            self._add(path, doc)
+
+    def _add(self, path: str, doc: Dict) -> None:
+        self._docs[path] = doc
+        self._total_len += doc["len"]
+        for term, tf in doc["tf"].items():
+            self._postings.setdefault(term, {})[path] = tf
+
+    def _remove(self, path: str) -> None:
+        doc = self._docs.pop(path)
+        self._total_len -= doc["len"]
+        for term in doc["tf"]:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(path, None)
+                if not postings:
+                    del self._postings[term]
+
+    def update(self, sources: Dict[str, SourceValue], prune: bool = True) -> None:
+        """Bring the index in line with *sources*, re-tokenizing only changed files.
+
+        With *prune* False, documents missing from *sources* are kept (used
+        when ranking a subset that was already selected from the full tree).
+        """
+        if prune:
+            for path in [p for p in self._docs if p not in sources]:
+                self._remove(path)
+                self._dirty = True
+        for path, content in sources.items():
+            digest = source_hash(content)
+            doc = self._docs.get(path)
+            if doc is not None and doc["hash"] == digest:
+                continue
+            if doc is not None:
+                self._remove(path)
+            tf = _term_counts(path, source_text(content))
+            self._add(path, {"hash": digest, "len": sum(tf.values()), "tf": tf})
+            self._dirty = True
+
+    def score(self, query: str) -> Dict[str, float]:
+        """Return BM25 scores of every document matching at least one query term."""
+        n_docs = len(self._docs)
+        if not n_docs:
+            return {}
+        avg_len = self._total_len / n_docs or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for path, tf in postings.items():
+                norm = K1 * (1 - B + B * self._docs[path]["len"] / avg_len)
+                scores[path] = scores.get(path, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+        return scores
+
+    def save(self) -> None:
+        """Persist the index atomically if it changed."""
+        if not self._dirty:
+            return
+        self.index_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.index_file.with_suffix(".tmp")
+        tmp_file.write_text(json.dumps({"version": INDEX_VERSION, "docs": self._docs}), encoding="utf-8")
+        os.replace(tmp_file, self.index_file)
+        self._dirty = False
+
+
+# Session-wide index, loaded on first use
+_index: Optional[RelevanceIndex] = None
+
+
+def get_index() -> RelevanceIndex:
+    global _index
+    if _index is None:
+        _index = RelevanceIndex()
+    return _index
+
+
+def mentioned_files(prompt: str, paths: Iterable[str]) -> Set[str]:
+    """Return the paths named in *prompt*, by relative path or by file name."""
+    words = set(re.findall(r"[\w./\\-]+", prompt))
+    words |= {w.strip(".,:;") for w in words}
+    named: Set[str] = set()
+    for path in paths:
+        if path in words or path.rpartition("/")[2] in words:
+            named.add(path)
+    return named
+
+
+def rank_sources(prompt: str, sources: Dict[str, SourceValue],
+                 index: Optional[RelevanceIndex] = None, prune: bool = True) -> List[Tuple[str, float]]:
+    """Rank *sources* for *prompt*: named files first, then by BM25 score, then by path."""
+    index = index if index is not None else get_index()
+    index.update(sources, prune=prune)
+    index.save()
+    scores = index.score(prompt)
+    named = mentioned_files(prompt, sources)
+    return sorted(
+        ((path, scores.get(path, 0.0)) for path in sources),
+        key=lambda item: (item[0] not in named, -item[1], item[0]),
+    )
+
+
+def select_sources(prompt: str, sources: Dict[str, SourceValue],
+                   budget_bytes: Optional[int] = None,
+                   top_k: Optional[int] = None,
+                   index: Optional[RelevanceIndex] = None) -> Dict[str, SourceValue]:
+    """Return the most relevant subset of *sources* that fits the budget.
+
+    *budget_bytes* and *top_k* default to the ``context_budget_bytes`` and
+    ``context_top_k`` config values; with neither set, *sources* is returned
+    unchanged. Files named in the prompt are always included.
+    """
+    if budget_bytes is None:
+        budget_bytes = get_value("context_budget_bytes")
+    if top_k is None:
+        top_k = get_value("context_top_k")
+    if budget_bytes is None and top_k is None:
+        return sources
+
+    named = mentioned_files(prompt, sources)
+    selected: Dict[str, SourceValue] = {}
+    used = 0
+    for path, _score in rank_sources(prompt, sources, index):
+        size = source_size(sources[path])
+        if path not in named:
+            if top_k is not None and len(selected) >= int(top_k):
+                continue
+            if budget_bytes is not None and used + size > int(budget_bytes):
+                continue
+        selected[path] = sources[path]
+        used += size
+    return dict(sorted(selected.items()))
+
+
+def focus_files(prompt: str, sources: Dict[str, SourceValue], top_k: int,
+                index: Optional[RelevanceIndex] = None) -> Set[str]:
+    """Return the files named in *prompt* plus the *top_k* best-scoring others."""
+    named = mentioned_files(prompt, sources)
+    focus = set(named)
+    for path, score in rank_sources(prompt, sources, index, prune=False):
+        if path in named:
+            continue
+        if score <= 0 or len(focus) - len(named) >= top_k:
+            break
+        focus.add(path)
+    return focus
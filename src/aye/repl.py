@@ -12,22 +12,28 @@ from prompt_toolkit.shortcuts import CompleteStyle
 from rich.console import Console
 from rich.live import Live
 from rich.spinner import Spinner
+from rich.status import Status
 from rich.text import Text
 from rich import print as rprint
 
-from .service import (
-    process_chat_message,
-    filter_unchanged_files
-)
+from .service import process_chat_message
 
+from .api import close_clients
+from .config import get_value
+from .delta import DeltaState
+from .source_cache import SourceCache
+from .source_watcher import SourceWatcher
+from .turn import TurnCancelled, TurnEngine, close_engine, get_engine
 from .ui import (
     print_welcome_message,
     print_help_message,
     print_prompt,
     print_error,
     print_assistant_response,
+    format_streaming_response,
     print_no_files_changed,
-    print_files_updated
+    print_files_updated,
+    print_turn_timings
 )
 
 
@@ -72,6 +78,31 @@ def chat_repl(conf) -> None:
         except ValueError:
             chat_id_file.unlink(missing_ok=True)  # Clear invalid file
 
+    # Source cache shared by every turn of this session; persisted on exit
+    source_cache = SourceCache()
+    # Opt-in: upload each file's content once per chat (needs server support)
+    delta_state = DeltaState() if get_value("delta_upload", False) else None
+    # Follow file changes in the background so prompts need no scan
+    watcher = None
+    if get_value("watch_sources", True):
+        watcher = SourceWatcher(conf.root, conf.file_mask, source_cache).start()
+    # One event loop for every turn, so the async client keeps its connections
+    engine = get_engine()
+    try:
+        _chat_loop(conf, session, console, chat_id_file, chat_id, source_cache, watcher, delta_state, engine)
+    finally:
+        close_engine()
+        if watcher is not None:
+            watcher.stop()
+        source_cache.save()
+        if delta_state is not None:
+            delta_state.save()
+        close_clients()
+
+
+def _chat_loop(conf, session: PromptSession, console: Console, chat_id_file: Path,
+               chat_id: int, source_cache: SourceCache, watcher: Optional[SourceWatcher],
+               delta_state: Optional[DeltaState] = None, engine: Optional[TurnEngine] = None) -> None:
     while True:
         try:
             prompt = session.prompt(print_prompt())
@@ -147,7 +178,20 @@ def chat_repl(conf) -> None:
             try:
                 spinner = Spinner("dots", text="[yellow]Thinking...[/]")
                 with console.status(spinner) as status:
-                    result = process_chat_message(prompt, chat_id, conf.root, conf.file_mask)
+                    streamed = format_streaming_response("")
+
+                    def show_summary(text: str, streamed: Text = streamed, status: Status = status) -> None:
+                        # Render the answer while it streams in; printed for good below
+                        status.update(format_streaming_response(text, streamed))
+
+                    result = process_chat_message(prompt, chat_id, conf.root, conf.file_mask,
+                                                  cache=source_cache, watcher=watcher,
+                                                  delta=delta_state, on_summary=show_summary,
+                                                  engine=engine)
+            except TurnCancelled:
+                # Ctrl-C: the request was closed, the session goes on
+                console.print("[yellow]Request cancelled.[/]")
+                continue
             except Exception as exc:
                 # If the exception is a HTTP‑error with a 403 status, handle it specially
                 if hasattr(exc, "response") and getattr(exc.response, "status_code", None) == 403:
@@ -174,11 +218,11 @@ def chat_repl(conf) -> None:
         # Print results after the Live context manager has exited
         summary = result["summary"]
         print_assistant_response(summary)
+        if get_value("show_timings", False):
+            print_turn_timings(console, result["timings"])
 
-        updated_files = result["updated_files"]
-        
-        # Filter unchanged files
-        updated_files = filter_unchanged_files(updated_files)
+        # Files whose content differs from disk (compared as they streamed in)
+        updated_files = result["changed_files"]
         
         if not updated_files:
             print_no_files_changed(console)
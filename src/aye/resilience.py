@@ -0,0 +1,123 @@
+# resilience.py
+"""Retry and circuit-breaker policy for requests to the aye backend.
+
+``api`` retries a request that failed before any of its response was used
+(connection errors, pool/connect timeouts, 429/502/503/504) after a
+jittered exponential backoff, re-sending the same ``Idempotency-Key`` so
+the server can drop duplicates. A circuit breaker per server counts
+consecutive failures; once it opens, requests fail at once with
+``BackendUnavailableError`` until the cool-down has passed, and then a
+single trial request decides whether it closes again.
+
+All limits are config values (``aye config set max_retries 5``, ...).
+"""
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+import httpx
+
+from .config import get_value
+
+DEFAULT_MAX_RETRIES = 3
+# Backoff before retry n is uniform in [0, min(cap, base * 2**n)] seconds ("full jitter")
+DEFAULT_RETRY_BACKOFF = 0.5
+DEFAULT_RETRY_BACKOFF_MAX = 8.0
+# Consecutive failures that open the breaker, and how long it stays open
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_COOLDOWN = 30.0
+
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+# Failures that happen before the server could have acted on the request
+# body, or that a proxy reports for a backend it could not reach
+RETRY_ERRORS = (
+    httpx.ConnectError,
+    httpx.ConnectTimeout,
+    httpx.PoolTimeout,
+    httpx.RemoteProtocolError,
+    httpx.ReadError,
+    httpx.WriteError,
+)
+
+
+class BackendUnavailableError(RuntimeError):
+    """Raised without contacting the server while its circuit breaker is open."""
+
+
+def _config_number(key: str, default: float) -> float:
+    try:
+        return max(0.0, float(get_value(key, default)))
+    except (TypeError, ValueError):
+        return default
+
+
+def max_retries() -> int:
+    return int(_config_number("max_retries", DEFAULT_MAX_RETRIES))
+
+
+def retry_delay(attempt: int, resp: Optional[httpx.Response] = None) -> float:
+    """Seconds to wait before retry number *attempt* (0-based).
+
+    A ``Retry-After`` header in seconds is honoured, up to the backoff cap.
+    """
+    cap = _config_number("retry_backoff_max", DEFAULT_RETRY_BACKOFF_MAX)
+    if resp is not None:
+        try:
+            return min(cap, max(0.0, float(resp.headers.get("retry-after", ""))))
+        except ValueError:
+            pass  # Missing, or an HTTP date: use the backoff
+    base = _config_number("retry_backoff", DEFAULT_RETRY_BACKOFF)
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker for one server."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def check(self) -> None:
+        """Raise ``BackendUnavailableError`` if requests should not be sent now."""
+        cooldown = _config_number("breaker_cooldown", DEFAULT_BREAKER_COOLDOWN)
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.opened_at + cooldown - time.monotonic()
+            if remaining <= 0 and not self._trial:
+                self._trial = True  # Half-open: let one request through
+                return
+        wait = f"retrying in {remaining:.0f} s" if remaining > 0 else "a trial request is in flight"
+        raise BackendUnavailableError(
+            f"{self.name} is unavailable after {self.failures} consecutive failures ({wait})."
+        )
+
+    def success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def failure(self) -> None:
+        threshold = int(_config_number("breaker_threshold", DEFAULT_BREAKER_THRESHOLD))
+        with self._lock:
+            self.failures += 1
+            if threshold and (self._trial or self.failures >= threshold):
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(base_url: str) -> CircuitBreaker:
+    """Return the circuit breaker of the server at *base_url*."""
+    with _breakers_lock:
+        if base_url not in _breakers:
+            _breakers[base_url] = CircuitBreaker(base_url)
+        return _breakers[base_url]
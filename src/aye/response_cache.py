@@ -0,0 +1,176 @@
+# response_cache.py
+"""Opt-in on-disk cache of backend answers.
+
+``aye generate`` and chat turns that repeat a prompt in the same chat
+context over an unchanged source tree can be answered from disk instead of
+a round trip. Enable with ``aye config set response_cache true``.
+
+Entries are keyed by sha256 of (prompt, chat context, Merkle root of the
+sources sent) and stored one JSON file each under ``.aye/response_cache/``.
+An entry expires ``response_cache_ttl`` seconds after it was written; the
+file mtime records its last use, and the least recently used entries are
+evicted once the directory exceeds ``response_cache_max_bytes``.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from . import codec
+from .config import get_value
+from .lazy_source import SourceValue, source_hash
+
+CACHE_DIR = Path(".aye/response_cache").resolve()
+CACHE_VERSION = 1
+STATS_FILE = "stats.json"
+
+DEFAULT_TTL = 24 * 3600
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def merkle_root(sources: Dict[str, SourceValue]) -> str:
+    """Return the Merkle hash of a ``path -> content`` map.
+
+    A file's leaf is its content sha256; a directory hashes the sorted
+    ``name``/child-hash pairs below it, so the root changes iff some path
+    or content does. Lazy sources contribute their collection-time hash
+    and are not read.
+    """
+    tree: Dict[str, Any] = {}
+    for path, content in sources.items():
+        node = tree
+        *dirs, name = path.replace("\\", "/").split("/")
+        for part in dirs:
+            node = node.setdefault(part + "/", {})
+        node[name] = source_hash(content)
+
+    def digest(node: Dict[str, Any]) -> str:
+        h = hashlib.sha256()
+        for name in sorted(node):
+            child = node[name]
+            h.update(name.encode("utf-8") + b"\0")
+            h.update((digest(child) if isinstance(child, dict) else child).encode("ascii") + b"\n")
+        return h.hexdigest()
+
+    return digest(tree)
+
+
+def response_key(prompt: str, context: Any, sources: Dict[str, SourceValue]) -> str:
+    """Cache key of a request: *prompt*, its chat *context* and the source tree."""
+    canonical = json.dumps([prompt, context, merkle_root(sources)], separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Directory of cached responses with TTL expiry and size-bounded LRU eviction."""
+
+    def __init__(self, cache_dir: Path = CACHE_DIR, ttl: float = DEFAULT_TTL,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _entry(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def _entries(self) -> List[os.DirEntry]:
+        try:
+            return [e for e in os.scandir(self.cache_dir) if e.name.endswith(".json") and e.name != STATS_FILE]
+        except FileNotFoundError:
+            return []
+
+    def _count(self, field: str) -> None:
+        stats_file = self.cache_dir / STATS_FILE
+        try:
+            stats = json.loads(stats_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            stats = {}
+        stats[field] = stats.get(field, 0) + 1
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            stats_file.write_text(json.dumps(stats), encoding="utf-8")
+        except OSError:
+            pass  # Counters are best effort
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached response for *key*, or None if missing or expired."""
+        path = self._entry(key)
+        with self._lock:
+            try:
+                entry = codec.loads(path.read_bytes())
+            except (OSError, ValueError):
+                self._count("misses")
+                return None
+            if entry.get("version") != CACHE_VERSION or time.time() - entry.get("created", 0) > self.ttl:
+                path.unlink(missing_ok=True)
+                self._count("misses")
+                return None
+            os.utime(path)  # Mark as recently used
+            self._count("hits")
+            return entry["response"]
+
+    def put(self, key: str, response: Dict[str, Any]) -> None:
+        """Store *response* under *key*, then evict down to the size bound."""
+        data = codec.dumpb({"version": CACHE_VERSION, "created": time.time(), "response": response})
+        with self._lock:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path = self._entry(key)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+            self._evict()
+
+    def _evict(self) -> None:
+        entries = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in self._entries()]
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.unlink(path)
+            total -= size
+            self._count("evictions")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return entry count, size on disk, limits and hit/miss counters."""
+        with self._lock:
+            entries = self._entries()
+            try:
+                counters = json.loads((self.cache_dir / STATS_FILE).read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                counters = {}
+        return {
+            "entries": len(entries),
+            "bytes": sum(e.stat().st_size for e in entries),
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "evictions": counters.get("evictions", 0),
+        }
+
+    def clear(self) -> int:
+        """Delete every entry and the counters; return the number of entries removed."""
+        with self._lock:
+            entries = self._entries()
+            for entry in entries:
+                os.unlink(entry.path)
+            (self.cache_dir / STATS_FILE).unlink(missing_ok=True)
+        return len(entries)
+
+
+def get_response_cache() -> ResponseCache:
+    """Return the cache configured by ``response_cache_ttl`` / ``response_cache_max_bytes``."""
+    return ResponseCache(CACHE_DIR,
+                         ttl=float(get_value("response_cache_ttl", DEFAULT_TTL)),
+                         max_bytes=int(get_value("response_cache_max_bytes", DEFAULT_MAX_BYTES)))
+
+
+def active_response_cache() -> Optional[ResponseCache]:
+    """Return the response cache if it is enabled in config, else None."""
+    if not get_value("response_cache", False):
+        return None
+    return get_response_cache()
@@ -0,0 +1,326 @@
+# response_stream.py
+"""Streamed ``invoke_cli`` responses (NDJSON or server-sent events).
+
+A streaming server sends events instead of one JSON document:
+
+* ``{"type": "delta", "text": "..."}`` – the next fragment of the
+  ``assistant_response`` JSON text, as the model produces it;
+* ``{"type": "done", ...}`` – the remaining response fields (``chat_id``, …);
+* ``{"type": "error", "detail": "..."}`` – the generation failed.
+
+Events arrive one JSON object per line (``application/x-ndjson``) or as
+``data:`` lines (``text/event-stream``). The fragments are fed to an
+incremental JSON parser, so ``answer_summary`` text is reported as soon as
+it is decoded and each ``source_files`` entry as soon as it is complete.
+"""
+import json
+import re
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from . import codec
+
+STREAM_CONTENT_TYPES = ("application/x-ndjson", "text/event-stream")
+# Sent with invoke_cli requests: streamed formats first, plain JSON still accepted
+STREAM_ACCEPT = "application/x-ndjson, text/event-stream;q=0.9, application/json;q=0.8"
+
+Path_ = Tuple[Any, ...]
+
+_WS = " \t\r\n"
+_STRING_SPECIAL = re.compile(r'["\\]')
+_LITERAL_END = re.compile(r'[,\]}\s]')
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class IncrementalJSONParser:
+    """Push parser for one JSON document delivered in arbitrary text fragments.
+
+    *on_string_chunk(path, text)* receives string values piece by piece as
+    they are decoded; *on_value(path, value)* is called for every completed
+    value. ``path`` is the tuple of keys and list indexes leading to it, e.g.
+    ``("source_files", 0)``. The whole document is available as ``result``
+    after ``close()``.
+    """
+
+    def __init__(self,
+                 on_string_chunk: Optional[Callable[[Path_, str], None]] = None,
+                 on_value: Optional[Callable[[Path_, Any], None]] = None):
+        self.on_string_chunk = on_string_chunk
+        self.on_value = on_value
+        self.result: Any = None
+        self._buf = ""
+        # Open containers as [container, pending key]
+        self._stack: List[List[Any]] = []
+        # value, value_or_end, key_or_end, key, colon, comma_or_end, done
+        self._expect = "value"
+        self._string: Optional[List[str]] = None
+        self._string_is_key = False
+        self._string_path: Path_ = ()
+
+    def feed(self, text: str) -> None:
+        self._buf += text
+        pos = self._parse(0)
+        self._buf = self._buf[pos:]
+
+    def close(self) -> Any:
+        """Finish the document and return it; raises ``ValueError`` if it is incomplete."""
+        if self._expect == "value" and not self._stack and self._buf.strip():
+            # A top-level scalar has no closing delimiter
+            self._finish_value(self._decode_literal(self._buf.strip()))
+            self._buf = ""
+        if self._expect != "done" or self._buf.strip():
+            raise ValueError("incomplete JSON document in streamed response")
+        return self.result
+
+    # ------------------------------------------------------------------
+    def _path(self) -> Path_:
+        return tuple(frame[1] if isinstance(frame[0], dict) else len(frame[0]) for frame in self._stack)
+
+    def _finish_value(self, value: Any) -> None:
+        if self.on_value is not None:
+            self.on_value(self._path(), value)
+        if not self._stack:
+            self.result = value
+            self._expect = "done"
+            return
+        container, key = self._stack[-1]
+        if isinstance(container, dict):
+            container[key] = value
+        else:
+            container.append(value)
+        self._expect = "comma_or_end"
+
+    @staticmethod
+    def _decode_literal(token: str) -> Any:
+        try:
+            return json.loads(token)
+        except ValueError:
+            raise ValueError(f"invalid JSON literal {token[:20]!r} in streamed response") from None
+
+    def _parse(self, pos: int) -> int:
+        buf = self._buf
+        end = len(buf)
+        while pos < end:
+            if self._string is not None:
+                pos = self._parse_string(pos)
+                if self._string is not None:
+                    return pos  # Need more input
+                continue
+            ch = buf[pos]
+            if ch in _WS:
+                pos += 1
+                continue
+            expect = self._expect
+            if expect == "done":
+                raise ValueError("unexpected data after JSON document in streamed response")
+            if expect in ("value", "value_or_end"):
+                if ch == "]" and expect == "value_or_end":
+                    pos += 1
+                    self._finish_value(self._stack.pop()[0])
+                elif ch == "{":
+                    pos += 1
+                    self._stack.append([{}, None])
+                    self._expect = "key_or_end"
+                elif ch == "[":
+                    pos += 1
+                    self._stack.append([[], None])
+                    self._expect = "value_or_end"
+                elif ch == '"':
+                    pos += 1
+                    self._start_string(is_key=False)
+                else:
+                    match = _LITERAL_END.search(buf, pos)
+                    if match is None:
+                        return pos  # Literal may continue in the next fragment
+                    self._finish_value(self._decode_literal(buf[pos:match.start()]))
+                    pos = match.start()
+            elif expect in ("key_or_end", "key"):
+                if ch == "}" and expect == "key_or_end":
+                    pos += 1
+                    self._finish_value(self._stack.pop()[0])
+                elif ch == '"':
+                    pos += 1
+                    self._start_string(is_key=True)
+                else:
+                    raise ValueError(f"expected an object key in streamed response, got {ch!r}")
+            elif expect == "colon":
+                if ch != ":":
+                    raise ValueError(f"expected ':' in streamed response, got {ch!r}")
+                pos += 1
+                self._expect = "value"
+            elif expect == "comma_or_end":
+                container = self._stack[-1][0]
+                closer = "}" if isinstance(container, dict) else "]"
+                pos += 1
+                if ch == ",":
+                    self._expect = "key" if isinstance(container, dict) else "value"
+                elif ch == closer:
+                    self._finish_value(self._stack.pop()[0])
+                else:
+                    raise ValueError(f"expected ',' or {closer!r} in streamed response, got {ch!r}")
+        return pos
+
+    def _start_string(self, is_key: bool) -> None:
+        self._string = []
+        self._string_is_key = is_key
+        self._string_path = () if is_key else self._path()
+
+    def _emit_chunk(self, text: str) -> None:
+        self._string.append(text)
+        if not self._string_is_key and self.on_string_chunk is not None:
+            self.on_string_chunk(self._string_path, text)
+
+    def _parse_string(self, pos: int) -> int:
+        """Consume string content from *pos*; leaves ``_string`` set while unterminated."""
+        buf = self._buf
+        while True:
+            match = _STRING_SPECIAL.search(buf, pos)
+            stop = match.start() if match else len(buf)
+            if stop > pos:
+                self._emit_chunk(buf[pos:stop])
+            if match is None:
+                return len(buf)
+            pos = stop
+            if buf[pos] == '"':
+                value = "".join(self._string)
+                self._string = None
+                if self._string_is_key:
+                    self._stack[-1][1] = value
+                    self._expect = "colon"
+                else:
+                    self._finish_value(value)
+                return pos + 1
+            # Backslash escape; wait for the whole sequence
+            if pos + 1 >= len(buf):
+                return pos
+            kind = buf[pos + 1]
+            if kind != "u":
+                if kind not in _ESCAPES:
+                    raise ValueError(f"invalid escape \\{kind} in streamed response")
+                self._emit_chunk(_ESCAPES[kind])
+                pos += 2
+                continue
+            if pos + 6 > len(buf):
+                return pos
+            code = int(buf[pos + 2:pos + 6], 16)
+            if 0xD800 <= code < 0xDC00:
+                # High surrogate: decode together with the low half that follows
+                if pos + 12 > len(buf):
+                    return pos
+                self._emit_chunk(json.loads('"' + buf[pos:pos + 12] + '"'))
+                pos += 12
+            else:
+                self._emit_chunk(chr(code))
+                pos += 6
+
+
+def is_streamed(resp: httpx.Response) -> bool:
+    content_type = resp.headers.get("content-type", "").split(";")[0].strip().lower()
+    return content_type in STREAM_CONTENT_TYPES
+
+
+class _EventReader:
+    """Splits response lines into JSON events (NDJSON or server-sent events)."""
+
+    def __init__(self, resp: httpx.Response):
+        self._sse = resp.headers.get("content-type", "").lower().startswith("text/event-stream")
+        self._data: List[str] = []
+
+    def line(self, line: str) -> Optional[Dict[str, Any]]:
+        if not self._sse:
+            return codec.loads(line) if line.strip() else None
+        if not line:
+            if self._data:
+                event, self._data = codec.loads("\n".join(self._data)), []
+                return event
+        elif line.startswith("data:"):
+            self._data.append(line[5:].lstrip(" "))
+        # Comments (":") and other fields (event:, id:, retry:) are not used
+        return None
+
+    def end(self) -> Optional[Dict[str, Any]]:
+        return codec.loads("\n".join(self._data)) if self._data else None
+
+
+def iter_events(resp: httpx.Response) -> Iterator[Dict[str, Any]]:
+    """Yield the JSON events of an NDJSON or server-sent-events response."""
+    reader = _EventReader(resp)
+    for line in resp.iter_lines():
+        event = reader.line(line)
+        if event is not None:
+            yield event
+    event = reader.end()
+    if event is not None:
+        yield event
+
+
+async def aiter_events(resp: httpx.Response) -> AsyncIterator[Dict[str, Any]]:
+    """Async counterpart of ``iter_events``."""
+    reader = _EventReader(resp)
+    async for line in resp.aiter_lines():
+        event = reader.line(line)
+        if event is not None:
+            yield event
+    event = reader.end()
+    if event is not None:
+        yield event
+
+
+class _ResponseAssembler:
+    """Turns stream events into the fields of a buffered ``invoke_cli`` response."""
+
+    def __init__(self, on_summary: Optional[Callable[[str], None]],
+                 on_file: Optional[Callable[[Dict[str, Any]], None]]):
+        def string_chunk(path: Path_, text: str) -> None:
+            if path == ("answer_summary",) and on_summary is not None:
+                on_summary(text)
+
+        def value(path: Path_, item: Any) -> None:
+            if len(path) == 2 and path[0] == "source_files" and on_file is not None and isinstance(item, dict):
+                on_file(item)
+
+        self._parser = IncrementalJSONParser(string_chunk, value)
+        self._result: Dict[str, Any] = {}
+        self._started = False
+
+    def handle(self, event: Dict[str, Any]) -> None:
+        kind = event.get("type")
+        if kind == "delta":
+            self._started = True
+            self._parser.feed(event.get("text", ""))
+        elif kind == "done":
+            self._result.update({k: v for k, v in event.items() if k != "type"})
+        elif kind == "error":
+            raise RuntimeError(event.get("detail") or "The server reported an error while streaming.")
+
+    def finish(self) -> Dict[str, Any]:
+        if self._started:
+            self._result["assistant_response"] = self._parser.close()
+        return self._result
+
+
+def read_streamed_response(resp: httpx.Response,
+                           on_summary: Optional[Callable[[str], None]] = None,
+                           on_file: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """Consume a streamed ``invoke_cli`` response.
+
+    *on_summary* receives ``answer_summary`` text as it arrives and *on_file*
+    each ``source_files`` entry once it is complete. Returns the same fields
+    as a buffered response, except that ``assistant_response`` is already
+    parsed.
+    """
+    assembler = _ResponseAssembler(on_summary, on_file)
+    for event in iter_events(resp):
+        assembler.handle(event)
+    return assembler.finish()
+
+
+async def aread_streamed_response(resp: httpx.Response,
+                                  on_summary: Optional[Callable[[str], None]] = None,
+                                  on_file: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """Async counterpart of ``read_streamed_response`` for ``httpx.AsyncClient`` responses."""
+    assembler = _ResponseAssembler(on_summary, on_file)
+    async for event in aiter_events(resp):
+        assembler.handle(event)
+    return assembler.finish()
@@ -1,15 +1,25 @@
+import asyncio
 import json
 import subprocess
+import tempfile
 import re
 from rich import print as rprint
 from pathlib import Path
 from rich.console import Console
 
-from typing import Optional, List, Dict
+from typing import Any, Callable, Optional, List, Dict
 
-from .api import cli_invoke
+from . import codec
+from .api import acli_invoke, cli_invoke
 from .source_collector import collect_sources
-from .snapshot import restore_snapshot, list_snapshots, create_snapshot, apply_updates
+from .relevance import select_sources
+from .outline import apply_context_mode
+from .delta import DeltaState
+from .response_cache import active_response_cache, get_response_cache, response_key
+from .source_cache import SourceCache
+from .source_watcher import SourceWatcher
+from .turn import TurnEngine, TurnTimings, get_engine, start_feed
+from .snapshot import restore_snapshot, list_snapshots, create_snapshot, apply_updates, snapshot_content
 from .config import get_value, set_value, delete_value, list_config
 from .ui import (
     print_assistant_response,
@@ -29,7 +39,9 @@ _diff_console = Console(force_terminal=True, markup=False, color_system="standar
 def handle_login() -> None:
     """Configure username and token for authenticating with the aye service."""
     from .auth import login_flow
+    from .api import reset_auth
     login_flow()
+    reset_auth()
     
     # Download plugins based on user's license tier
     from .download_plugins import fetch_plugins
@@ -52,7 +64,9 @@ def handle_login() -> None:
 def handle_logout() -> None:
     """Remove the stored aye credentials."""
     from .auth import delete_token
+    from .api import reset_auth
     delete_token()
+    reset_auth()
     rprint("🔐 Token removed.")
 
 
@@ -61,7 +75,13 @@ def handle_generate_cmd(prompt: str) -> None:
     """
     Send a single prompt to the backend.
     """
-    resp = cli_invoke(message=prompt)
+    responses = active_response_cache()
+    key = response_key(prompt, "generate", {}) if responses is not None else None
+    resp = responses.get(key) if responses is not None else None
+    if resp is None:
+        resp = cli_invoke(message=prompt)
+        if responses is not None:
+            responses.put(key, resp)
     code = resp.get("generated_code", "")
     rprint(code)
 
@@ -101,9 +121,9 @@ def handle_history_cmd(file: Optional[Path]) -> None:
 
 def handle_snap_show_cmd(file: Path, ts: str) -> None:
     """Print the contents of a specific snapshot."""
-    for snap_ts, snap_path in list_snapshots(file):
-        if snap_ts == ts:
-            print(Path(snap_path).read_text())
+    for snap_ts, entry in list_snapshots(file):
+        if snap_ts.split("_")[0] == ts or snap_ts == ts:
+            print(snapshot_content(entry))
             return
     rprint("Snapshot not found.", err=True)
 
@@ -184,43 +204,39 @@ def handle_diff_command(args: list[str]) -> None:
         rprint(f"[yellow]No snapshots found for file '{file_name}'.[/]")
         return
 
-    snapshot_paths = {}
-    for snap_ts, snap_path_str in snapshots:
+    snapshot_entries = {}
+    for snap_ts, entry in snapshots:
         ordinal = snap_ts.split('_')[0]  # Extract ordinal like "001"
         full_ts = snap_ts.split('_')[1]  # Extract full timestamp like "20250916T214101"
-        snapshot_paths[ordinal] = Path(snap_path_str)
-        snapshot_paths[full_ts] = Path(snap_path_str)
-
-    if len(args) == 1:
-        # Case 3: Diff with most recent snapshot
-        if snapshots:
-            latest_snap_path = Path(snapshots[0][1])
-            diff_files(file_path, latest_snap_path)
-        else:
-            rprint(f"[yellow]No snapshots available for '{file_name}'.[/]")
+        snapshot_entries[ordinal] = (ordinal, entry)
+        snapshot_entries[full_ts] = (ordinal, entry)
 
-    elif len(args) == 2:
-        # Case 1: Diff with specific snapshot ID
-        snapshot_id = args[1]
-        if snapshot_id in snapshot_paths:
-            diff_files(file_path, snapshot_paths[snapshot_id])
-        else:
+    if len(args) > 3:
+        rprint("[red]Error:[/] Too many arguments for diff command.")
+        return
+    for snapshot_id in args[1:]:
+        if snapshot_id not in snapshot_entries:
             rprint(f"[red]Error:[/] Snapshot '{snapshot_id}' not found for file '{file_name}'.")
-
-    elif len(args) == 3:
-        # Case 2: Diff between two snapshots
-        snap_id1 = args[1]
-        snap_id2 = args[2]
-        if snap_id1 not in snapshot_paths:
-            rprint(f"[red]Error:[/] Snapshot '{snap_id1}' not found for file '{file_name}'.")
-            return
-        if snap_id2 not in snapshot_paths:
-            rprint(f"[red]Error:[/] Snapshot '{snap_id2}' not found for file '{file_name}'.")
             return
-        diff_files(snapshot_paths[snap_id1], snapshot_paths[snap_id2])
 
-    else:
-        rprint("[red]Error:[/] Too many arguments for diff command.")
+    # Snapshots live in the object store: give diff real files to compare
+    with tempfile.TemporaryDirectory(prefix="aye-diff-") as tmp:
+        def extract(snapshot_id: str) -> Path:
+            ordinal, entry = snapshot_entries[snapshot_id]
+            path = Path(tmp) / ordinal / file_path.name
+            path.parent.mkdir(exist_ok=True)
+            path.write_text(snapshot_content(entry))
+            return path
+
+        if len(args) == 1:
+            # Case 3: Diff with most recent snapshot
+            diff_files(file_path, extract(snapshots[0][0].split('_')[0]))
+        elif len(args) == 2:
+            # Case 1: Diff with specific snapshot ID
+            diff_files(file_path, extract(args[1]))
+        else:
+            # Case 2: Diff between two snapshots
+            diff_files(extract(args[1]), extract(args[2]))
 
 
 def _python_diff_files(file1: Path, file2: Path) -> None:
@@ -270,12 +286,23 @@ def diff_files(file1: Path, file2: Path) -> None:
         rprint(f"[red]Error running diff:[/] {e}")
 
 
-def filter_unchanged_files(updated_files: list) -> list:
-    """Filter out files from updated_files list if their content hasn't changed compared to on-disk version."""
+def filter_unchanged_files(updated_files: list, watcher: Optional[SourceWatcher] = None) -> list:
+    """Filter out files from updated_files list if their content hasn't changed compared to on-disk version.
+
+    With a running *watcher*, files it tracks are compared against its
+    always-current copy instead of being read from disk.
+    """
     changed_files = []
     for item in updated_files:
         file_path = Path(item["file_name"])
         new_content = item["file_content"]
+
+        if watcher is not None:
+            current_content = watcher.read_current(file_path)
+            if current_content is not None:
+                if current_content != new_content:
+                    changed_files.append(item)
+                continue
         
         # If file doesn't exist on disk, consider it changed (new file)
         if not file_path.exists():
@@ -294,23 +321,134 @@ def filter_unchanged_files(updated_files: list) -> list:
     return changed_files
 
 
-def process_chat_message(prompt: str, chat_id: Optional[int], root: Path, file_mask: str) -> Dict[str, any]:
-    """Process a chat message and return the response."""
-    source_files = collect_sources(root, file_mask)
-    
-    resp = cli_invoke(message=prompt, chat_id=chat_id or -1, source_files=source_files)
-    
-    assistant_resp_str = resp.get('assistant_response')
-    assistant_resp = json.loads(assistant_resp_str)
-    
+def _sources_stream_freely(delta: Optional[DeltaState]) -> bool:
+    """Return True if files can be uploaded while later ones are still being read.
+
+    Relevance budgets, outline mode, delta manifests and the response cache
+    key all need every file before the request starts.
+    """
+    return (delta is None
+            and not get_value("response_cache", False)
+            and get_value("context_budget_bytes") is None
+            and get_value("context_top_k") is None
+            and get_value("context_mode", "full") != "outline")
+
+
+def _prepare_sources(prompt: str, root: Path, file_mask: str, cache: Optional[SourceCache],
+                     watcher: Optional[SourceWatcher]) -> Dict[str, Any]:
+    if watcher is not None:
+        source_files = watcher.get_sources()
+    else:
+        source_files = collect_sources(root, file_mask, cache=cache)
+    # Trim to the most relevant files when a context budget is configured
+    source_files = select_sources(prompt, source_files)
+    # In "outline" context mode, out-of-focus Python files are sent as outlines
+    return apply_context_mode(prompt, source_files)
+
+
+async def aprocess_chat_message(prompt: str, chat_id: Optional[int], root: Path, file_mask: str,
+                                cache: Optional[SourceCache] = None,
+                                watcher: Optional[SourceWatcher] = None,
+                                delta: Optional[DeltaState] = None,
+                                on_summary: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """Run one chat turn as a pipeline on the running event loop.
+
+    Without a *watcher*, files are read by a collector thread and go into
+    the request body as they arrive, so reading and uploading overlap
+    (unless ranking, outlines or *delta* need the whole set first). The
+    result carries per-stage ``timings`` in seconds; see ``TurnTimings``.
+    """
+    timings = TurnTimings()
+    loop = asyncio.get_running_loop()
+    feed = None
+    if watcher is None and _sources_stream_freely(delta):
+        feed = start_feed(lambda on_source, on_planned: collect_sources(
+            root, file_mask, cache=cache, on_source=on_source, on_planned=on_planned), timings)
+        source_files = feed
+    else:
+        source_files = await loop.run_in_executor(
+            None, _prepare_sources, prompt, root, file_mask, cache, watcher)
+        timings.mark("collected")
+
+    # Filled while the response streams in, overlapping with generation
+    changed_files: List[Dict[str, str]] = []
+    checked = 0
+
+    def on_file(item: Dict[str, str]) -> None:
+        nonlocal checked
+        checked += 1
+        changed_files.extend(filter_unchanged_files([item], watcher))
+
+    responses = active_response_cache()
+    cache_key = resp = None
+    if responses is not None:
+        cache_key = response_key(prompt, chat_id or -1, source_files)
+        resp = responses.get(cache_key)
+    cached = resp is not None
+
+    if not cached:
+        timings.mark("upload")
+        try:
+            resp = await acli_invoke(message=prompt, chat_id=chat_id or -1, source_files=source_files,
+                                     delta=delta, on_summary=on_summary, on_file=on_file,
+                                     on_stage=timings.mark)
+        finally:
+            if feed is not None:
+                feed.cancel()  # No-op once collection finished; stops it on errors and Ctrl-C
+        if responses is not None:
+            responses.put(cache_key, resp)
+
+    assistant_resp = resp.get('assistant_response')
+    if isinstance(assistant_resp, str):
+        assistant_resp = codec.loads(assistant_resp)
+    if cached and on_summary is not None and assistant_resp.get("answer_summary"):
+        on_summary(assistant_resp["answer_summary"])
+    updated_files = assistant_resp.get("source_files", [])
+    if checked != len(updated_files):
+        # Buffered (non-streamed) response: compare everything now
+        changed_files = filter_unchanged_files(updated_files, watcher)
+    timings.mark("done")
+
     return {
         "response": resp,
         "assistant_response": assistant_resp,
         "new_chat_id": resp.get("chat_id"),
         "summary": assistant_resp.get("answer_summary"),
-        "updated_files": assistant_resp.get("source_files", [])
+        "updated_files": updated_files,
+        "changed_files": changed_files,
+        "timings": timings.stages(),
+        "cached": cached,
     }
 
+
+def process_chat_message(prompt: str, chat_id: Optional[int], root: Path, file_mask: str,
+                         cache: Optional[SourceCache] = None,
+                         watcher: Optional[SourceWatcher] = None,
+                         delta: Optional[DeltaState] = None,
+                         on_summary: Optional[Callable[[str], None]] = None,
+                         engine: Optional[TurnEngine] = None) -> Dict[str, any]:
+    """Process a chat message and return the response.
+
+    Pass the session's *cache* so unchanged files are not re-read every turn,
+    or its *watcher* to skip the filesystem scan entirely. With a *delta*
+    state, files the chat already holds are not uploaded again.
+
+    *on_summary* receives the answer summary as it streams in. Each updated
+    file is compared with the disk as soon as its entry is complete;
+    ``changed_files`` in the result holds those that actually differ.
+
+    With ``response_cache`` enabled, a prompt repeated in the same chat
+    over an unchanged tree is answered from disk (``cached`` is True).
+
+    This is a synchronous wrapper around ``aprocess_chat_message``, run on
+    *engine* (the process-wide ``turn.get_engine()`` by default) so every
+    call reuses one event loop and its pooled connections. Ctrl-C raises
+    ``turn.TurnCancelled``.
+    """
+    turn = aprocess_chat_message(prompt, chat_id, root, file_mask, cache=cache, watcher=watcher,
+                                 delta=delta, on_summary=on_summary)
+    return (engine or get_engine()).run(turn)
+
 # Snapshot cleanup functions
 def handle_prune_cmd(keep: int = 10) -> None:
     """Delete all but the most recent N snapshots."""
@@ -337,6 +475,56 @@ def handle_cleanup_cmd(days: int = 30) -> None:
     except Exception as e:
         rprint(f"[red]Error cleaning up snapshots:[/] {e}")
 
+
+def handle_snap_migrate_cmd() -> None:
+    """Move snapshots taken before the object store into it."""
+    from .snapshot import migrate_snapshots
+    try:
+        migrated, before, after = migrate_snapshots()
+        rprint(f"✅ {migrated} snapshots migrated; {before} bytes -> {after} bytes.")
+    except Exception as e:
+        rprint(f"[red]Error migrating snapshots:[/] {e}")
+
+
+def handle_snap_reindex_cmd() -> None:
+    """Rebuild the snapshot index from the batch directories."""
+    from .snapshot import reindex_snapshots
+    try:
+        count = reindex_snapshots()
+        rprint(f"✅ Snapshot index rebuilt: {count} snapshots.")
+    except Exception as e:
+        rprint(f"[red]Error rebuilding snapshot index:[/] {e}")
+
+
+def handle_snap_pack_cmd(keep: int, consolidate: bool = False) -> None:
+    """Pack snapshots older than the last *keep* turns into pack files."""
+    from .snapshot import pack_snapshots
+    try:
+        batches, objects, removed = pack_snapshots(keep, consolidate)
+        if batches or removed:
+            rprint(f"✅ {batches} snapshots and {objects} objects packed; {removed} files removed.")
+        else:
+            rprint(f"✅ Nothing to pack: no unpacked snapshots older than {keep} turns.")
+    except Exception as e:
+        rprint(f"[red]Error packing snapshots:[/] {e}")
+
+# Response cache functions
+def handle_cache_stats_cmd() -> None:
+    """Show response cache usage."""
+    stats = get_response_cache().stats()
+    enabled = "enabled" if get_value("response_cache", False) else "disabled"
+    rprint(f"[bold]Response cache[/] ({enabled})")
+    rprint(f"  entries: {stats['entries']}")
+    rprint(f"  size: {stats['bytes']} / {stats['max_bytes']} bytes")
+    rprint(f"  ttl: {stats['ttl']:.0f} s")
+    rprint(f"  hits: {stats['hits']}, misses: {stats['misses']}, evictions: {stats['evictions']}")
+
+
+def handle_cache_clear_cmd() -> None:
+    """Delete all cached responses."""
+    removed = get_response_cache().clear()
+    rprint(f"✅ {removed} cached responses deleted.")
+
 # Configuration management functions
 def handle_config_list() -> None:
     """List all configuration values."""
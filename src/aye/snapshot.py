@@ -1,93 +1,68 @@
 # --------------------------------------------------------------
 # snapshot.py – batch snapshot utilities (ordinal + timestamp folder)
 # --------------------------------------------------------------
-import json
-import shutil
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
+
+from .snapshot_index import get_index
+from .snapshot_store import (
+    DEFAULT_PACK_KEEP,
+    BlobStore,
+    auto_pack_keep,
+    batch_ordinal,
+    entry_bytes,
+    entry_digest,
+    entry_exists,
+    file_digest,
+    collect_garbage,
+    delta_depth,
+    deltify_previous,
+    migrate,
+    pack,
+    restore_entry,
+    snapshot_files,
+)
 
 
 SNAP_ROOT = Path(".aye/snapshots").resolve()
+# Version 1 layout only: a full copy of the newest batch (removed by migrate_snapshots)
 LATEST_SNAP_DIR = SNAP_ROOT / "latest"
 
 
+def _store() -> BlobStore:
+    return BlobStore(SNAP_ROOT)
+
+
+def _index():
+    # Looked up per call: SNAP_ROOT may be redirected (tests, benchmarks)
+    return get_index(SNAP_ROOT)
+
+
 def _get_next_ordinal() -> int:
-    """Get the next ordinal number by checking existing snapshot directories."""
-    batches_root = SNAP_ROOT
-    if not batches_root.is_dir():
-        return 1
-    
-    ordinals = []
-    for batch_dir in batches_root.iterdir():
-        if batch_dir.is_dir() and "_" in batch_dir.name and batch_dir.name != "latest":
-            try:
-                ordinal = int(batch_dir.name.split("_")[0])
-                ordinals.append(ordinal)
-            except ValueError:
-                continue
-    
-    return max(ordinals, default=0) + 1
+    """Get the next ordinal number from the snapshot index."""
+    latest = _index().latest()
+    return (latest[0] if latest else 0) + 1
 
 
 def _get_latest_snapshot_dir() -> Path | None:
-    """Get the latest snapshot directory by finding the one with the highest ordinal."""
-    batches_root = SNAP_ROOT
-    if not batches_root.is_dir():
-        return None
-    
-    snapshot_dirs = []
-    for batch_dir in batches_root.iterdir():
-        if batch_dir.is_dir() and "_" in batch_dir.name and batch_dir.name != "latest":
-            try:
-                ordinal = int(batch_dir.name.split("_")[0])
-                snapshot_dirs.append((ordinal, batch_dir))
-            except ValueError:
-                continue
-    
-    if not snapshot_dirs:
-        return None
-    
-    # Sort by ordinal and return the directory with the highest ordinal
-    snapshot_dirs.sort(key=lambda x: x[0])
-    return snapshot_dirs[-1][1]
+    """Get the directory of the snapshot with the highest ordinal."""
+    latest = _index().latest()
+    return SNAP_ROOT / latest[1] if latest else None
 
 
 # ------------------------------------------------------------------
 # Internal helpers
 # ------------------------------------------------------------------
-def _ensure_batch_dir(ts: str) -> Path:
-    """Create (or return) the batch directory for a given timestamp."""
-    ordinal = _get_next_ordinal()
-    ordinal_str = f"{ordinal:03d}"
-    batch_dir_name = f"{ordinal_str}_{ts}"
-    batch_dir = SNAP_ROOT / batch_dir_name
-    batch_dir.mkdir(parents=True, exist_ok=True)
-    return batch_dir
-
-
 def _list_all_snapshots_with_metadata():
     """List all snapshots in descending order with file names from metadata."""
-    batches_root = SNAP_ROOT
-    if not batches_root.is_dir():
-        return []
-
-    timestamps = [p.name for p in batches_root.iterdir() if p.is_dir() and p.name != "latest"]
-    timestamps.sort(reverse=True)
     result = []
-    for ts in timestamps:
+    for _, name, files in _index().batches():
         # Parse the ordinal and timestamp from the directory name
-        if "_" in ts:
-            ordinal_part, timestamp_part = ts.split("_", 1)
-            formatted_ts = f"{ordinal_part} ({timestamp_part})"
-        else:
-            formatted_ts = ts  # Fallback if format is unexpected
-            
-        meta_path = batches_root / ts / "metadata.json"
-        if meta_path.exists():
-            meta = json.loads(meta_path.read_text())
-            files = [Path(entry["original"]).name for entry in meta["files"]]
-            files_str = ",".join(files)
+        ordinal_part, timestamp_part = name.split("_", 1)
+        formatted_ts = f"{ordinal_part} ({timestamp_part})"
+        if files is not None:
+            files_str = ",".join(Path(entry["original"]).name for entry in files)
             result.append(f"{formatted_ts}  {files_str}")
         else:
             result.append(f"{formatted_ts}  (metadata missing)")
@@ -106,86 +81,79 @@ def create_snapshot(file_paths: List[Path]) -> str:
     if not file_paths:
         raise ValueError("No files supplied for snapshot")
 
-    # Filter out files whose content hasn't changed
+    # Filter out files whose content hasn't changed since the latest snapshot
     changed_files = []
-    latest_snap_dir = _get_latest_snapshot_dir()
-    
+    latest_batch = _index().latest()
+    latest: Dict[str, Any] = {}
+    if latest_batch is not None and latest_batch[2] is not None:
+        latest = {entry["original"]: entry for entry in latest_batch[2]}
+
     for src_path in file_paths:
         src_path = src_path.resolve()
-        if src_path.is_file():
-            current_content = src_path.read_text()
-            # If there's no latest snapshot, all files are considered changed
-            if latest_snap_dir is not None:
-                snapshot_content_path = latest_snap_dir / src_path.name
-                if snapshot_content_path.exists():
-                    snapshot_content = snapshot_content_path.read_text()
-                    if current_content == snapshot_content:
-                        continue  # Skip unchanged files
-            changed_files.append(src_path)
-        else:
-            changed_files.append(src_path)
+        entry = latest.get(str(src_path))
+        if src_path.is_file() and entry is not None:
+            if file_digest(src_path.read_bytes()) == entry_digest(entry):
+                continue  # Skip unchanged files
+        changed_files.append(src_path)
     
     # If no files changed, return early
     if not changed_files:
         return ""
 
     ts = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
-    batch_dir = _ensure_batch_dir(ts)
 
-    meta_entries: List[Dict[str, Any]] = []
+    # Old contents go to the object store; the batch only references them
+    # (a file that does not exist yet is stored as empty)
+    store = _store()
+    meta_entries = snapshot_files(store, changed_files)
+    depth = delta_depth()
+    if depth:
+        # Earlier versions become reverse deltas against the ones just stored
+        for entry in meta_entries:
+            history = [e for _, e in _index().history(entry["original"])]
+            deltify_previous(store, entry, history, depth)
+    name = _index().add_batch(ts, meta_entries)
 
-    for src_path in changed_files:
-        dest_path = batch_dir / src_path.name
+    keep = auto_pack_keep()
+    if keep and batch_ordinal(SNAP_ROOT / name) % keep == 0:
+        pack_snapshots(keep)  # Every `keep` turns, pack what is older than that
+    return name
 
-        if src_path.is_file():
-            shutil.copy2(src_path, dest_path)   # copy old content
-        else:
-            dest_path.write_text("")           # placeholder for a new file
 
-        meta_entries.append(
-            {"original": str(src_path), "snapshot": str(dest_path)}
-        )
+def list_snapshots(file: Path | None = None) -> List[str]:
+    """Return all batch-snapshot timestamps, newest first, or snapshots for a specific file.
 
-    meta = {"timestamp": ts, "files": meta_entries}
-    (batch_dir / "metadata.json").write_text(json.dumps(meta, indent=2))
+    For a file, items are ``(batch name, metadata entry)``; read the
+    content with ``snapshot_content``.
+    """
+    if file is None:
+        return _list_all_snapshots_with_metadata()
+    return _index().history(str(file.resolve()))
 
-    # Update the latest snapshot directory
-    # First, remove the existing latest directory if it exists
-    if LATEST_SNAP_DIR.exists():
-        shutil.rmtree(LATEST_SNAP_DIR)
-    
-    # Create a new latest directory and copy all files from the current batch
-    LATEST_SNAP_DIR.mkdir(parents=True, exist_ok=True)
-    for src_path in changed_files:
-        dest_path = LATEST_SNAP_DIR / src_path.name
-        if src_path.is_file():
-            shutil.copy2(src_path, dest_path)
-        else:
-            dest_path.write_text("")
 
-    return batch_dir.name
+def snapshot_content(entry: Dict[str, Any]) -> str:
+    """Return the text a ``list_snapshots(file)`` entry recorded."""
+    return entry_bytes(_store(), entry).decode("utf-8", errors="replace")
 
 
-def list_snapshots(file: Path | None = None) -> List[str]:
-    """Return all batch-snapshot timestamps, newest first, or snapshots for a specific file."""
-    if file is None:
-        return _list_all_snapshots_with_metadata()
-    
-    batches_root = SNAP_ROOT
-    if not batches_root.is_dir():
-        return []
-
-    snapshots = []
-    for batch_dir in batches_root.iterdir():
-        if batch_dir.is_dir() and batch_dir.name != "latest":
-            meta_path = batch_dir / "metadata.json"
-            if meta_path.exists():
-                meta = json.loads(meta_path.read_text())
-                for entry in meta["files"]:
-                    if Path(entry["original"]) == file.resolve():
-                        snapshots.append((batch_dir.name, entry["snapshot"]))
-    snapshots.sort(key=lambda x: x[0], reverse=True)
-    return snapshots
+def migrate_snapshots() -> Tuple[int, int, int]:
+    """Move version 1 batch copies into the object store; see ``snapshot_store.migrate``."""
+    result = migrate(SNAP_ROOT)
+    _index().rebuild()  # Entries were rewritten in place
+    return result
+
+
+def pack_snapshots(keep: int = DEFAULT_PACK_KEEP, consolidate: bool = False) -> Tuple[int, int, int]:
+    """Pack snapshots more than *keep* turns old; see ``snapshot_store.pack``."""
+    result = pack(SNAP_ROOT, keep, consolidate)
+    if result[0] or result[2]:
+        _index().rebuild()  # Packed batches moved out of their directories
+    return result
+
+
+def reindex_snapshots() -> int:
+    """Rebuild the snapshot index from the batch directories; return the batch count."""
+    return _index().rebuild()
 
 
 def restore_snapshot(ordinal: str | None = None, file_name: str | None = None) -> None:
@@ -194,36 +162,21 @@ def restore_snapshot(ordinal: str | None = None, file_name: str | None = None) -
     If ``ordinal`` is omitted the most recent snapshot is used.
     If ``file_name`` is provided, only that file is restored.
     """
+    index = _index()
     if ordinal is None:
-        timestamps = list_snapshots()
-        if not timestamps:
-            raise ValueError("No snapshots found")
-        # Extract ordinal from the first (most recent) snapshot
-        ordinal = timestamps[0].split()[0].split("(")[0] if timestamps else None
-        if not ordinal:
+        batch = index.latest()
+        if batch is None:
             raise ValueError("No snapshots found")
+        ordinal = batch[1].split("_")[0]
+    else:
+        # Ordinal input (e.g., "001")
+        batch = index.find(int(ordinal)) if ordinal.isdigit() else None
 
-    # Find the correct snapshot directory by ordinal only
-    batch_dir = None
-    
-    # Handle ordinal-only input (e.g., "001")
-    if ordinal.isdigit() and len(ordinal) == 3:
-        for dir_path in SNAP_ROOT.iterdir():
-            if dir_path.is_dir() and dir_path.name.startswith(f"{ordinal}_"):
-                batch_dir = dir_path
-                break
-    
-    if batch_dir is None:
+    if batch is None:
         raise ValueError(f"Snapshot with ordinal {ordinal} not found")
-
-    meta_file = batch_dir / "metadata.json"
-    if not meta_file.is_file():
-        raise ValueError(f"Metadata missing for snapshot {ordinal}")
-
-    try:
-        meta = json.loads(meta_file.read_text())
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Invalid metadata for snapshot {ordinal}: {e}")
+    if batch[2] is None:
+        raise ValueError(f"Metadata missing or invalid for snapshot {ordinal}")
+    meta = {"files": batch[2]}
 
     # If file_name is specified, filter the entries
     if file_name is not None:
@@ -236,20 +189,17 @@ def restore_snapshot(ordinal: str | None = None, file_name: str | None = None) -
         meta["files"] = filtered_entries
 
     # Restore files
+    store = _store()
     for entry in meta["files"]:
         original = Path(entry["original"])  # Path to restore to
-        snapshot_path = Path(entry["snapshot"])  # Path in snapshot directory
-        
-        # Check if snapshot file exists
-        if not snapshot_path.exists():
-            print(f"Warning: snapshot file missing – {snapshot_path}")
+
+        # Check if the snapshotted content exists
+        if not entry_exists(store, entry):
+            print(f"Warning: snapshot content missing – {entry.get('blob') or entry.get('snapshot')}")
             continue
             
         try:
-            # Ensure parent directory exists
-            original.parent.mkdir(parents=True, exist_ok=True)
-            # Copy snapshot file to original location
-            shutil.copy2(snapshot_path, original)
+            restore_entry(store, entry, original)
         except Exception as e:
             print(f"Warning: failed to restore {original}: {e}")
             continue
@@ -292,20 +242,14 @@ def apply_updates(updated_files: List[Dict[str, str]]) -> str:
 # ------------------------------------------------------------------
 def list_all_snapshots() -> List[Path]:
     """List all snapshot directories in chronological order (oldest first)."""
-    batches_root = SNAP_ROOT
-    if not batches_root.is_dir():
-        return []
-
-    snapshots = [p for p in batches_root.iterdir() if p.is_dir() and "_" in p.name and p.name != "latest"]
-    # Sort by timestamp part of the directory name
-    snapshots.sort(key=lambda p: p.name.split("_", 1)[1])
-    return snapshots
+    return [SNAP_ROOT / name for _, name, _ in reversed(_index().batches())]
 
 
 def delete_snapshot(snapshot_dir: Path) -> None:
-    """Delete a snapshot directory and all its contents."""
-    if snapshot_dir.is_dir():
-        shutil.rmtree(snapshot_dir)
+    """Delete a snapshot directory and all its contents (or its entry in a pack)."""
+    index = _index()
+    if index.find(batch_ordinal(snapshot_dir)) is not None:
+        index.remove(batch_ordinal(snapshot_dir))
         print(f"Deleted snapshot: {snapshot_dir.name}")
 
 
@@ -323,7 +267,8 @@ def prune_snapshots(keep_count: int = 10) -> int:
     for snapshot_dir in to_delete:
         delete_snapshot(snapshot_dir)
         deleted_count += 1
-    
+
+    collect_garbage(SNAP_ROOT)  # Drop contents only the deleted batches used
     return deleted_count
 
 
@@ -347,7 +292,9 @@ def cleanup_snapshots(older_than_days: int = 30) -> int:
         except (ValueError, IndexError):
             print(f"Warning: Could not parse timestamp from {snapshot_dir.name}")
             continue
-    
+
+    if deleted_count:
+        collect_garbage(SNAP_ROOT)
     return deleted_count
 
 
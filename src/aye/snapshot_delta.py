@@ -0,0 +1,92 @@
+# snapshot_delta.py
+"""Line deltas for reverse-delta snapshot storage.
+
+With ``aye config set snapshot_delta_depth N`` the newest snapshotted
+version of a file stays a full object and the version before it is
+rewritten as a delta against it (when that is clearly smaller), so a
+file edited a few lines per turn costs a few lines per snapshot. One
+version in every N + 1 is left as a full keyframe, which bounds the
+number of deltas applied to rebuild any version to N. ``BlobStore.get``
+applies the deltas transparently.
+
+A delta object (``<sha256>.d``) is a header line naming its base object
+followed by zlib-compressed ops: ``[i, j]`` copies base lines ``i:j``, a
+string inserts literal bytes (latin-1 decoded, so any content round-trips).
+"""
+import zlib
+from typing import Dict, List, Tuple, Union
+
+from . import codec
+
+MAGIC = b"AYED1 "
+ZLIB_LEVEL = 6
+# A delta is only kept if it is smaller than this fraction of the full object
+MAX_DELTA_RATIO = 0.5
+
+Op = Union[List[int], str]
+
+
+def make_delta(base: bytes, target: bytes) -> List[Op]:
+    """Return the ops that rebuild *target* from *base*.
+
+    A single pass over *target*: a line extends the current copy when it
+    is the next base line, else starts a copy at its first occurrence in
+    *base*, else becomes literal. Linear time, which matters for the
+    multi-thousand-line files deltas are for; the ops are always exact,
+    only their size depends on how well lines match up.
+    """
+    base_lines = base.splitlines(keepends=True)
+    first: Dict[bytes, int] = {}
+    for i, line in enumerate(base_lines):
+        first.setdefault(line, i)
+    ops: List[Op] = []
+    literal: List[bytes] = []
+    start = end = -1  # Current copy run, base_lines[start:end]
+    for line in target.splitlines(keepends=True):
+        if 0 <= end < len(base_lines) and base_lines[end] == line:
+            end += 1
+            continue
+        if start >= 0:
+            ops.append([start, end])
+            start = end = -1
+        i = first.get(line)
+        if i is None:
+            literal.append(line)
+            continue
+        if literal:
+            ops.append(b"".join(literal).decode("latin-1"))
+            literal = []
+        start, end = i, i + 1
+    if start >= 0:
+        ops.append([start, end])
+    if literal:
+        ops.append(b"".join(literal).decode("latin-1"))
+    return ops
+
+
+def apply_delta(base: bytes, ops: List[Op]) -> bytes:
+    base_lines = base.splitlines(keepends=True)
+    parts = []
+    for op in ops:
+        if isinstance(op, str):
+            parts.append(op.encode("latin-1"))
+        else:
+            parts.extend(base_lines[op[0]:op[1]])
+    return b"".join(parts)
+
+
+def encode_delta(base_digest: str, ops: List[Op]) -> bytes:
+    return MAGIC + base_digest.encode("ascii") + b"\n" + zlib.compress(codec.dumpb(ops), ZLIB_LEVEL)
+
+
+def delta_base(header: bytes) -> str:
+    """Return the base digest named by a delta's header line."""
+    if not header.startswith(MAGIC):
+        raise ValueError("not a snapshot delta")
+    return header[len(MAGIC):].strip().decode("ascii")
+
+
+def decode_delta(payload: bytes) -> Tuple[str, List[Op]]:
+    """Return ``(base digest, ops)`` of an encoded delta."""
+    header, _, body = payload.partition(b"\n")
+    return delta_base(header), codec.loads(zlib.decompress(body))
@@ -0,0 +1,256 @@
+# snapshot_index.py
+"""SQLite index of snapshot batches, so history and restore stop scanning.
+
+The index maps ordinal -> batch (name and metadata entries) and
+path -> ordinals, and lives in ``<snapshots>/index/snapshots.sqlite``.
+It is only a cache of the batch directories and packs: ``rebuild``
+recreates it from them, and it is rebuilt automatically when it is
+missing, from an older schema, or stale. Staleness is detected in O(1):
+adding or removing a batch directory changes the mtime of the snapshots
+root, which the index records after each of its own changes (``aye snap
+reindex`` forces a rebuild after edits the mtime cannot reveal).
+
+Without the ``sqlite3`` module, ``DirectoryIndex`` answers the same
+queries by scanning the directories and packs.
+"""
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import codec
+from .snapshot_pack import drop_batch
+from .snapshot_store import METADATA_VERSION, Batch, iter_batches, write_metadata
+
+try:
+    import sqlite3
+except ImportError:  # pragma: no cover - Python built without sqlite
+    sqlite3 = None
+
+INDEX_DIR = "index"
+INDEX_FILE = "snapshots.sqlite"
+SCHEMA_VERSION = "1"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    ordinal INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    files TEXT            -- metadata entries as JSON; NULL if metadata.json is missing
+);
+CREATE TABLE IF NOT EXISTS file_history (
+    path TEXT NOT NULL,
+    ordinal INTEGER NOT NULL,
+    entry TEXT NOT NULL,
+    PRIMARY KEY (path, ordinal)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+def _new_batch_dir(snap_root: Path, ordinal: int, ts: str, entries: List[Dict[str, Any]]) -> str:
+    name = f"{ordinal:03d}_{ts}"
+    batch_dir = snap_root / name
+    batch_dir.mkdir(parents=True)  # Fails rather than merging into an existing batch
+    write_metadata(batch_dir, {"version": METADATA_VERSION, "timestamp": ts, "files": entries})
+    return name
+
+
+def _delete_batch(snap_root: Path, ordinal: int, name: str) -> None:
+    batch_dir = snap_root / name
+    if batch_dir.is_dir():
+        shutil.rmtree(batch_dir, ignore_errors=True)
+    else:
+        drop_batch(snap_root, ordinal)
+
+
+class DirectoryIndex:
+    """Index interface answered by scanning batch directories (no sqlite3)."""
+
+    def __init__(self, snap_root: Path):
+        self.snap_root = Path(snap_root)
+
+    def batches(self) -> List[Batch]:
+        """All batches, newest first."""
+        return sorted(iter_batches(self.snap_root), key=lambda b: (b[0], b[1]), reverse=True)
+
+    def latest(self) -> Optional[Batch]:
+        batches = self.batches()
+        return batches[0] if batches else None
+
+    def find(self, ordinal: int) -> Optional[Batch]:
+        return next((b for b in self.batches() if b[0] == ordinal), None)
+
+    def history(self, path: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """``(batch name, entry)`` for every batch holding *path*, newest first."""
+        return [(name, entry) for _, name, files in self.batches()
+                for entry in files or [] if entry["original"] == path]
+
+    def add_batch(self, ts: str, entries: List[Dict[str, Any]]) -> str:
+        latest = self.latest()
+        return _new_batch_dir(self.snap_root, (latest[0] if latest else 0) + 1, ts, entries)
+
+    def remove(self, ordinal: int) -> None:
+        batch = self.find(ordinal)
+        if batch is not None:
+            _delete_batch(self.snap_root, ordinal, batch[1])
+
+    def rebuild(self) -> int:
+        return sum(1 for _ in iter_batches(self.snap_root))
+
+
+class SnapshotIndex(DirectoryIndex):
+    """SQLite-backed index; every query is a primary-key or indexed lookup."""
+
+    def __init__(self, snap_root: Path):
+        super().__init__(snap_root)
+        self.db_path = self.snap_root / INDEX_DIR / INDEX_FILE
+        self._lock = threading.RLock()
+        self._db: Optional["sqlite3.Connection"] = None
+
+    # Connection and freshness -----------------------------------------
+    def _root_stamp(self) -> str:
+        try:
+            return str(os.stat(self.snap_root).st_mtime_ns)
+        except FileNotFoundError:
+            return ""
+
+    def _connect(self) -> "sqlite3.Connection":
+        if self._db is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            # Autocommit mode: transactions are opened explicitly below
+            db = sqlite3.connect(str(self.db_path), timeout=10, isolation_level=None,
+                                 check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(_SCHEMA)
+            self._db = db
+        return self._db
+
+    def _state(self, db: "sqlite3.Connection", key: str) -> Optional[str]:
+        row = db.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, db: "sqlite3.Connection", key: str, value: str) -> None:
+        db.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, value))
+
+    def _fresh(self) -> "sqlite3.Connection":
+        """Return the connection, rebuilding first if the directories changed behind our back."""
+        db = self._connect()
+        if (self._state(db, "schema") != SCHEMA_VERSION
+                or self._state(db, "root_mtime") != self._root_stamp()):
+            self._rebuild(db)
+        return db
+
+    def _insert(self, db: "sqlite3.Connection", ordinal: int, name: str,
+                files: Optional[List[Dict[str, Any]]]) -> None:
+        db.execute("INSERT OR REPLACE INTO batches (ordinal, name, files) VALUES (?, ?, ?)",
+                   (ordinal, name, None if files is None else codec.dumps(files)))
+        db.execute("DELETE FROM file_history WHERE ordinal = ?", (ordinal,))
+        db.executemany("INSERT OR REPLACE INTO file_history (path, ordinal, entry) VALUES (?, ?, ?)",
+                       [(e["original"], ordinal, codec.dumps(e)) for e in files or []])
+
+    def _rebuild(self, db: "sqlite3.Connection") -> int:
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("DELETE FROM batches")
+            db.execute("DELETE FROM file_history")
+            count = 0
+            for ordinal, name, files in iter_batches(self.snap_root):
+                self._insert(db, ordinal, name, files)
+                count += 1
+            self._set_state(db, "schema", SCHEMA_VERSION)
+            self._set_state(db, "root_mtime", self._root_stamp())
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+        return count
+
+    @staticmethod
+    def _row(row: Tuple[int, str, Optional[str]]) -> Batch:
+        return row[0], row[1], None if row[2] is None else codec.loads(row[2])
+
+    # Queries -----------------------------------------------------------
+    def batches(self) -> List[Batch]:
+        with self._lock:
+            rows = self._fresh().execute("SELECT ordinal, name, files FROM batches ORDER BY ordinal DESC")
+            return [self._row(r) for r in rows]
+
+    def latest(self) -> Optional[Batch]:
+        with self._lock:
+            row = self._fresh().execute(
+                "SELECT ordinal, name, files FROM batches ORDER BY ordinal DESC LIMIT 1").fetchone()
+            return self._row(row) if row else None
+
+    def find(self, ordinal: int) -> Optional[Batch]:
+        with self._lock:
+            row = self._fresh().execute(
+                "SELECT ordinal, name, files FROM batches WHERE ordinal = ?", (ordinal,)).fetchone()
+            return self._row(row) if row else None
+
+    def history(self, path: str) -> List[Tuple[str, Dict[str, Any]]]:
+        with self._lock:
+            rows = self._fresh().execute(
+                "SELECT b.name, h.entry FROM file_history h JOIN batches b ON b.ordinal = h.ordinal"
+                " WHERE h.path = ? ORDER BY h.ordinal DESC", (path,))
+            return [(name, codec.loads(entry)) for name, entry in rows]
+
+    # Changes -----------------------------------------------------------
+    def add_batch(self, ts: str, entries: List[Dict[str, Any]]) -> str:
+        """Allocate the next ordinal, create its batch directory and index it atomically."""
+        with self._lock:
+            db = self._fresh()
+            db.execute("BEGIN IMMEDIATE")  # Serializes ordinal allocation between processes
+            try:
+                ordinal = (db.execute("SELECT MAX(ordinal) FROM batches").fetchone()[0] or 0) + 1
+                name = _new_batch_dir(self.snap_root, ordinal, ts, entries)
+                self._insert(db, ordinal, name, entries)
+                self._set_state(db, "root_mtime", self._root_stamp())
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+            return name
+
+    def remove(self, ordinal: int) -> None:
+        """Delete a batch (directory, or entry in its pack) and its index rows."""
+        with self._lock:
+            db = self._fresh()
+            batch = self.find(ordinal)
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                if batch is not None:
+                    _delete_batch(self.snap_root, ordinal, batch[1])
+                db.execute("DELETE FROM batches WHERE ordinal = ?", (ordinal,))
+                db.execute("DELETE FROM file_history WHERE ordinal = ?", (ordinal,))
+                self._set_state(db, "root_mtime", self._root_stamp())
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    def rebuild(self) -> int:
+        """Recreate the index from the batch directories; return the batch count."""
+        with self._lock:
+            return self._rebuild(self._connect())
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+_indexes: Dict[Path, DirectoryIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(snap_root: Path) -> DirectoryIndex:
+    """Return the (cached) index of the snapshots under *snap_root*."""
+    snap_root = Path(snap_root)
+    with _indexes_lock:
+        index = _indexes.get(snap_root)
+        if index is None:
+            index = SnapshotIndex(snap_root) if sqlite3 is not None else DirectoryIndex(snap_root)
+            _indexes[snap_root] = index
+        return index
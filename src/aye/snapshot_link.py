@@ -0,0 +1,101 @@
+# snapshot_link.py
+"""Copy files into and out of the snapshot store without copying bytes.
+
+``clone_file`` tries, in order:
+
+* a ``FICLONE`` reflink (btrfs, XFS, bcachefs...): the copy shares the
+  source's extents until either side is written, so it is a constant
+  time metadata operation that uses no space;
+* a hardlink, only when the caller says both files are immutable: a
+  hardlink is the same inode, so a later in-place edit of the working
+  file would change the snapshot too;
+* a plain copy.
+
+Whether a filesystem supports reflinks or hardlinks is learned from the
+first attempt and cached per (source device, destination device) pair,
+so unsupported calls are not retried on every file.
+"""
+import errno
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+# _IOW(0x94, 9, int) from linux/fs.h
+FICLONE = 0x40049409
+
+# errnos meaning "this filesystem (pair) cannot do that", as opposed to real I/O errors
+_UNSUPPORTED = {errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.EPERM,
+                errno.ENOSYS, getattr(errno, "ENOTSUP", errno.EOPNOTSUPP)}
+
+_capabilities: Dict[Tuple[int, int, str], bool] = {}
+_lock = threading.Lock()
+
+
+def _devices(src: Path, dst: Path) -> Tuple[int, int]:
+    return os.stat(src).st_dev, os.stat(dst.parent).st_dev
+
+
+def _supported(key: Tuple[int, int, str]) -> bool:
+    with _lock:
+        return _capabilities.get(key, True)  # Unknown: try once
+
+
+def _learn(key: Tuple[int, int, str], supported: bool) -> None:
+    with _lock:
+        _capabilities[key] = supported
+
+
+def _reflink(src: Path, dst: Path) -> None:
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            d.close()
+            dst.unlink(missing_ok=True)
+            raise
+
+
+def clone_file(src: Path, dst: Path, immutable: bool = False) -> str:
+    """Make *dst* a copy of *src*; return the method used (reflink, hardlink or copy).
+
+    *dst* must not exist. Pass ``immutable=True`` only when neither file
+    is ever modified in place.
+    """
+    src, dst = Path(src), Path(dst)
+    src_dev, dst_dev = _devices(src, dst)
+    if fcntl is not None and _supported((src_dev, dst_dev, "reflink")):
+        try:
+            _reflink(src, dst)
+            _learn((src_dev, dst_dev, "reflink"), True)
+            return "reflink"
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+            _learn((src_dev, dst_dev, "reflink"), False)
+    if immutable and _supported((src_dev, dst_dev, "hardlink")):
+        try:
+            os.link(src, dst)
+            _learn((src_dev, dst_dev, "hardlink"), True)
+            return "hardlink"
+        except OSError as e:
+            if e.errno == errno.EMLINK:
+                pass  # Too many links to this one file; others can still be linked
+            elif e.errno in _UNSUPPORTED:
+                _learn((src_dev, dst_dev, "hardlink"), False)
+            else:
+                raise
+    shutil.copyfile(src, dst)
+    return "copy"
+
+
+def capabilities() -> Dict[Tuple[int, int, str], bool]:
+    """What has been learned so far, keyed by (source device, destination device, method)."""
+    with _lock:
+        return dict(_capabilities)
@@ -0,0 +1,160 @@
+# snapshot_pack.py
+"""Pack files: many cold snapshot batches and their objects in two files.
+
+A pack is ``<snapshots>/packs/pack-<id>.pack``, the stored bytes of its
+objects back to back (compressed, raw or delta, exactly as they were
+loose), plus ``pack-<id>.idx``::
+
+    {"version": 1,
+     "batches": [[ordinal, "NNN_<timestamp>", <metadata.json content>], ...],
+     "objects": {"<sha256>": [offset, length, "<suffix>"], ...}}
+
+Reads are random access (one seek per object), so ``BlobStore`` serves
+packed objects like loose ones and the snapshot index lists packed
+batches like directories. The ``.idx`` is written last: a pack without
+one is an interrupted write and is ignored. Packs are immutable except
+that dropping a batch rewrites the ``.idx``; the space of objects nothing
+needs any more is reclaimed when packs are consolidated.
+"""
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import codec
+
+PACK_DIR = "packs"
+PACK_VERSION = 1
+
+# (ordinal, batch name, metadata)
+PackedBatch = Tuple[int, str, Dict[str, Any]]
+
+
+class Pack:
+    """One ``.pack`` / ``.idx`` pair."""
+
+    def __init__(self, idx_path: Path):
+        self.idx_path = Path(idx_path)
+        self.data_path = self.idx_path.with_suffix(".pack")
+        index = codec.loads(self.idx_path.read_bytes())
+        self.batches: List[PackedBatch] = [tuple(b) for b in index["batches"]]
+        self.objects: Dict[str, List[Any]] = index["objects"]
+
+    def read(self, digest: str) -> Tuple[str, bytes]:
+        """Return ``(suffix, stored bytes)`` of a packed object."""
+        offset, length, suffix = self.objects[digest]
+        with open(self.data_path, "rb") as f:
+            f.seek(offset)
+            payload = f.read(length)
+        if len(payload) != length:
+            raise ValueError(f"pack {self.data_path.name} is truncated")
+        return suffix, payload
+
+
+class PackSet:
+    """All packs of a snapshots directory."""
+
+    def __init__(self, packs: List[Pack]):
+        self.packs = packs
+        self._objects = {digest: pack for pack in packs for digest in pack.objects}
+
+    def __contains__(self, digest: str) -> bool:
+        return digest in self._objects
+
+    def suffix(self, digest: str) -> Optional[str]:
+        pack = self._objects.get(digest)
+        return pack.objects[digest][2] if pack is not None else None
+
+    def read(self, digest: str) -> Tuple[str, bytes]:
+        return self._objects[digest].read(digest)
+
+    def batches(self) -> Iterator[PackedBatch]:
+        for pack in self.packs:
+            yield from pack.batches
+
+
+_packsets: Dict[Path, Tuple[int, PackSet]] = {}
+_packsets_lock = threading.Lock()
+
+
+def load_packs(snap_root: Path) -> PackSet:
+    """Return the packs under *snap_root*, re-reading them only after a pack changed."""
+    pack_dir = Path(snap_root) / PACK_DIR
+    try:
+        stamp = os.stat(pack_dir).st_mtime_ns  # Every os.replace in pack_dir changes it
+    except FileNotFoundError:
+        return PackSet([])
+    with _packsets_lock:
+        cached = _packsets.get(pack_dir)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+    packs = []
+    for idx_path in sorted(pack_dir.glob("pack-*.idx")):
+        try:
+            packs.append(Pack(idx_path))
+        except (OSError, codec.DecodeError, KeyError):
+            continue  # Removed while listing, or not a pack
+    packset = PackSet(packs)
+    with _packsets_lock:
+        _packsets[pack_dir] = (stamp, packset)
+    return packset
+
+
+def _invalidate(pack_dir: Path) -> None:
+    # Coarse mtime clocks can leave the stamp unchanged by a quick rewrite
+    with _packsets_lock:
+        _packsets.pop(pack_dir, None)
+
+
+def _write_index(idx_path: Path, batches: List[PackedBatch], objects: Dict[str, List[Any]]) -> None:
+    tmp = idx_path.with_name(idx_path.name + ".tmp")
+    tmp.write_bytes(codec.dumpb({"version": PACK_VERSION, "batches": batches, "objects": objects}))
+    os.replace(tmp, idx_path)
+    _invalidate(idx_path.parent)
+
+
+def write_pack(snap_root: Path, batches: List[PackedBatch],
+               objects: Iterable[Tuple[str, str, Callable[[], bytes]]]) -> Path:
+    """Write a pack of *batches* and *objects* ``(digest, suffix, read payload)``.
+
+    Payloads are read one at a time, so packing never holds more than one
+    object in memory. Returns the ``.idx`` path.
+    """
+    pack_dir = Path(snap_root) / PACK_DIR
+    pack_dir.mkdir(parents=True, exist_ok=True)
+    tmp = pack_dir / f".pack-{os.getpid()}-{threading.get_ident()}.tmp"
+    digest = hashlib.sha256()
+    index: Dict[str, List[Any]] = {}
+    offset = 0
+    with open(tmp, "wb") as f:
+        for obj, suffix, read in objects:
+            payload = read()
+            f.write(payload)
+            digest.update(payload)
+            index[obj] = [offset, len(payload), suffix]
+            offset += len(payload)
+        f.flush()
+        os.fsync(f.fileno())  # The loose copies are deleted once the pack exists
+    for _, name, _ in batches:
+        digest.update(name.encode())
+    base = pack_dir / f"pack-{digest.hexdigest()[:20]}"
+    os.replace(tmp, base.with_suffix(".pack"))
+    _write_index(base.with_suffix(".idx"), batches, index)
+    return base.with_suffix(".idx")
+
+
+def drop_batch(snap_root: Path, ordinal: int) -> bool:
+    """Remove a packed batch from its pack's index; return False if no pack has it."""
+    for pack in load_packs(snap_root).packs:
+        remaining = [b for b in pack.batches if b[0] != ordinal]
+        if len(remaining) != len(pack.batches):
+            _write_index(pack.idx_path, remaining, pack.objects)
+            return True
+    return False
+
+
+def remove_pack(pack: Pack) -> None:
+    pack.idx_path.unlink(missing_ok=True)  # Index first: without it the data is ignored
+    pack.data_path.unlink(missing_ok=True)
+    _invalidate(pack.idx_path.parent)
@@ -0,0 +1,534 @@
+# snapshot_store.py
+"""Content-addressed storage shared by ``snapshot`` and the snapshot manager plugin.
+
+File contents live once under ``<snapshots>/objects/``, named by the
+sha256 of the raw bytes and compressed with zstd (when ``zstandard`` is
+installed) or zlib. ``aye config set snapshot_compression none`` stores
+them as-is, cloned from the file by reflink where the filesystem allows
+(see ``snapshot_link``). With ``snapshot_delta_depth`` set, older
+versions of a file are kept as reverse deltas against newer ones (see
+``snapshot_delta``). A batch directory (``NNN_<timestamp>``) holds only its
+``metadata.json``, whose entries reference objects by hash::
+
+    {"version": 2, "timestamp": "...",
+     "files": [{"original": "/abs/path.py", "blob": "<sha256>", "mode": 420}]}
+
+Version 1 batches (a full copy of every file next to the metadata, plus a
+``latest/`` copy of the newest batch) stay readable; ``migrate`` converts
+them in place.
+"""
+import hashlib
+import os
+import shutil
+import stat
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from . import codec
+from .config import get_value
+from .snapshot_delta import MAX_DELTA_RATIO, apply_delta, decode_delta, delta_base, encode_delta, make_delta
+from .snapshot_link import clone_file
+from .snapshot_pack import load_packs, remove_pack, write_pack
+
+OBJECTS_DIR = "objects"
+METADATA_FILE = "metadata.json"
+METADATA_VERSION = 2
+LEGACY_LATEST_DIR = "latest"
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+# Unreferenced objects younger than this are kept by collect_garbage
+GC_GRACE_SECONDS = 60
+
+# Object file suffix per encoding; raw objects have none
+_SUFFIXES = {"zstd": ".zst", "zlib": ".z", "none": ""}
+# Suffix of objects stored as a delta against another object
+DELTA_SUFFIX = ".d"
+# pack() merges the existing packs once there are this many
+MAX_PACKS = 8
+# Turns a batch stays loose when "aye snap pack" is run without --keep
+DEFAULT_PACK_KEEP = 50
+
+# (ordinal, batch name, metadata entries or None)
+Batch = Tuple[int, str, Optional[List[Dict[str, Any]]]]
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def _default_encoding() -> str:
+    encoding = get_value("snapshot_compression")
+    if encoding in _SUFFIXES and (encoding != "zstd" or _zstd() is not None):
+        return encoding
+    return "zstd" if _zstd() is not None else "zlib"
+
+
+def delta_depth() -> int:
+    """Longest delta chain allowed by ``snapshot_delta_depth``; 0 disables deltas."""
+    try:
+        return max(int(get_value("snapshot_delta_depth", 0) or 0), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def auto_pack_keep() -> int:
+    """``snapshot_auto_pack``: pack every N turns what is older than N turns; 0 disables."""
+    try:
+        return max(int(get_value("snapshot_auto_pack", 0) or 0), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _is_batch_name(name: str) -> bool:
+    ordinal, sep, _ = name.partition("_")
+    return bool(sep) and ordinal.isdigit()
+
+
+def is_batch_dir(path: Path) -> bool:
+    """Return True for a ``NNN_<timestamp>`` batch directory."""
+    return _is_batch_name(path.name) and path.is_dir()
+
+
+def batch_dirs(snap_root: Path) -> List[Path]:
+    """Return the batch directories under *snap_root*, in no particular order."""
+    try:
+        with os.scandir(snap_root) as entries:
+            # DirEntry.is_dir() uses the type from the directory listing: no stat per batch
+            return [Path(e.path) for e in entries if _is_batch_name(e.name) and e.is_dir()]
+    except FileNotFoundError:
+        return []
+
+
+def batch_ordinal(path: Path) -> int:
+    return int(path.name.split("_", 1)[0])
+
+
+def file_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class BlobStore:
+    """sha256-named, compressed objects under ``<snap_root>/objects``, or in its packs."""
+
+    def __init__(self, snap_root: Path, encoding: Optional[str] = None):
+        self.snap_root = Path(snap_root)
+        self.root = self.snap_root / OBJECTS_DIR
+        self.encoding = encoding or _default_encoding()
+
+    def _candidates(self, digest: str) -> List[Path]:
+        base = self.root / digest[:2] / digest[2:]
+        # Full objects first: while a delta replaces one, both exist
+        suffixes = [*_SUFFIXES.values(), DELTA_SUFFIX]
+        return [base.with_name(base.name + suffix) for suffix in suffixes]
+
+    def find(self, digest: str) -> Optional[Path]:
+        """Return the loose object file holding *digest*, whatever its encoding."""
+        for path in self._candidates(digest):
+            if path.is_file():
+                return path
+        return None
+
+    def has(self, digest: str) -> bool:
+        return self.find(digest) is not None or digest in load_packs(self.snap_root)
+
+    def _load(self, digest: str) -> Tuple[str, bytes]:
+        """Return ``(suffix, stored bytes)`` of an object, loose or packed."""
+        path = self.find(digest)
+        if path is not None:
+            return path.suffix, path.read_bytes()
+        packs = load_packs(self.snap_root)
+        if digest in packs:
+            return packs.read(digest)
+        raise FileNotFoundError(f"snapshot object {digest} is missing")
+
+    def put(self, data: bytes) -> str:
+        """Store *data* unless an object with its hash exists; return the hash."""
+        digest = file_digest(data)
+        if self.has(digest):
+            return digest
+        suffix = _SUFFIXES[self.encoding]
+        path = self.root / digest[:2] / (digest[2:] + suffix)
+        if self.encoding == "zstd":
+            payload = _zstd().ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+        elif self.encoding == "zlib":
+            payload = zlib.compress(data, ZLIB_LEVEL)
+        else:
+            payload = data
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_bytes(payload)
+        os.replace(tmp, path)  # Objects appear atomically, never half-written
+        return digest
+
+    def put_file(self, path: Path, immutable: bool = False) -> str:
+        """Store the content of *path*; see ``put``.
+
+        Uncompressed objects are cloned from the file (``clone_file``)
+        rather than written, which costs no data I/O or space on
+        filesystems with reflinks. ``immutable`` also allows a hardlink.
+        """
+        path = Path(path)
+        if self.encoding != "none":
+            return self.put(path.read_bytes())
+        before = os.stat(path)
+        data = path.read_bytes()
+        digest = file_digest(data)
+        if self.has(digest):
+            return digest
+        obj = self.root / digest[:2] / digest[2:]
+        obj.parent.mkdir(parents=True, exist_ok=True)
+        tmp = obj.with_name(obj.name + ".tmp")
+        tmp.unlink(missing_ok=True)
+        clone_file(path, tmp, immutable=immutable)
+        after = os.stat(path)
+        if (after.st_ino, after.st_size, after.st_mtime_ns) != (before.st_ino, before.st_size, before.st_mtime_ns):
+            tmp.unlink(missing_ok=True)  # Changed while being cloned: store what was hashed
+            return self.put(data)
+        os.replace(tmp, obj)
+        return digest
+
+    def raw_path(self, digest: str) -> Optional[Path]:
+        """Return the object file of *digest* if it holds the content as-is."""
+        path = self.find(digest)
+        return path if path is not None and path.suffix == "" else None
+
+    def is_delta(self, digest: str) -> bool:
+        path = self.find(digest)
+        if path is not None:
+            return path.suffix == DELTA_SUFFIX
+        return load_packs(self.snap_root).suffix(digest) == DELTA_SUFFIX
+
+    def base_of(self, digest: str) -> Optional[str]:
+        """Return the object a delta is based on, or None for a full object."""
+        path = self.find(digest)
+        if path is not None:
+            if path.suffix != DELTA_SUFFIX:
+                return None
+            with open(path, "rb") as f:
+                return delta_base(f.readline())
+        suffix, payload = self._load(digest)
+        return delta_base(payload.partition(b"\n")[0]) if suffix == DELTA_SUFFIX else None
+
+    def get(self, digest: str) -> bytes:
+        # Follow the delta chain down to a full object, then apply the deltas upwards
+        chain = []
+        suffix, payload = self._load(digest)
+        while suffix == DELTA_SUFFIX:
+            base, ops = decode_delta(payload)
+            chain.append(ops)
+            suffix, payload = self._load(base)
+        if suffix == ".zst":
+            data = _zstd().ZstdDecompressor().decompress(payload)
+        elif suffix == ".z":
+            data = zlib.decompress(payload)
+        else:
+            data = payload
+        if not chain:
+            return data
+        for ops in reversed(chain):
+            data = apply_delta(data, ops)
+        if file_digest(data) != digest:
+            raise ValueError(f"snapshot object {digest} is corrupt")
+        return data
+
+    def deltify(self, digest: str, base: str) -> bool:
+        """Rewrite the full object *digest* as a delta against the full object *base*.
+
+        Returns False (and changes nothing) when either object is not full
+        or the delta would not be clearly smaller.
+        """
+        path, base_path = self.find(digest), self.find(base)
+        if (path is None or base_path is None or digest == base
+                or DELTA_SUFFIX in (path.suffix, base_path.suffix)):
+            return False
+        payload = encode_delta(base, make_delta(self.get(base), self.get(digest)))
+        if len(payload) >= path.stat().st_size * MAX_DELTA_RATIO:
+            return False
+        delta_path = self.root / digest[:2] / (digest[2:] + DELTA_SUFFIX)
+        tmp = delta_path.with_name(delta_path.name + ".tmp")
+        tmp.write_bytes(payload)
+        os.replace(tmp, delta_path)
+        path.unlink(missing_ok=True)
+        return True
+
+    def objects(self) -> List[Path]:
+        if not self.root.is_dir():
+            return []
+        return [p for d in self.root.iterdir() if d.is_dir() for p in d.iterdir() if not p.name.endswith(".tmp")]
+
+
+def read_metadata(batch_dir: Path) -> Dict[str, Any]:
+    return codec.loads((batch_dir / METADATA_FILE).read_bytes())
+
+
+def write_metadata(batch_dir: Path, meta: Dict[str, Any]) -> None:
+    path = batch_dir / METADATA_FILE
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(codec.dumpb(meta, indent=True))
+    os.replace(tmp, path)
+
+
+def entry_exists(store: BlobStore, entry: Dict[str, Any]) -> bool:
+    if "blob" in entry:
+        return store.has(entry["blob"])
+    return Path(entry["snapshot"]).exists()
+
+
+def entry_bytes(store: BlobStore, entry: Dict[str, Any]) -> bytes:
+    """Return the snapshotted content of a metadata entry (version 1 or 2)."""
+    if "blob" in entry:
+        return store.get(entry["blob"])
+    return Path(entry["snapshot"]).read_bytes()
+
+
+def entry_digest(entry: Dict[str, Any]) -> Optional[str]:
+    """Return the content hash of an entry, reading a version 1 copy if needed."""
+    if "blob" in entry:
+        return entry["blob"]
+    snapshot = Path(entry["snapshot"])
+    return file_digest(snapshot.read_bytes()) if snapshot.is_file() else None
+
+
+def restore_entry(store: BlobStore, entry: Dict[str, Any], dest: Path) -> None:
+    """Write the snapshotted content of *entry* to *dest*.
+
+    A symlink at *dest* keeps pointing at the restored file, and the file
+    keeps its permission bits (or gets the recorded ones if it is gone).
+    """
+    dest = Path(dest).resolve()  # Replace the link target, not the link
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    if "blob" not in entry:
+        shutil.copy2(entry["snapshot"], dest)
+        return
+    tmp = dest.with_name(f".{dest.name}.aye-restore")
+    tmp.unlink(missing_ok=True)
+    raw = store.raw_path(entry["blob"])
+    if raw is not None:
+        clone_file(raw, tmp)  # Never a hardlink: the restored file will be edited
+    else:
+        tmp.write_bytes(store.get(entry["blob"]))
+    if dest.exists():
+        shutil.copymode(dest, tmp)
+    elif "mode" in entry:
+        os.chmod(tmp, entry["mode"])
+    os.replace(tmp, dest)
+
+
+def snapshot_files(store: BlobStore, file_paths: List[Path]) -> List[Dict[str, Any]]:
+    """Store the current content of *file_paths*; return their metadata entries.
+
+    A file that does not exist yet is recorded with empty content, so
+    restoring the batch empties it again.
+    """
+    entries = []
+    for src_path in file_paths:
+        if src_path.is_file():
+            entries.append({"original": str(src_path), "blob": store.put_file(src_path),
+                            "mode": stat.S_IMODE(src_path.stat().st_mode)})
+        else:
+            entries.append({"original": str(src_path), "blob": store.put(b"")})
+    return entries
+
+
+def deltify_previous(store: BlobStore, entry: Dict[str, Any],
+                     history: List[Dict[str, Any]], depth: int) -> bool:
+    """Store the previous version of a just-snapshotted file as a delta against it.
+
+    *history* holds the file's earlier entries, newest first. The previous
+    version stays full (a keyframe) when the versions before it already
+    form a chain of *depth* deltas ending at it, so no version needs more
+    than *depth* deltas applied.
+    """
+    digests = [e.get("blob") for e in history]
+    if depth <= 0 or not digests or digests[0] is None or "blob" not in entry:
+        return False
+    run = 0
+    for digest in digests[1:depth + 1]:
+        if digest is None or not store.is_delta(digest):
+            break
+        run += 1
+    if run >= depth:
+        return False
+    return store.deltify(digests[0], entry["blob"])
+
+
+def iter_batches(snap_root: Path) -> Iterator[Batch]:
+    """Every batch, from its directory or its pack; the source of truth of the snapshot index.
+
+    Files are None when a batch's metadata cannot be read.
+    """
+    snap_root = Path(snap_root)
+    seen = set()
+    for batch_dir in batch_dirs(snap_root):
+        try:
+            files = read_metadata(batch_dir)["files"]
+        except (OSError, codec.DecodeError, KeyError):
+            files = None
+        seen.add(batch_ordinal(batch_dir))
+        yield batch_ordinal(batch_dir), batch_dir.name, files
+    for ordinal, name, meta in load_packs(snap_root).batches():
+        if ordinal not in seen:  # An interrupted pack run leaves both; the directory wins
+            seen.add(ordinal)
+            yield ordinal, name, meta.get("files")
+
+
+def _needed(store: BlobStore, entries: Iterable[Dict[str, Any]]) -> Set[str]:
+    """Objects *entries* reference, plus the bases their deltas are built on."""
+    needed = {e["blob"] for e in entries if "blob" in e}
+    pending = list(needed)
+    while pending:
+        try:
+            base = store.base_of(pending.pop())
+        except FileNotFoundError:
+            continue
+        if base is not None and base not in needed:
+            needed.add(base)
+            pending.append(base)
+    return needed
+
+
+def collect_garbage(snap_root: Path) -> int:
+    """Delete loose objects no batch references any more; return how many were removed.
+
+    Packed objects are dropped when packs are consolidated (see ``pack``).
+    """
+    snap_root = Path(snap_root)
+    store = BlobStore(snap_root)
+    entries: List[Dict[str, Any]] = []
+    for _, _, files in iter_batches(snap_root):
+        if files is None:
+            return 0  # Cannot tell what this batch needs: keep everything
+        entries.extend(files)
+    referenced = _needed(store, entries)
+    removed = 0
+    cutoff = time.time() - GC_GRACE_SECONDS
+    for obj in store.objects():
+        # Recent objects may belong to a batch whose metadata is being written
+        if obj.parent.name + obj.name.split(".")[0] not in referenced and obj.stat().st_mtime < cutoff:
+            obj.unlink(missing_ok=True)
+            removed += 1
+    return removed
+
+
+def pack(snap_root: Path, keep: int, consolidate: bool = False) -> Tuple[int, int, int]:
+    """Move batches more than *keep* turns old into a pack file (see ``snapshot_pack``).
+
+    The pack takes their metadata and the loose objects only they need;
+    objects newer batches use stay loose (for deltas and fast reads). With
+    *consolidate*, or once there are ``MAX_PACKS`` packs, the existing
+    packs are merged into the new one, dropping the batches and objects
+    nothing needs any more. Version 1 batches are left alone (run
+    ``migrate`` first). Returns ``(batches packed, objects packed, files
+    removed)``.
+    """
+    snap_root = Path(snap_root)
+    store = BlobStore(snap_root)
+    packs = load_packs(snap_root)
+    loose = sorted(batch_dirs(snap_root), key=batch_ordinal)
+    latest = max((batch_ordinal(d) for d in loose), default=0)
+    cold: List[Tuple[int, str, Dict[str, Any]]] = []
+    hot_entries: List[Dict[str, Any]] = []
+    unreadable = False
+    for batch_dir in loose:
+        try:
+            meta = read_metadata(batch_dir)
+            files = meta["files"]
+        except (OSError, codec.DecodeError, KeyError):
+            unreadable = True  # Leave it loose; its objects stay readable wherever they are
+            continue
+        if batch_ordinal(batch_dir) <= latest - keep and all("blob" in e for e in files):
+            cold.append((batch_ordinal(batch_dir), batch_dir.name, meta))
+        else:
+            hot_entries.extend(files)
+    consolidate = consolidate or len(packs.packs) >= MAX_PACKS
+    if not cold and not (consolidate and packs.packs):
+        return 0, 0, 0
+
+    hot = _needed(store, hot_entries)
+    cold_needed = _needed(store, (e for _, _, meta in cold for e in meta["files"]))
+    moved = {}  # digest -> loose path, deleted once the pack exists
+    for digest in sorted(cold_needed - hot):
+        path = store.find(digest)
+        if path is not None:
+            moved[digest] = path
+    batches = list(cold)
+    carried: List[str] = []
+    if consolidate:
+        loose_ordinals = {batch_ordinal(d) for d in loose}
+        packed = [b for b in packs.batches() if b[0] not in loose_ordinals]
+        batches = sorted(packed + cold)
+        live = None if unreadable else _needed(
+            store, [e for _, _, meta in batches for e in meta.get("files", [])] + hot_entries)
+        carried = [d for pack in packs.packs for d in pack.objects
+                   if d not in moved and (live is None or d in live)]
+
+    def objects():
+        for digest, path in moved.items():
+            yield digest, path.suffix, path.read_bytes
+        for digest in dict.fromkeys(carried):
+            yield digest, packs.suffix(digest), lambda d=digest: packs.read(d)[1]
+
+    new_idx = write_pack(snap_root, batches, objects())
+    removed = 0
+    for _, name, _ in cold:
+        shutil.rmtree(snap_root / name, ignore_errors=True)
+        removed += 2  # Directory and metadata.json
+    for path in moved.values():
+        path.unlink(missing_ok=True)  # Only the file packed: a delta written since stays
+        removed += 1
+    if consolidate:
+        for old in packs.packs:
+            if old.idx_path != new_idx:
+                remove_pack(old)
+                removed += 2
+    return len(cold), len(moved) + len(set(carried)), removed
+
+
+def _tree_bytes(root: Path) -> int:
+    return sum(p.stat().st_size for p in root.rglob("*") if p.is_file()) if root.is_dir() else 0
+
+
+def migrate(snap_root: Path) -> Tuple[int, int, int]:
+    """Convert version 1 batches under *snap_root* to blob references.
+
+    Copies are moved into the object store (identical contents collapse to
+    one object), metadata is rewritten and the legacy ``latest/`` directory
+    is removed. Safe to re-run. Returns ``(batches migrated, bytes before,
+    bytes after)``.
+    """
+    snap_root = Path(snap_root)
+    before = _tree_bytes(snap_root)
+    store = BlobStore(snap_root)
+    migrated = 0
+    for batch_dir in sorted(batch_dirs(snap_root)):
+        try:
+            meta = read_metadata(batch_dir)
+        except (OSError, codec.DecodeError):
+            continue  # Leave unreadable batches untouched
+        if meta.get("version", 1) >= METADATA_VERSION:
+            continue
+        copies = []
+        for entry in meta["files"]:
+            snapshot = Path(entry.pop("snapshot", ""))
+            if not snapshot.is_file():
+                # Lost copy: keep the batch listed, with nothing to restore
+                snapshot = batch_dir / Path(entry["original"]).name
+            # Version 1 copies are never edited: a raw object may hardlink them
+            entry["blob"] = store.put_file(snapshot, immutable=True) if snapshot.is_file() else store.put(b"")
+            copies.append(snapshot)
+        meta["version"] = METADATA_VERSION
+        write_metadata(batch_dir, meta)
+        for copy in copies:
+            if copy.parent == batch_dir and copy.name != METADATA_FILE:
+                copy.unlink(missing_ok=True)
+        migrated += 1
+    legacy_latest = snap_root / LEGACY_LATEST_DIR
+    if legacy_latest.is_dir():
+        shutil.rmtree(legacy_latest)
+    return migrated, before, _tree_bytes(snap_root)
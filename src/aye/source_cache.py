@@ -0,0 +1,188 @@
+# source_cache.py
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# Persistent cache file – lives next to the other per-project state in .aye/
+CACHE_FILE = Path(".aye/source_cache.json").resolve()
+CACHE_VERSION = 1
+
+# Files modified this recently are never trusted from cache: a second write
+# within the filesystem's timestamp granularity could leave size and mtime
+# unchanged (the classic "racy git" problem).
+_RACY_WINDOW_NS = 2_000_000_000
+
+
+def content_hash(content: str) -> str:
+    """Return the sha256 hex digest of decoded *content*."""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def _stat_key(st: os.stat_result) -> Tuple[int, int, int]:
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+
+class SourceCache:
+    """Stat-keyed cache of decoded source files.
+
+    Entries are keyed by absolute path and validated against
+    ``(size, mtime_ns, inode)``; on a match the decoded contents and the
+    content hash are reused without touching the file. The in-memory layer
+    lives as long as the instance (one per ``chat_repl`` session); ``save``
+    persists it under ``.aye/`` for the next session.
+    """
+
+    def __init__(self, cache_file: Path = CACHE_FILE):
+        self.cache_file = cache_file
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._loaded = False
+        self._dirty = False
+        self._lock = threading.Lock()
+        # Lazily built reverse index for get_by_blob()
+        self._blob_paths: Optional[Dict[str, str]] = None
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.cache_file.is_file():
+            return
+        try:
+            data = json.loads(self.cache_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return  # Corrupt or unreadable cache – start from scratch
+        if data.get("version") == CACHE_VERSION:
+            self._entries = data.get("entries", {})
+
+    def get(self, path: str, st: os.stat_result) -> Optional[Tuple[str, str]]:
+        """Return ``(content, sha256)`` for *path* if *st* still matches the cached entry."""
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._entries.get(path)
+            if entry is None or "content" not in entry or tuple(entry["key"]) != _stat_key(st):
+                return None
+            return entry["content"], entry["sha256"]
+
+    def get_lazy(self, path: str, st: os.stat_result) -> Optional[str]:
+        """Return the sha256 recorded by ``put_lazy`` for *path* if *st* still matches."""
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._entries.get(path)
+            if entry is None or not entry.get("lazy") or tuple(entry["key"]) != _stat_key(st):
+                return None
+            return entry["sha256"]
+
+    def skipped_reason(self, path: str, st: os.stat_result) -> Optional[str]:
+        """Return why *path* was skipped last time, if *st* still matches."""
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._entries.get(path)
+            if entry is None or "skip" not in entry or tuple(entry["key"]) != _stat_key(st):
+                return None
+            return entry["skip"]
+
+    def get_by_blob(self, path: str, st: os.stat_result, blob: str) -> Optional[Tuple[str, str]]:
+        """Return cached content known to have git blob id *blob*, re-keyed to *st*.
+
+        Used when the git index vouches for a file whose stat data changed
+        (checkout, touch, fresh clone) but whose content did not.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._entries.get(path)
+            if entry is None or entry.get("blob") != blob:
+                source = self._blobs().get(blob)
+                entry = self._entries.get(source) if source is not None else None
+                if entry is None or entry.get("blob") != blob or "content" not in entry:
+                    return None
+        self.put(path, st, entry["content"], blob=blob)
+        return entry["content"], entry["sha256"]
+
+    def _blobs(self) -> Dict[str, str]:
+        """Map of git blob id -> path of an entry holding that content (lock held)."""
+        if self._blob_paths is None:
+            self._blob_paths = {e["blob"]: p for p, e in self._entries.items() if e.get("blob")}
+        return self._blob_paths
+
+    def put(self, path: str, st: os.stat_result, content: str, blob: Optional[str] = None) -> str:
+        """Store freshly read *content* for *path* and return its sha256.
+
+        *blob* is the git blob id of the content, when the index vouches for it.
+        """
+        digest = content_hash(content)
+        if time.time_ns() - st.st_mtime_ns < _RACY_WINDOW_NS:
+            return digest  # Too fresh to trust on the next lookup
+        with self._lock:
+            self._ensure_loaded()
+            entry = {
+                "key": list(_stat_key(st)),
+                "sha256": digest,
+                "content": content,
+            }
+            if blob is not None:
+                entry["blob"] = blob
+                if self._blob_paths is not None:
+                    self._blob_paths[blob] = path
+            self._entries[path] = entry
+            self._dirty = True
+        return digest
+
+    def put_lazy(self, path: str, st: os.stat_result, digest: str) -> None:
+        """Remember that *path* was validated as text with hash *digest*, without its content."""
+        if time.time_ns() - st.st_mtime_ns < _RACY_WINDOW_NS:
+            return
+        with self._lock:
+            self._ensure_loaded()
+            self._entries[path] = {"key": list(_stat_key(st)), "sha256": digest, "lazy": True}
+            self._dirty = True
+
+    def put_skipped(self, path: str, st: os.stat_result, reason: str) -> None:
+        """Remember that *path* was skipped (e.g. binary) so it is not sniffed again."""
+        if time.time_ns() - st.st_mtime_ns < _RACY_WINDOW_NS:
+            return
+        with self._lock:
+            self._ensure_loaded()
+            self._entries[path] = {"key": list(_stat_key(st)), "skip": reason}
+            self._dirty = True
+
+    def discard(self, path: str) -> None:
+        """Forget the entry for *path* (e.g. it became unreadable)."""
+        with self._lock:
+            self._ensure_loaded()
+            if self._entries.pop(path, None) is not None:
+                self._dirty = True
+                self._blob_paths = None
+
+    def prune(self, root: str, live_paths: Iterable[str]) -> None:
+        """Drop entries under *root* that are not in *live_paths*."""
+        prefix = root.rstrip(os.sep) + os.sep
+        live = set(live_paths)
+        with self._lock:
+            self._ensure_loaded()
+            stale = [p for p in self._entries if p.startswith(prefix) and p not in live]
+            for p in stale:
+                del self._entries[p]
+            if stale:
+                self._dirty = True
+                self._blob_paths = None
+
+    def save(self) -> None:
+        """Persist the cache atomically if anything changed since the last save."""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"version": CACHE_VERSION, "entries": self._entries}
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.cache_file.with_suffix(".tmp")
+            tmp_file.write_text(json.dumps(data), encoding="utf-8")
+            os.replace(tmp_file, self.cache_file)
+            self._dirty = False
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._entries)
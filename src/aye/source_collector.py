@@ -1,6 +1,41 @@
+import codecs
+import fnmatch
+import hashlib
+import os
+import re
+import stat
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, Set, List, Iterable
-from itertools import chain
+from typing import Callable, Dict, Iterator, List, Optional, Pattern, Set, Tuple
+
+from rich import print as rprint
+
+from .config import get_value
+from .git_index import IndexEntry, is_clean, tracked_under
+from .ignore import IgnoreMatcher
+from .lazy_source import DEFAULT_LAZY_SOURCE_BYTES, LazySource, SourceValue, iter_file_text, source_text
+from .source_cache import SourceCache
+
+
+# Default number of reader threads; override with `aye config set collect_workers N`
+DEFAULT_COLLECT_WORKERS = 8
+# Files larger than this are skipped (`aye config set max_file_bytes N`)
+DEFAULT_MAX_FILE_BYTES = 1024 * 1024
+# Total bytes of source sent with one prompt (`aye config set max_total_bytes N`)
+DEFAULT_MAX_TOTAL_BYTES = 32 * 1024 * 1024
+# Leading block inspected to reject binary files before reading them fully
+SNIFF_BYTES = 8192
+
+# How files are enumerated: "auto" (git index when available), "git" or "walk"
+DEFAULT_COLLECT_BACKEND = "auto"
+
+# Skip reasons reported in the collection summary
+SKIP_BINARY = "binary"
+SKIP_NON_UTF8 = "non-UTF8"
+SKIP_TOO_LARGE = "too large"
+SKIP_OVER_BUDGET = "over total budget"
+SKIP_UNREADABLE = "unreadable"
 
 
 def _is_hidden(path: Path) -> bool:
@@ -11,114 +46,527 @@ def _is_hidden(path: Path) -> bool:
     return any(part.startswith(".") for part in path.parts)
 
 
-def _load_patterns_from_file(file_path: Path) -> List[str]:
-    """Load patterns from a single ignore file, filtering out empty lines and comments."""
+def _compile_masks(masks: List[str]) -> Tuple[Optional[Pattern[str]], Optional[Pattern[str]]]:
+    """Combine file masks into one regex over file names and one over relative paths.
+
+    Masks without a slash are tested against the file name only; masks with a
+    slash (e.g. ``"tests/*.py"``) match the tail of the relative path, like
+    ``Path.rglob`` does.
+    """
+    name_masks = [fnmatch.translate(m) for m in masks if "/" not in m]
+    path_masks = ["(?:.*/)?" + fnmatch.translate(m) for m in masks if "/" in m]
+    name_re = re.compile("|".join(name_masks)) if name_masks else None
+    path_re = re.compile("|".join(path_masks)) if path_masks else None
+    return name_re, path_re
+
+
+def _walk(
+    base_path: Path,
+    masks: List[str],
+    ignore_matcher: IgnoreMatcher,
+    recursive: bool = True,
+    start: str = "",
+    on_dir: Optional[Callable[[str, str], None]] = None,
+) -> Iterator[Tuple[str, os.DirEntry]]:
+    """Yield ``(relative_path, entry)`` for every file under *base_path* matching *masks*.
+
+    A single ``os.scandir`` pass: hidden and ignored directories are never
+    entered, and every mask is tested against each entry at once. *start*
+    limits the walk to one (already vetted) subdirectory; *on_dir* is called
+    with ``(relative_dir, absolute_dir)`` for every directory entered.
+    """
+    name_re, path_re = _compile_masks(masks)
+    stack: List[Tuple[str, str]] = [(start, os.path.join(str(base_path), start) if start else str(base_path))]
+    while stack:
+        rel_dir, abs_dir = stack.pop()
+        if on_dir is not None:
+            on_dir(rel_dir, abs_dir)
+        try:
+            with os.scandir(abs_dir) as it:
+                entries = list(it)
+        except OSError:
+            continue  # Unreadable or vanished directory
+
+        for entry in entries:
+            name = entry.name
+            # Skip hidden files and folders (names starting with '.')
+            if name.startswith("."):
+                continue
+            rel_path = f"{rel_dir}/{name}" if rel_dir else name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive and not ignore_matcher.match_entry(rel_path, True):
+                        stack.append((rel_path, entry.path))
+                    continue
+                if not ((name_re is not None and name_re.match(name)) or
+                        (path_re is not None and path_re.match(rel_path))):
+                    continue
+                if not entry.is_file():
+                    continue
+            except OSError:
+                continue
+            if ignore_matcher.match_entry(rel_path, False):
+                continue
+            yield rel_path, entry
+
+
+# A collection candidate: (relative path, absolute path, stat, git blob id if known clean)
+_Candidate = Tuple[str, str, os.stat_result, Optional[str]]
+
+
+def _enumerate_walk(base_path: Path, masks: List[str], ignore_matcher: IgnoreMatcher,
+                    recursive: bool) -> List[_Candidate]:
+    candidates: List[_Candidate] = []
+    for rel_path, entry in _walk(base_path, masks, ignore_matcher, recursive):
+        try:
+            candidates.append((rel_path, entry.path, entry.stat(), None))
+        except OSError:
+            continue
+    return candidates
+
+
+# Untracked scan cache: directory -> (its mtime_ns, subdirectory names, other names)
+_LISTINGS: Dict[str, Tuple[int, List[str], List[str]]] = {}
+# Listings of directories modified this recently are not cached: a coarse
+# mtime clock could leave a later change within the same tick unnoticed
+_RACY_WINDOW_NS = 2_000_000_000
+
+
+def _list_dir(abs_dir: str) -> Optional[Tuple[List[str], List[str]]]:
+    """Return ``(subdirectories, other entries)`` of *abs_dir*, hidden names excluded.
+
+    Adding, removing or renaming an entry changes a directory's mtime, so
+    a listing is reused for as long as the mtime is unchanged and the
+    directory is only read again once it was modified. Returns None if it
+    cannot be read.
+    """
+    try:
+        mtime_ns = os.stat(abs_dir).st_mtime_ns
+    except OSError:
+        _LISTINGS.pop(abs_dir, None)
+        return None
+    cached = _LISTINGS.get(abs_dir)
+    if cached is not None and cached[0] == mtime_ns:
+        return cached[1], cached[2]
+    subdirs: List[str] = []
+    names: List[str] = []
+    try:
+        with os.scandir(abs_dir) as it:
+            for entry in it:
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                (subdirs if is_dir else names).append(entry.name)
+    except OSError:
+        _LISTINGS.pop(abs_dir, None)
+        return None
+    if time.time_ns() - mtime_ns > _RACY_WINDOW_NS:
+        _LISTINGS[abs_dir] = (mtime_ns, subdirs, names)
+    return subdirs, names
+
+
+def _untracked(base_path: Path, masks: List[str], ignore_matcher: IgnoreMatcher, recursive: bool,
+               tracked: Dict[str, IndexEntry]) -> Iterator[Tuple[str, str, os.stat_result]]:
+    """Yield ``(relative_path, absolute_path, stat)`` of matching files not in *tracked*.
+
+    Like git's untracked cache: every non-ignored directory is stat'ed,
+    but only those modified since the previous scan are listed again, so
+    on an unchanged tree this costs one ``stat`` per directory and no
+    ``scandir``. Only untracked files that pass the masks are stat'ed.
+    """
+    name_re, path_re = _compile_masks(masks)
+    stack: List[Tuple[str, str]] = [("", str(base_path))]
+    while stack:
+        rel_dir, abs_dir = stack.pop()
+        listing = _list_dir(abs_dir)
+        if listing is None:
+            continue  # Unreadable or vanished directory
+        subdirs, names = listing
+        for name in subdirs:
+            rel_path = f"{rel_dir}/{name}" if rel_dir else name
+            if recursive and not ignore_matcher.match_entry(rel_path, True):
+                stack.append((rel_path, os.path.join(abs_dir, name)))
+        for name in names:
+            rel_path = f"{rel_dir}/{name}" if rel_dir else name
+            if rel_path in tracked:
+                continue
+            if not ((name_re is not None and name_re.match(name)) or
+                    (path_re is not None and path_re.match(rel_path))):
+                continue
+            if ignore_matcher.match_entry(rel_path, False):
+                continue
+            abs_path = os.path.join(abs_dir, name)
+            try:
+                st = os.stat(abs_path)
+            except OSError:
+                continue
+            if stat.S_ISREG(st.st_mode):
+                yield rel_path, abs_path, st
+
+
+def _enumerate_git(base_path: Path, masks: List[str], ignore_matcher: IgnoreMatcher,
+                   recursive: bool) -> Optional[List[_Candidate]]:
+    """Enumerate candidates from ``.git/index``, plus untracked files.
+
+    Tracked paths come straight from the index, so only their ``stat`` is
+    needed; files whose stat data still matches the index carry the staged
+    blob id, which lets the source cache recognise content it has already
+    decoded. Untracked files are found by ``_untracked``, which re-lists
+    only directories modified since the previous call. Returns None when
+    *base_path* is not inside a readable repository.
+    """
+    tracked = tracked_under(base_path)
+    if tracked is None:
+        return None
+    entries, index_mtime_ns = tracked
+    name_re, path_re = _compile_masks(masks)
+    prefix = os.path.join(str(base_path), "")
+    candidates: List[_Candidate] = []
+
+    # Directory -> whether it is hidden or ignored, decided once per directory
+    excluded_dirs: Dict[str, bool] = {}
+
+    for rel_path, index_entry in entries.items():
+        rel_dir, _, name = rel_path.rpartition("/")
+        if not recursive and rel_dir:
+            continue
+        if not ((name_re is not None and name_re.match(name)) or
+                (path_re is not None and path_re.match(rel_path))):
+            continue
+        if stat.S_IFMT(index_entry.mode) == 0o160000:
+            continue  # Submodule commit, not a file
+        # Skip hidden files and subfolders (any part of the path starting with '.')
+        if name.startswith("."):
+            continue
+        excluded = excluded_dirs.get(rel_dir)
+        if excluded is None:
+            excluded = (any(part.startswith(".") for part in rel_dir.split("/"))
+                        or ignore_matcher.dir_ignored(rel_dir))
+            excluded_dirs[rel_dir] = excluded
+        if excluded or ignore_matcher.match_entry(rel_path, False):
+            continue
+        abs_path = prefix + rel_path
+        try:
+            st = os.stat(abs_path)
+        except OSError:
+            continue  # Deleted in the working tree
+        if not stat.S_ISREG(st.st_mode):
+            continue
+        blob = index_entry.blob if is_clean(index_entry, st, index_mtime_ns) else None
+        candidates.append((rel_path, abs_path, st, blob))
+
+    for rel_path, abs_path, st in _untracked(base_path, masks, ignore_matcher, recursive, entries):
+        candidates.append((rel_path, abs_path, st, None))
+    return candidates
+
+
+def _admit(candidates: List[_Candidate], rejected: Dict[str, str],
+           total_cap: int) -> Tuple[List[_Candidate], List[_Candidate]]:
+    """Split *candidates* (in path order) into those within the byte budget and those over it.
+
+    Files already in *rejected* take no share of the budget.
+    """
+    admitted: List[_Candidate] = []
+    over: List[_Candidate] = []
+    total = 0
+    for candidate in candidates:
+        if candidate[0] in rejected:
+            continue
+        size = candidate[2].st_size
+        if total + size > total_cap:
+            over.append(candidate)
+            continue
+        total += size
+        admitted.append(candidate)
+    return admitted, over
+
+
+def _sniff_binary(head: bytes) -> Optional[str]:
+    """Return a skip reason if the first block of a file is not UTF-8 text."""
+    if b"\0" in head:
+        return SKIP_BINARY
     try:
-        patterns = file_path.read_text(encoding="utf-8").splitlines()
-        # Filter out empty lines and comments
-        return [
-            pattern.strip() for pattern in patterns 
-            if pattern.strip() and not pattern.strip().startswith("#")
-        ]
-    except Exception:
-        # If we can't read the file, proceed without its ignore patterns
-        return []
-
-
-def _load_ignore_patterns(root_path: Path) -> list[str]:
-    """Load ignore patterns from .ayeignore and .gitignore files in the root directory and all parent directories."""
-    ignore_patterns = []
-    
-    # Start from root_path and go up through all parent directories
-    current_path = root_path.resolve()
-    
-    # Include .ayeignore and .gitignore from all parent directories
-    while current_path != current_path.parent:  # Stop when we reach the root directory
-        # Load .ayeignore file
-        ayeignore_file = current_path / ".ayeignore"
-        if ayeignore_file.exists():
-            ignore_patterns.extend(_load_patterns_from_file(ayeignore_file))
-        
-        # Load .gitignore file
-        gitignore_file = current_path / ".gitignore"
-        if gitignore_file.exists():
-            ignore_patterns.extend(_load_patterns_from_file(gitignore_file))
-        
-        current_path = current_path.parent
-    
-    return ignore_patterns
-
-
-def _matches_ignore_pattern(path: Path, ignore_patterns: list[str], base_path: Path) -> bool:
-    """Check if a path matches any of the ignore patterns."""
+        # final=False tolerates a multi-byte character cut at the block boundary
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+    except UnicodeDecodeError:
+        return SKIP_NON_UTF8
+    return None
+
+
+def _scan_lazy(path: str, size: int, max_bytes: int) -> Tuple[Optional[LazySource], Optional[str]]:
+    """Validate and hash a large file in chunks, keeping none of its text."""
+    digest = hashlib.sha256()
     try:
-        relative_path = path.relative_to(base_path)
-    except ValueError:
-        # Path is not relative to base_path, shouldn't happen but be safe
-        return False
-    
-    path_str = relative_path.as_posix()
-    
-    for pattern in ignore_patterns:
-        # Handle directory patterns (ending with /)
-        if pattern.endswith("/"):
-            dir_pattern = pattern.rstrip("/")
-            # Check if any part of the path matches the directory pattern
-            if any(part == dir_pattern for part in relative_path.parts):
-                return True
-        else:
-            # For file patterns, check if the file name or full path matches
-            if relative_path.match(pattern):
-                return True
-            # Also check just the file name for simpler patterns
-            if path.name == pattern or Path(path.name).match(pattern):
-                return True
-    
-    return False
+        for text in iter_file_text(path):
+            digest.update(text.encode("utf-8"))
+        size = os.stat(path).st_size
+    except UnicodeDecodeError:
+        return None, SKIP_NON_UTF8
+    except OSError:
+        return None, SKIP_UNREADABLE
+    if size > max_bytes:
+        return None, SKIP_TOO_LARGE
+    return LazySource(path, size, digest.hexdigest()), None
+
+
+def _read_file(path: str, max_bytes: int = DEFAULT_MAX_FILE_BYTES,
+               lazy_bytes: Optional[int] = None) -> Tuple[Optional[SourceValue], Optional[str]]:
+    """Read and decode one file; return ``(content, None)`` or ``(None, reason)``.
+
+    Only the first block is read for binary files, and at most *max_bytes*
+    (plus one, to notice files that grew since they were stat'ed) otherwise.
+    Files over *lazy_bytes* are returned as a ``LazySource`` instead of text.
+    """
+    try:
+        with open(path, "rb") as f:
+            head = f.read(SNIFF_BYTES)
+            reason = _sniff_binary(head)
+            if reason is not None:
+                return None, reason
+            size = os.fstat(f.fileno()).st_size
+            if lazy_bytes is not None and lazy_bytes < size <= max_bytes:
+                return _scan_lazy(path, size, max_bytes)
+            data = head
+            if len(head) == SNIFF_BYTES:
+                # read(n) preallocates n bytes, so bound it by the actual size too
+                data += f.read(max(min(max_bytes, size) + 1 - len(head), 1))
+                if size < len(data) <= max_bytes:
+                    data += f.read(max_bytes + 1 - len(data))  # Grew since fstat'ed
+    except OSError:
+        return None, SKIP_UNREADABLE
+    if len(data) > max_bytes:
+        return None, SKIP_TOO_LARGE
+    try:
+        text = data.decode("utf-8")
+    except UnicodeDecodeError:
+        return None, SKIP_NON_UTF8
+    # Universal newlines, matching what Path.read_text() used to return
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text, None
+
+
+def _config_int(value: Optional[int], key: str, default: int, minimum: int = 1) -> int:
+    if value is None:
+        value = get_value(key, default)
+    try:
+        return max(minimum, int(value))
+    except (TypeError, ValueError):
+        return default
+
+
+def _iter_read_files(paths: List[str], max_workers: int, max_bytes: int,
+                     lazy_bytes: Optional[int] = None) -> Iterator[Tuple[Optional[SourceValue], Optional[str]]]:
+    """Read *paths* with a bounded thread pool, yielding results in input order.
+
+    Reads release the GIL, so on high-latency filesystems (NFS, container
+    bind-mounts) the workers overlap I/O and decoding of different files.
+    Each result is yielded as soon as it and those before it are read.
+    """
+    if max_workers <= 1 or len(paths) <= 1:
+        for p in paths:
+            yield _read_file(p, max_bytes, lazy_bytes)
+        return
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(paths)),
+                            thread_name_prefix="aye-read") as pool:
+        yield from pool.map(lambda p: _read_file(p, max_bytes, lazy_bytes), paths)
+
+
+def _read_files(paths: List[str], max_workers: int, max_bytes: int,
+                lazy_bytes: Optional[int] = None) -> List[Tuple[Optional[SourceValue], Optional[str]]]:
+    """Read *paths* with a bounded thread pool, returning results in input order."""
+    return list(_iter_read_files(paths, max_workers, max_bytes, lazy_bytes))
+
+
+def _format_bytes(n: int) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if n < 1024:
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GiB"
+
+
+def print_skipped_summary(skipped: Dict[str, str], max_file_bytes: int = DEFAULT_MAX_FILE_BYTES,
+                          max_total_bytes: int = DEFAULT_MAX_TOTAL_BYTES) -> None:
+    """Print a one-line summary of the files left out of the payload."""
+    if not skipped:
+        return
+    counts: Dict[str, int] = {}
+    for reason in skipped.values():
+        counts[reason] = counts.get(reason, 0) + 1
+    labels = {
+        SKIP_TOO_LARGE: f"larger than {_format_bytes(max_file_bytes)}",
+        SKIP_OVER_BUDGET: f"over the {_format_bytes(max_total_bytes)} total budget",
+    }
+    parts = [f"{n} {labels.get(reason, reason)}" for reason, n in sorted(counts.items())]
+    examples = ", ".join(sorted(skipped)[:3]) + (", …" if len(skipped) > 3 else "")
+    rprint(f"[yellow]   Skipped {len(skipped)} file(s): {'; '.join(parts)} ({examples})[/]")
 
 
 def collect_sources(
     root_dir: str = ".",
     file_mask: str = "*.py",
     recursive: bool = True,
-) -> Dict[str, str]:
-    sources: Dict[str, str] = {}
+    cache: Optional[SourceCache] = None,
+    max_workers: Optional[int] = None,
+    max_file_bytes: Optional[int] = None,
+    max_total_bytes: Optional[int] = None,
+    skipped: Optional[Dict[str, str]] = None,
+    backend: Optional[str] = None,
+    lazy_bytes: Optional[int] = None,
+    on_source: Optional[Callable[[str, SourceValue], None]] = None,
+    on_planned: Optional[Callable[[int], None]] = None,
+) -> Dict[str, SourceValue]:
+    """Collect the text of every file under *root_dir* matching *file_mask*.
+
+    When a *cache* is supplied, files whose ``(size, mtime_ns, inode)`` did not
+    change since they were last read are served from it, so a turn on an
+    unchanged tree costs only a stat walk. The remaining files are read by
+    up to *max_workers* threads (``collect_workers`` config value by default).
+    The result is ordered by relative path regardless of read order.
+
+    Files over *max_file_bytes*, binary files and files past the
+    *max_total_bytes* payload budget (taken in path order) are left out. If a
+    *skipped* dict is given it receives ``{relative_path: reason}``;
+    otherwise a summary line is printed.
+
+    *backend* (``collect_backend`` config value by default) picks how files
+    are enumerated: ``"git"`` reads ``.git/index``, ``"walk"`` scans the
+    filesystem, and ``"auto"`` uses the index inside a repository.
+
+    Files over *lazy_bytes* (``lazy_source_bytes`` config value by default)
+    are validated but not kept in memory: they are returned as
+    ``LazySource`` references that ``api.cli_invoke`` streams from disk.
+
+    *on_source* is called with ``(relative_path, content)`` for each file as
+    soon as it is available, in no particular order, so a caller can start
+    sending the first files while the rest are still being read.
+    *on_planned* receives the total stat size of the files to be sent once
+    enumeration is done, before any file is read.
+    """
+    sources: Dict[str, SourceValue] = {}
     base_path = Path(root_dir).expanduser().resolve()
 
     if not base_path.is_dir():
         raise NotADirectoryError(f"'{root_dir}' is not a valid directory")
 
-    # Load ignore patterns from .ayeignore and .gitignore files
-    ignore_patterns = _load_ignore_patterns(base_path)
+    workers = _config_int(max_workers, "collect_workers", DEFAULT_COLLECT_WORKERS)
+    file_cap = _config_int(max_file_bytes, "max_file_bytes", DEFAULT_MAX_FILE_BYTES)
+    total_cap = _config_int(max_total_bytes, "max_total_bytes", DEFAULT_MAX_TOTAL_BYTES)
+    lazy_cap = _config_int(lazy_bytes, "lazy_source_bytes", DEFAULT_LAZY_SOURCE_BYTES, minimum=0)
+    if backend is None:
+        backend = get_value("collect_backend", DEFAULT_COLLECT_BACKEND)
+    report = skipped is None
+    if skipped is None:
+        skipped = {}
+
+    # Compiled .gitignore/.ayeignore rules, scoped per directory
+    ignore_matcher = IgnoreMatcher(base_path)
 
     masks: List[str] = [m.strip() for m in file_mask.split(",") if m.strip()]  # e.g. ["*.py", "*.jsx"]
+    seen: List[str] = []
+    # Skip reasons found so far, and decoded content of files read or cached
+    rejected: Dict[str, str] = {}
+    loaded: Dict[str, SourceValue] = {}
+    emitted: Set[str] = set()
 
-    def _iter_for(mask: str) -> Iterable[Path]:
-        return base_path.rglob(mask) if recursive else base_path.glob(mask)
+    candidates = None
+    if backend in ("auto", "git"):
+        candidates = _enumerate_git(base_path, masks, ignore_matcher, recursive)
+    if candidates is None:
+        # Not a repository (or backend "walk"): scan the filesystem
+        candidates = _enumerate_walk(base_path, masks, ignore_matcher, recursive)
 
-    # Chain all iterators; convert to a set to deduplicate paths
-    all_matches: Set[Path] = set(chain.from_iterable(_iter_for(m) for m in masks))
+    # Budgets are applied in path order so the selection is deterministic
+    candidates.sort(key=lambda c: c[0])
+    for rel_key, abs_key, st, blob in candidates:
+        seen.append(abs_key)
+        if st.st_size > file_cap:
+            rejected[rel_key] = SKIP_TOO_LARGE
 
-    for py_file in all_matches:
-        # Skip hidden subfolders (any part of the path starting with '.')
-        if _is_hidden(py_file.relative_to(base_path)):
-            continue
-        
-        # Skip files that match ignore patterns
-        if _matches_ignore_pattern(py_file, ignore_patterns, base_path):
-            continue
-            
-        if not py_file.is_file():
-            continue
-        try:
-            content = py_file.read_text(encoding="utf-8")
-            rel_key = py_file.relative_to(base_path).as_posix()
-            sources[rel_key] = content
-        except UnicodeDecodeError:
-            # Skip non-UTF8 files
-            print(f"   Skipping non-UTF8 file: {py_file}")
+    # Files found unusable only when read give their share of the budget
+    # back, so admission is recomputed until no new file is rejected
+    planned = False
+    while True:
+        admitted, over = _admit(candidates, rejected, total_cap)
+        # Files before the first one left over budget can never be displaced
+        # by a refund, so those are reported to on_source right away
+        first_over = over[0][0] if over else None
+        rejections = len(rejected)
+        pending: List[_Candidate] = []
+        for candidate in admitted:
+            rel_key, abs_key, st, blob = candidate
+            if rel_key in loaded:
+                continue
+            if cache is not None:
+                content = None
+                if st.st_size > lazy_cap:
+                    digest = cache.get_lazy(abs_key, st)
+                    if digest is not None:
+                        content = LazySource(abs_key, st.st_size, digest)
+                if content is None:
+                    cached = cache.get(abs_key, st)
+                    if cached is None and blob is not None:
+                        cached = cache.get_by_blob(abs_key, st, blob)
+                    if cached is not None:
+                        content = cached[0]
+                if content is not None:
+                    loaded[rel_key] = content
+                    continue
+                reason = cache.skipped_reason(abs_key, st)
+                if reason is not None:
+                    rejected[rel_key] = reason
+                    continue
+            pending.append(candidate)
+
+        if len(rejected) > rejections:
+            continue  # Known-bad files freed budget: admit again before reading
+        if on_planned is not None and not planned:
+            on_planned(sum(st.st_size for _, _, st, _ in admitted))
+            planned = True
+        if on_source is not None:
+            for rel_key, _, _, _ in admitted:
+                if rel_key in loaded and rel_key not in emitted and (first_over is None or rel_key < first_over):
+                    emitted.add(rel_key)
+                    on_source(rel_key, loaded[rel_key])
+
+        results = _iter_read_files([abs_key for _, abs_key, _, _ in pending], workers, file_cap, lazy_cap)
+        for (rel_key, abs_key, st, blob), (content, reason) in zip(pending, results):
+            if content is None:
+                rejected[rel_key] = reason
+                if cache is not None and reason in (SKIP_BINARY, SKIP_NON_UTF8):
+                    cache.put_skipped(abs_key, st, reason)
+                continue
+            loaded[rel_key] = content
+            if on_source is not None and (first_over is None or rel_key < first_over):
+                emitted.add(rel_key)
+                on_source(rel_key, content)
+            if cache is not None:
+                if isinstance(content, LazySource):
+                    cache.put_lazy(abs_key, st, content.sha256)
+                else:
+                    cache.put(abs_key, st, content, blob=blob)
+        if len(rejected) == rejections:
+            break
+
+    for rel_key, _, _, _ in admitted:
+        sources[rel_key] = loaded[rel_key]
+        if on_source is not None and rel_key not in emitted:
+            on_source(rel_key, loaded[rel_key])
+    skipped.update(rejected)
+    for rel_key, _, _, _ in over:
+        skipped[rel_key] = SKIP_OVER_BUDGET
+
+    if cache is not None and recursive:
+        cache.prune(str(base_path), seen)
+
+    if report:
+        print_skipped_summary(skipped, file_cap, total_cap)
 
-    return sources
+    return dict(sorted(sources.items()))
 
 
 # ----------------------------------------------------------------------
@@ -132,6 +580,7 @@ def driver():
 
     # Print the first 120 characters of each file (for demo)
     for name, txt in py_dict.items():
+        txt = source_text(txt)
         print(f"\n--- {name} ---")
         print(txt[:120] + ("…" if len(txt) > 120 else ""))
 
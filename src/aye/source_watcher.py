@@ -0,0 +1,402 @@
+# source_watcher.py
+"""Keep a REPL session's collected sources warm between prompts.
+
+``SourceWatcher`` performs one full collection when the session starts and
+then follows filesystem changes, so submitting a prompt needs no scan at all.
+On Linux it listens to inotify (through ``ctypes``, no extra dependency); on
+other platforms, or when inotify is unavailable or out of watches, it falls
+back to re-running the cached stat walk in the background.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import stat
+import struct
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from .config import get_value
+from .ignore import IGNORE_FILES, IgnoreMatcher
+from .lazy_source import DEFAULT_LAZY_SOURCE_BYTES, LazySource, SourceValue, source_text
+from .source_cache import SourceCache
+from .source_collector import (
+    DEFAULT_COLLECT_BACKEND,
+    DEFAULT_COLLECT_WORKERS,
+    DEFAULT_MAX_FILE_BYTES,
+    DEFAULT_MAX_TOTAL_BYTES,
+    SKIP_BINARY,
+    SKIP_NON_UTF8,
+    SKIP_OVER_BUDGET,
+    SKIP_TOO_LARGE,
+    _admit,
+    _compile_masks,
+    _config_int,
+    _enumerate_git,
+    _read_file,
+    _read_files,
+    _walk,
+    collect_sources,
+    print_skipped_summary,
+)
+
+DEFAULT_POLL_INTERVAL = 2.0
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+               | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Inotify:
+    """Minimal non-blocking inotify handle built on libc via ctypes."""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path: str) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        return wd
+
+    def rm_watch(self, wd: int) -> None:
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self) -> List[Tuple[int, int, str]]:
+        """Return every queued ``(wd, mask, name)`` event without blocking."""
+        events: List[Tuple[int, int, str]] = []
+        while True:
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(buf):
+                wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(buf, offset)
+                offset += _EVENT_HEADER.size
+                name = os.fsdecode(buf[offset:offset + length].rstrip(b"\0"))
+                offset += length
+                events.append((wd, mask, name))
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class SourceWatcher:
+    """Always-current map of the sources ``collect_sources`` would return."""
+
+    def __init__(self, root: Path, file_mask: str, cache: Optional[SourceCache] = None,
+                 poll_interval: Optional[float] = None):
+        self.root = Path(root).expanduser().resolve()
+        self.file_mask = file_mask
+        self.cache = cache if cache is not None else SourceCache()
+        self.poll_interval = float(poll_interval if poll_interval is not None
+                                   else get_value("watch_poll_interval", DEFAULT_POLL_INTERVAL))
+        self.mode = "poll"
+        self._masks = [m.strip() for m in file_mask.split(",") if m.strip()]
+        self._name_re, self._path_re = _compile_masks(self._masks)
+        self._file_cap = _config_int(None, "max_file_bytes", DEFAULT_MAX_FILE_BYTES)
+        self._total_cap = _config_int(None, "max_total_bytes", DEFAULT_MAX_TOTAL_BYTES)
+        self._lazy_cap = _config_int(None, "lazy_source_bytes", DEFAULT_LAZY_SOURCE_BYTES, minimum=0)
+        self._backend = get_value("collect_backend", DEFAULT_COLLECT_BACKEND)
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._inotify: Optional[_Inotify] = None
+        self._wd_dirs: Dict[int, str] = {}
+        self._matcher = IgnoreMatcher(self.root)
+        # relative path -> (content or lazy reference, stat when loaded)
+        self._sources: Dict[str, Tuple[SourceValue, os.stat_result]] = {}
+        self._skipped: Dict[str, str] = {}
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    def start(self) -> "SourceWatcher":
+        """Do the initial collection and start following changes."""
+        if sys.platform.startswith("linux"):
+            try:
+                self._inotify = _Inotify()
+                self.mode = "inotify"
+            except (OSError, AttributeError):
+                self._inotify = None
+        with self._lock:
+            self._rescan()
+        target = self._inotify_loop if self.mode == "inotify" else self._poll_loop
+        self._thread = threading.Thread(target=target, name="aye-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop following changes and release the inotify descriptor."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def get_sources(self, skipped: Optional[Dict[str, str]] = None) -> Dict[str, SourceValue]:
+        """Return what ``collect_sources`` would: the current sources, ordered by path.
+
+        Skipped files are reported the same way too: into *skipped* if given,
+        otherwise as a printed summary line.
+        """
+        if self.mode != "inotify":
+            # Polling keeps the cache warm; a stat walk makes the answer exact
+            return collect_sources(str(self.root), self.file_mask, cache=self.cache, skipped=skipped)
+        report = skipped is None
+        if skipped is None:
+            skipped = {}
+        with self._lock:
+            self._drain()
+            base = str(self.root)
+            candidates = [(rel_path, os.path.join(base, rel_path), st, None)
+                          for rel_path, (_, st) in sorted(self._sources.items())]
+            admitted, over = _admit(candidates, {}, self._total_cap)
+            sources = {rel_path: self._sources[rel_path][0] for rel_path, _, _, _ in admitted}
+            skipped.update(self._skipped)
+        for rel_path, _, _, _ in over:
+            skipped[rel_path] = SKIP_OVER_BUDGET
+        if report:
+            print_skipped_summary(skipped, self._file_cap, self._total_cap)
+        return sources
+
+    def read_current(self, path: Path) -> Optional[str]:
+        """Return the watched content of *path*, or None if it is not tracked."""
+        if self.mode != "inotify":
+            return None
+        try:
+            rel_path = Path(path).resolve().relative_to(self.root).as_posix()
+        except ValueError:
+            return None
+        with self._lock:
+            self._drain()
+            entry = self._sources.get(rel_path)
+            return source_text(entry[0]) if entry is not None else None
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    def _add_watch(self, rel_dir: str, abs_dir: str) -> None:
+        if self._inotify is None:
+            return
+        try:
+            self._wd_dirs[self._inotify.add_watch(abs_dir)] = rel_dir
+        except OSError:
+            # Typically ENOSPC (max_user_watches): degrade to polling
+            self._fall_back_to_polling()
+
+    def _fall_back_to_polling(self) -> None:
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+        self._wd_dirs.clear()
+        self.mode = "poll"
+
+    def _rescan(self, start: str = "") -> None:
+        """(Re)load everything under *start*, adding watches for each directory.
+
+        A full rescan enumerates files with the ``collect_backend`` backend,
+        like ``collect_sources``, so clean tracked files can be recognised
+        by their blob id.
+        """
+        candidates = None
+        if not start:
+            self._matcher = IgnoreMatcher(self.root)
+            self._sources.clear()
+            self._skipped.clear()
+            if self._backend in ("auto", "git"):
+                candidates = _enumerate_git(self.root, self._masks, self._matcher, True)
+        if candidates is not None:
+            # Watch every directory; no file matches an empty mask list
+            for _ in _walk(self.root, [], self._matcher, on_dir=self._add_watch):
+                pass
+        else:
+            candidates = []
+            for rel_path, entry in _walk(self.root, self._masks, self._matcher, start=start,
+                                         on_dir=self._add_watch):
+                try:
+                    candidates.append((rel_path, entry.path, entry.stat(), None))
+                except OSError:
+                    continue
+        pending = [c for c in candidates if not self._load_cached(*c)]
+        workers = _config_int(None, "collect_workers", DEFAULT_COLLECT_WORKERS)
+        results = _read_files([p for _, p, _, _ in pending], workers, self._file_cap, self._lazy_cap)
+        for (rel_path, abs_path, st, blob), result in zip(pending, results):
+            self._store(rel_path, abs_path, st, result, blob)
+        if not start:
+            self.cache.prune(str(self.root), (os.path.join(str(self.root), p) for p in self._sources))
+
+    def _load_cached(self, rel_path: str, abs_path: str, st: os.stat_result,
+                     blob: Optional[str] = None) -> bool:
+        """Fill *rel_path* from size checks or the cache; False if it must be read."""
+        self._sources.pop(rel_path, None)
+        self._skipped.pop(rel_path, None)
+        if st.st_size > self._file_cap:
+            self._skipped[rel_path] = SKIP_TOO_LARGE
+            return True
+        if st.st_size > self._lazy_cap:
+            digest = self.cache.get_lazy(abs_path, st)
+            if digest is not None:
+                self._sources[rel_path] = (LazySource(abs_path, st.st_size, digest), st)
+                return True
+        cached = self.cache.get(abs_path, st)
+        if cached is None and blob is not None:
+            cached = self.cache.get_by_blob(abs_path, st, blob)
+        if cached is not None:
+            self._sources[rel_path] = (cached[0], st)
+            return True
+        reason = self.cache.skipped_reason(abs_path, st)
+        if reason is not None:
+            self._skipped[rel_path] = reason
+            return True
+        return False
+
+    def _store(self, rel_path: str, abs_path: str, st: os.stat_result,
+               result: Tuple[Optional[SourceValue], Optional[str]], blob: Optional[str] = None) -> None:
+        content, reason = result
+        if content is None:
+            self._skipped[rel_path] = reason
+            if reason in (SKIP_BINARY, SKIP_NON_UTF8):
+                self.cache.put_skipped(abs_path, st, reason)
+            return
+        self._sources[rel_path] = (content, st)
+        if isinstance(content, LazySource):
+            self.cache.put_lazy(abs_path, st, content.sha256)
+        else:
+            self.cache.put(abs_path, st, content, blob=blob)
+
+    def _is_candidate(self, rel_path: str) -> bool:
+        name = rel_path.rpartition("/")[2]
+        if not ((self._name_re is not None and self._name_re.match(name)) or
+                (self._path_re is not None and self._path_re.match(rel_path))):
+            return False
+        if any(part.startswith(".") for part in rel_path.split("/")):
+            return False
+        return not self._matcher.is_ignored(rel_path)
+
+    def _refresh_file(self, rel_path: str) -> None:
+        abs_path = os.path.join(str(self.root), rel_path)
+        try:
+            st = os.stat(abs_path)
+        except OSError:
+            st = None
+        if st is None or not stat.S_ISREG(st.st_mode) or not self._is_candidate(rel_path):
+            self._sources.pop(rel_path, None)
+            self._skipped.pop(rel_path, None)
+            return
+        if not self._load_cached(rel_path, abs_path, st):
+            self._store(rel_path, abs_path, st, _read_file(abs_path, self._file_cap, self._lazy_cap))
+
+    def _forget_dir(self, rel_dir: str) -> None:
+        prefix = rel_dir + "/"
+        for rel_path in [p for p in self._sources if p.startswith(prefix)]:
+            del self._sources[rel_path]
+        for rel_path in [p for p in self._skipped if p.startswith(prefix)]:
+            del self._skipped[rel_path]
+        for wd, watched in list(self._wd_dirs.items()):
+            if watched == rel_dir or watched.startswith(prefix):
+                del self._wd_dirs[wd]
+                if self._inotify is not None:
+                    self._inotify.rm_watch(wd)
+
+    def _drain(self) -> None:
+        """Apply every queued inotify event to the source map (lock held)."""
+        if self._inotify is None:
+            return
+        events = self._inotify.read_events()
+        if not events:
+            return
+        rescan = False
+        dirty: Set[str] = set()
+        new_dirs: List[str] = []
+        for wd, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                rescan = True
+                continue
+            rel_dir = self._wd_dirs.get(wd)
+            if rel_dir is None:
+                continue
+            if mask & IN_IGNORED:
+                self._wd_dirs.pop(wd, None)
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                if not rel_dir:
+                    rescan = True  # The root itself went away or moved
+                else:
+                    self._forget_dir(rel_dir)
+                continue
+            if not name:
+                continue
+            rel_path = f"{rel_dir}/{name}" if rel_dir else name
+            if name in IGNORE_FILES:
+                rescan = True  # Ignore rules changed: recompute everything
+                continue
+            if name.startswith("."):
+                continue
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    new_dirs.append(rel_path)
+                else:
+                    self._forget_dir(rel_path)
+                continue
+            dirty.add(rel_path)
+
+        if rescan:
+            self._rescan()
+            return
+        for rel_dir in new_dirs:
+            if not self._matcher.is_ignored(rel_dir, True):
+                self._rescan(start=rel_dir)
+        for rel_path in dirty:
+            self._refresh_file(rel_path)
+
+    def _inotify_loop(self) -> None:
+        while not self._stop.is_set():
+            inotify = self._inotify
+            if inotify is None:
+                # Degraded while running (e.g. out of watches)
+                self._poll_loop()
+                return
+            try:
+                readable, _, _ = select.select([inotify.fd], [], [], 0.5)
+            except (OSError, ValueError):
+                return  # Descriptor closed by stop()
+            if readable:
+                with self._lock:
+                    self._drain()
+
+    def _poll_loop(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                collect_sources(str(self.root), self.file_mask, cache=self.cache, skipped={})
+            except OSError:
+                continue
@@ -0,0 +1,154 @@
+# turn.py
+"""Event loop and stage timings for the asyncio REPL turn pipeline.
+
+A ``TurnEngine`` owns one event loop for a whole REPL session, so the
+pooled ``httpx.AsyncClient`` keeps its connections from turn to turn.
+``run`` drives one turn coroutine to completion; Ctrl-C while it runs
+cancels the turn (closing its request) and raises ``TurnCancelled``
+instead of ending the session.
+"""
+import asyncio
+import atexit
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from .api import aclose_clients
+from .lazy_source import SourceFeed, SourceValue
+
+T = TypeVar("T")
+
+# Stages reported by TurnTimings, in pipeline order
+STAGES = ("collect", "upload", "wait", "response", "total")
+
+
+class TurnCancelled(Exception):
+    """The user interrupted a turn with Ctrl-C; the session continues."""
+
+
+class TurnTimings:
+    """Wall-clock marks of one turn, turned into per-stage durations.
+
+    Marks are recorded with ``mark(name)`` as the turn progresses:
+    ``collected`` (all sources read), ``sent`` (request body out),
+    ``headers`` (response headers in) and ``done``. Stages overlap, so the
+    durations need not add up to ``total``.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.marks: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def mark(self, name: str) -> None:
+        # Marks may come from the collector thread; the first one wins
+        with self._lock:
+            self.marks.setdefault(name, time.perf_counter())
+
+    def _span(self, begin: Optional[float], end: str) -> Optional[float]:
+        if begin is None or end not in self.marks:
+            return None
+        return self.marks[end] - begin
+
+    def stages(self) -> Dict[str, float]:
+        """Return ``{stage: seconds}`` for every stage that completed."""
+        spans = {
+            "collect": self._span(self.start, "collected"),
+            "upload": self._span(self.marks.get("upload"), "sent"),
+            "wait": self._span(self.marks.get("sent"), "headers"),
+            "response": self._span(self.marks.get("headers"), "done"),
+            "total": self._span(self.start, "done"),
+        }
+        return {stage: spans[stage] for stage in STAGES if spans[stage] is not None}
+
+
+def start_feed(collect: Callable[[Callable[[str, SourceValue], None], Callable[[int], None]], Any],
+               timings: Optional[TurnTimings] = None) -> SourceFeed:
+    """Run ``collect(on_source, on_planned)`` in an executor thread, feeding a ``SourceFeed``.
+
+    The returned feed can be handed to ``api.acli_invoke`` right away: the
+    request body carries each file as soon as the collector has read it.
+    """
+    feed = SourceFeed()
+
+    def run() -> None:
+        try:
+            collect(feed.put, feed.plan)
+        except BaseException as exc:
+            feed.close(exc)
+        else:
+            feed.close()
+        finally:
+            if timings is not None:
+                timings.mark("collected")
+
+    asyncio.get_running_loop().run_in_executor(None, run)
+    return feed
+
+
+class TurnEngine:
+    """Runs REPL turns on one long-lived event loop."""
+
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+
+    def run(self, turn: Awaitable[T]) -> T:
+        """Run *turn* to completion; Ctrl-C cancels it and raises ``TurnCancelled``."""
+        task = self._loop.create_task(turn)
+        try:
+            return self._loop.run_until_complete(task)
+        except KeyboardInterrupt:
+            if task.done():
+                # Raised inside the task itself; asyncio leaves the loop running
+                # for such results, so waiting on the task again would never return
+                if not task.cancelled():
+                    task.exception()
+                raise TurnCancelled() from None
+            task.cancel()
+            try:
+                # Let the turn unwind: close the request and stop its collector
+                self._loop.run_until_complete(task)
+            except BaseException:
+                pass
+            raise TurnCancelled() from None
+
+    def close(self) -> None:
+        """Close this loop's async HTTP client and the loop itself."""
+        if self._loop.is_closed():
+            return
+        try:
+            self._loop.run_until_complete(aclose_clients())
+            self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+        finally:
+            self._loop.close()
+
+
+
+
+_engine_lock = threading.Lock()
+_engine: Optional[TurnEngine] = None
+
+
+def get_engine() -> TurnEngine:
+    """Return the process-wide engine, creating it on first use.
+
+    Sharing one loop lets every turn reuse the pooled async client's
+    connections. The engine is closed by ``close_engine`` or at exit.
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = TurnEngine()
+        return _engine
+
+
+def close_engine() -> None:
+    """Close the process-wide engine, if one was created (called at REPL exit)."""
+    global _engine
+    with _engine_lock:
+        engine, _engine = _engine, None
+    if engine is not None:
+        engine.close()
+
+
+atexit.register(close_engine)
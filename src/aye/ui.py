@@ -1,7 +1,10 @@
+from typing import Optional
+
 from rich import print as rprint
 from rich.padding import Padding
 from rich.console import Console
 from rich.spinner import Spinner
+from rich.text import Text
 from rich import print as rprint
 
 
@@ -44,6 +47,23 @@ def print_assistant_response(summary: str):
     rprint()
 
 
+def format_streaming_response(summary: str, partial: Optional[Text] = None) -> Text:
+    """Return the partial summary shown while the answer is still streaming.
+
+    Pass the text returned for the previous chunk as *partial* to append
+    *summary* to it in place instead of starting over.
+    """
+    text = partial if partial is not None else Text("-{•!•}- » ", style="rgb(170,170,170)")
+    text.append(summary, style="rgb(170,170,170)")
+    return text
+
+
+def print_turn_timings(console: Console, stages: dict):
+    """Display how long each stage of the last turn took."""
+    parts = [f"{stage} {seconds * 1000:.0f} ms" for stage, seconds in stages.items()]
+    console.print(Padding(f"[dim]{' · '.join(parts)}[/]", (0, 4, 0, 4)))
+
+
 def print_no_files_changed(console: Console):
     """Display message when no files were changed."""
     console.print(Padding("[yellow]No files were changed.[/]", (0, 4, 0, 4)))
@@ -0,0 +1,302 @@
+import json
+
+import httpx
+
+from aye.api import iter_json_body
+from aye.lazy_source import LazySource
+
+
+def test_streamed_body_matches_json(tmp_path):
+    big = tmp_path / "big.py"
+    big.write_bytes("π = '\"quoted\"'\r\n".encode("utf-8") * 20000)
+    payload = {
+        "chat_id": -1,
+        "message": "héllo\n",
+        "source_files": {
+            "a.py": "x" * 50000 + "\t\\",
+            "big.py": LazySource(str(big), big.stat().st_size, "unused"),
+        },
+    }
+
+    chunks = list(iter_json_body(payload, chunk_bytes=4096))
+
+    assert len(chunks) > 10
+    assert max(len(c) for c in chunks) < 4096 + 64 * 1024
+    decoded = json.loads(b"".join(chunks))
+    assert decoded["message"] == "héllo\n"
+    assert decoded["source_files"]["a.py"] == "x" * 50000 + "\t\\"
+    assert decoded["source_files"]["big.py"] == "π = '\"quoted\"'\n" * 20000
+
+
+class DeltaServer:
+    """Stand-in backend that keeps uploaded content per chat, keyed by hash."""
+
+    def __init__(self):
+        self.store = {}
+        self.uploads = []
+
+    def handle(self, request):
+        from aye.source_cache import content_hash
+
+        body = json.loads(request.read())
+        chat_id = body["chat_id"] if body["chat_id"] > 0 else 42
+        held = self.store.setdefault(chat_id, {})
+        self.uploads.append(sorted(body["source_files"]))
+        for content in body["source_files"].values():
+            held[content_hash(content)] = content
+        missing = sorted(set(body["source_manifest"].values()) - set(held))
+        if missing:
+            return httpx.Response(200, json={"missing_hashes": missing, "delta": True})
+        return httpx.Response(200, json={"chat_id": chat_id, "delta": True, "assistant_response": "{}"})
+
+
+def test_delta_upload_sends_only_unseen_content(tmp_path, monkeypatch):
+    from aye import api
+    from aye.delta import DeltaState
+
+    server = DeltaServer()
+    monkeypatch.setattr(api, "_auth_headers", lambda: {})
+    monkeypatch.setattr(api, "_sync_client", httpx.Client(transport=httpx.MockTransport(server.handle)))
+    state = DeltaState(tmp_path / "delta_state.json")
+    files = {"a.py": "a = 1\n", "b.py": "b = 2\n"}
+
+    resp = api.cli_invoke(message="hi", source_files=files, delta=state)
+    assert resp["chat_id"] == 42
+    assert server.uploads == [["a.py", "b.py"]]
+
+    api.cli_invoke(chat_id=42, message="again", source_files=dict(files, **{"b.py": "b = 3\n"}), delta=state)
+    assert server.uploads[-1] == ["b.py"]
+
+    # The server lost its copy: the files it asks for are sent again
+    server.store.clear()
+    state.save()
+    api.cli_invoke(chat_id=42, message="more", source_files=files, delta=DeltaState(tmp_path / "delta_state.json"))
+    assert server.uploads[-2:] == [[], ["a.py", "b.py"]]
+
+
+def test_delta_manifest_follows_lazy_file_edited_before_send(tmp_path, monkeypatch):
+    from aye import api
+    from aye.delta import DeltaState
+    from aye.source_cache import content_hash
+
+    big = tmp_path / "big.py"
+    big.write_text("old\n" * 1000)
+    lazy = LazySource(str(big), big.stat().st_size, content_hash(big.read_text()))
+    big.write_text("new\n" * 1000)  # Edited after collection
+
+    def handle(request):
+        body = json.loads(request.read())
+        assert content_hash(body["source_files"]["big.py"]) == body["source_manifest"]["big.py"]
+        return httpx.Response(200, json={"chat_id": 42, "delta": True, "assistant_response": "{}"})
+
+    monkeypatch.setattr(api, "_auth_headers", lambda: {})
+    monkeypatch.setattr(api, "_sync_client", httpx.Client(transport=httpx.MockTransport(handle)))
+    state = DeltaState(tmp_path / "delta_state.json")
+
+    api.cli_invoke(message="hi", source_files={"big.py": lazy}, delta=state)
+    assert state.sent_hashes(42) == {content_hash("new\n" * 1000)}
+
+
+def test_pooled_client_and_cached_auth(monkeypatch):
+    from aye import api
+
+    token_reads = []
+    monkeypatch.setattr(api, "get_token", lambda: token_reads.append(1) or "secret")
+    monkeypatch.setattr(api, "_auth_header", None)
+    statuses = iter([200, 403, 200])
+
+    def handle(request):
+        assert request.headers["Authorization"] == "Bearer secret"
+        return httpx.Response(next(statuses), json={"ok": True})
+
+    monkeypatch.setattr(api, "_sync_client", httpx.Client(transport=httpx.MockTransport(handle)))
+    client = api.get_client()
+
+    api.fetch_plugin_manifest()
+    assert api.get_client() is client
+    try:
+        api.fetch_plugin_manifest()
+    except httpx.HTTPStatusError:
+        pass
+    api.fetch_plugin_manifest()
+    # Read once, then again after the server rejected the token
+    assert len(token_reads) == 2
+
+    api.close_clients()
+    assert client.is_closed
+    assert api.get_client() is not client
+    api.close_clients()
+
+
+def test_compression_is_negotiated_and_falls_back_on_415(monkeypatch):
+    import gzip
+
+    from aye import api, config
+
+    seen = []
+    accepted = {"gzip"}
+
+    def handle(request):
+        encoding = request.headers.get("Content-Encoding", "identity")
+        body = request.read()
+        seen.append(encoding)
+        headers = {"Accept-Encoding": ", ".join(sorted(accepted))}
+        if encoding != "identity" and encoding not in accepted:
+            return httpx.Response(415, headers=headers)
+        if encoding == "gzip":
+            body = gzip.decompress(body)
+        assert json.loads(body)["message"] == "hi"
+        return httpx.Response(200, json={"ok": True}, headers=headers)
+
+    monkeypatch.setattr(api, "_auth_headers", lambda: {})
+    monkeypatch.setattr(api, "_sync_client", httpx.Client(transport=httpx.MockTransport(handle)))
+    monkeypatch.setattr(api, "_server_encodings", {})
+    monkeypatch.setattr(api, "_refused_encodings", {})
+    monkeypatch.setattr(api, "_available_encodings", lambda: ("gzip",))
+    monkeypatch.setitem(config._config, "compression_min_bytes", 100)
+    files = {"a.py": "x = 1\n" * 100}
+
+    api.cli_invoke(message="hi", source_files=files)  # Support not yet advertised
+    api.cli_invoke(message="hi", source_files={})  # Below the threshold
+    api.cli_invoke(message="hi", source_files=files)
+    monkeypatch.setitem(config._config, "upload_compression", "gzip")
+    accepted.clear()
+    api.cli_invoke(message="hi", source_files=files)  # Refused: resent uncompressed
+    api.cli_invoke(message="hi", source_files=files)
+    assert seen == ["identity", "identity", "gzip", "gzip", "identity", "identity"]
+
+
+def test_transient_failures_are_retried_with_one_idempotency_key(monkeypatch):
+    from aye import api, config, resilience
+
+    keys = []
+    replies = iter([503, 200])
+
+    def handle(request):
+        keys.append(request.headers["Idempotency-Key"])
+        assert json.loads(request.read())["message"] == "hi"
+        return httpx.Response(next(replies), json={"ok": True})
+
+    monkeypatch.setattr(api, "_auth_headers", lambda: {})
+    monkeypatch.setattr(api, "_sync_client", httpx.Client(transport=httpx.MockTransport(handle)))
+    monkeypatch.setattr(resilience, "_breakers", {})
+    monkeypatch.setitem(config._config, "retry_backoff", 0)
+
+    assert api.cli_invoke(message="hi") == {"ok": True}
+    assert len(keys) == 2 and keys[0] == keys[1]
+
+
+def test_circuit_breaker_fails_fast_while_backend_is_down(monkeypatch):
+    import pytest
+
+    from aye import api, config, resilience
+
+    calls = []
+
+    def handle(request):
+        calls.append(1)
+        raise httpx.ConnectError("connection refused", request=request)
+
+    monkeypatch.setattr(api, "_sync_client", httpx.Client(transport=httpx.MockTransport(handle)))
+    monkeypatch.setattr(resilience, "_breakers", {})
+    monkeypatch.setitem(config._config, "max_retries", 0)
+    monkeypatch.setitem(config._config, "breaker_threshold", 2)
+
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectError):
+            api.fetch_server_time()
+    with pytest.raises(resilience.BackendUnavailableError):
+        api.fetch_server_time()
+    assert len(calls) == 2
+
+    # After the cool-down a single trial request is let through
+    monkeypatch.setitem(config._config, "breaker_cooldown", 0)
+    with pytest.raises(httpx.ConnectError):
+        api.fetch_server_time()
+    assert len(calls) == 3
+
+
+def test_cassette_records_then_replays_without_network(tmp_path, monkeypatch):
+    import pytest
+
+    from aye import api, cassette
+
+    big = "x = 1\n" * 1000
+    (tmp_path / "big.py").write_text(big)
+    calls = []
+
+    def handle(request):
+        calls.append(json.loads(request.read())["message"])
+        return httpx.Response(200, json={"chat_id": 9, "assistant_response": "answer"})
+
+    monkeypatch.setattr(api, "_auth_headers", lambda: {})
+    monkeypatch.setattr(api, "_sync_client", httpx.Client(transport=httpx.MockTransport(handle)))
+    monkeypatch.setattr(cassette, "_cassettes", {})
+    monkeypatch.setenv("AYE_CASSETTE", str(tmp_path / "tape"))
+    monkeypatch.setenv("AYE_CASSETTE_MODE", "record")
+    lazy = LazySource(str(tmp_path / "big.py"), len(big), "stale")
+    api.cli_invoke(chat_id=3, message="hi", source_files={"big.py": lazy})
+    api.cli_invoke(chat_id=9, message="hi", source_files={"big.py": big, "b.py": big})
+
+    # The same content is stored once, compressed
+    objects = [p for p in (tmp_path / "tape" / "objects").rglob("*") if p.is_file()]
+    assert len(objects) == 1 and objects[0].stat().st_size < len(big) // 10
+
+    monkeypatch.setenv("AYE_CASSETTE_MODE", "replay")
+    monkeypatch.setattr(api, "_sync_client", None)
+    resp = api.cli_invoke(chat_id=-1, message="hi", source_files={"big.py": big})
+    assert resp == {"chat_id": 9, "assistant_response": "answer"}
+    with pytest.raises(cassette.CassetteMissError):
+        api.cli_invoke(message="hi", source_files={"big.py": big})  # Already replayed
+    assert calls == ["hi", "hi"]
+
+
+def test_upload_failing_mid_body_replays_a_feed_still_being_collected(monkeypatch):
+    import asyncio
+    import threading
+    import time
+
+    from aye import api, config, resilience
+    from aye.lazy_source import SourceFeed
+
+    failed = threading.Event()
+    bodies = []
+    big = "a = 1\n" * (api.STREAM_CHUNK_BYTES // 6 + 1)  # Fills the first body chunk
+
+    class Transport(httpx.AsyncBaseTransport):
+        # MockTransport reads the whole body first; this one fails after the first chunk
+        async def handle_async_request(self, request):
+            if not failed.is_set():
+                async for _ in request.stream:
+                    failed.set()
+                    raise httpx.RemoteProtocolError("connection reset", request=request)
+            bodies.append(json.loads(b"".join([c async for c in request.stream])))
+            return httpx.Response(200, json={"ok": True})
+
+    def collect(feed):
+        feed.plan(100)
+        feed.put("a.py", big)
+        assert failed.wait(5)
+        time.sleep(0.05)  # The retry is now waiting for the feed too, after the abandoned upload thread
+        feed.close()
+
+    async def post():
+        feed = SourceFeed()
+        threading.Thread(target=collect, args=(feed,), daemon=True).start()
+        payload = {"message": "hi", "source_files": feed}
+        return await api._apost_json(api.BASE_URL + "/invoke_cli", payload)
+
+    monkeypatch.setattr(api, "_auth_headers", lambda: {})
+    monkeypatch.setattr(resilience, "_breakers", {})
+    monkeypatch.setitem(config._config, "retry_backoff", 0)
+    monkeypatch.setattr(api, "_async_client", httpx.AsyncClient(transport=Transport()))
+    monkeypatch.setattr(api, "_async_client_loop", None)
+
+    async def main():
+        for _ in range(5):
+            failed.clear()
+            bodies.clear()
+            assert await post() == {"ok": True}
+            assert bodies[0]["source_files"] == {"a.py": big}
+
+    asyncio.run(main())
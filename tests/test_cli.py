@@ -11,3 +11,33 @@ def test_help_output():
     assert result.returncode == 0
     assert "Usage:" in result.stdout
 
+
+
+def test_turn_against_local_mock_backend(tmp_path, monkeypatch):
+    """A full chat turn plus apply_updates against benchmarks/mock_backend.py."""
+    from pathlib import Path
+
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "benchmarks"))
+    from mock_backend import MockBackend
+
+    from aye import api, snapshot
+    from aye.service import process_chat_message
+
+    for name in ("a.py", "b.py", "c.py"):
+        (tmp_path / name).write_text(f"# {name}\n")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(snapshot, "SNAP_ROOT", tmp_path / ".aye" / "snapshots")
+    monkeypatch.setattr(snapshot, "LATEST_SNAP_DIR", tmp_path / ".aye" / "snapshots" / "latest")
+    monkeypatch.setattr(api, "_auth_header", {"Authorization": "Bearer test"})
+
+    with MockBackend(answer_files=2, plugins=1) as backend:
+        monkeypatch.setattr(api, "BASE_URL", backend.url)
+        result = process_chat_message("edit", None, tmp_path, "*.py")
+        assert result["summary"].startswith("Received 3 file(s).")
+        assert [item["file_name"] for item in result["changed_files"]] == ["a.py", "b.py"]
+        assert snapshot.apply_updates(result["changed_files"])
+        assert api.fetch_server_time() > 0
+        assert list(api.fetch_plugin_manifest()) == ["mock_plugin_0.py"]
+
+    assert (tmp_path / "a.py").read_text().startswith("# a.py\n# edited by mock turn")
+    assert snapshot.list_snapshots(tmp_path / "a.py")
@@ -0,0 +1,15 @@
+import pytest
+
+from aye import codec
+
+
+@pytest.mark.parametrize("backend", [b for b in codec.BACKENDS if b != "orjson" or codec.orjson is not None])
+def test_backends_agree_on_encoding_and_errors(backend, monkeypatch):
+    monkeypatch.setattr(codec, "backend", backend)
+    value = {"message": "café   \x00", "chat_id": -1, "files": [{"a": 1.5, "b": None, "c": True}]}
+
+    assert codec.dumps(value) == '{"message":"café   \\u0000","chat_id":-1,"files":[{"a":1.5,"b":null,"c":true}]}'
+    assert codec.loads(codec.dumpb(value, indent=True)) == value
+    assert codec.dumps({"a": [1]}, indent=True) == '{\n  "a": [\n    1\n  ]\n}'
+    with pytest.raises(codec.DecodeError):
+        codec.loads(b"{not json")
@@ -0,0 +1,65 @@
+from aye.ignore import IgnoreMatcher, IgnoreRules
+
+
+def _rules(*lines):
+    return IgnoreRules(list(lines))
+
+
+def test_basename_and_anchored_patterns():
+    rules = _rules("*.log", "/build", "docs/*.md")
+    assert rules.match("app.log", False) is True
+    assert rules.match("deep/dir/app.log", False) is True
+    assert rules.match("build", True) is True
+    assert rules.match("src/build", True) is None
+    assert rules.match("docs/readme.md", False) is True
+    assert rules.match("sub/docs/readme.md", False) is None
+
+
+def test_negation_last_match_wins():
+    rules = _rules("*.py", "!keep.py", "keep.py")
+    assert rules.match("keep.py", False) is True
+    rules = _rules("*.py", "!keep.py")
+    assert rules.match("keep.py", False) is False
+    assert rules.match("drop.py", False) is True
+
+
+def test_dir_only_and_double_star():
+    rules = _rules("node_modules/", "a/**/z.txt", "logs/**")
+    assert rules.match("node_modules", True) is True
+    assert rules.match("node_modules", False) is None
+    assert rules.match("pkg/node_modules", True) is True
+    assert rules.match("a/z.txt", False) is True
+    assert rules.match("a/b/c/z.txt", False) is True
+    assert rules.match("logs/x/y.txt", False) is True
+    assert rules.match("logs", True) is None
+
+
+def test_matcher_scopes_nested_files_and_stops_at_repo_root(tmp_path):
+    (tmp_path / ".gitignore").write_text("*.secret\n")
+    repo = tmp_path / "repo"
+    (repo / ".git").mkdir(parents=True)
+    (repo / ".gitignore").write_text("*.tmp\nvendor/\n")
+    (repo / "pkg").mkdir()
+    (repo / "pkg" / ".ayeignore").write_text("/generated.py\n!important.tmp\n")
+
+    matcher = IgnoreMatcher(repo)
+    assert matcher.is_ignored("x.tmp")
+    assert matcher.is_ignored("pkg/x.tmp")
+    assert not matcher.is_ignored("pkg/important.tmp")
+    assert matcher.is_ignored("pkg/generated.py")
+    assert not matcher.is_ignored("generated.py")
+    assert not matcher.is_ignored("pkg/sub/generated.py")
+    assert matcher.is_ignored("vendor/lib/a.py")
+    # Rules from above the repository root no longer leak in
+    assert not matcher.is_ignored("x.secret")
+
+
+def test_matcher_applies_ancestor_rules_inside_repo(tmp_path):
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".gitignore").write_text("src/gen/\n*.bak\n")
+    (tmp_path / "src" / "gen").mkdir(parents=True)
+
+    matcher = IgnoreMatcher(tmp_path / "src")
+    assert matcher.is_ignored("gen/a.py")
+    assert matcher.is_ignored("a.bak")
+    assert not matcher.is_ignored("a.py")
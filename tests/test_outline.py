@@ -0,0 +1,58 @@
+from aye.outline import OUTLINE_HEADER, outline_python, outline_sources
+from aye.relevance import RelevanceIndex, focus_files
+
+
+MODULE = '''"""Snapshot helpers.
+
+Long description that outlines leave out.
+"""
+import os
+from pathlib import Path
+
+SNAP_ROOT = Path(".aye/snapshots")
+_counter = 0
+
+
+class Store:
+    """Keeps snapshots."""
+    limit: int = 10
+
+    def save(self, path: str, *, force: bool = False) -> Path:
+        """Save *path*."""
+        data = open(path).read()
+        return Path(data)
+
+
+async def fetch(url):
+    return await get(url)
+'''
+
+
+def test_outline_keeps_signatures_and_drops_bodies():
+    outline = outline_python(MODULE)
+    assert outline.startswith(OUTLINE_HEADER)
+    assert '"""Snapshot helpers."""' in outline
+    assert "Long description" not in outline
+    assert "from pathlib import Path" in outline
+    assert "SNAP_ROOT = Path('.aye/snapshots')" in outline
+    assert "_counter" not in outline
+    assert "limit: int = 10" in outline
+    assert "def save(self, path: str, *, force: bool=False) -> Path:" in outline
+    assert "async def fetch(url):" in outline
+    assert "open(path)" not in outline
+    assert outline_python("def broken(:\n") is None
+
+
+def test_focus_files_stay_in_full(tmp_path):
+    sources = {
+        "store.py": MODULE,
+        "api.py": "def upload(payload):\n    '''Send it.'''\n" + "    post(payload, retries=3, timeout=30)\n" * 5,
+        "notes.md": "# Notes\n",
+    }
+    focus = focus_files("please change store.py", sources, top_k=0,
+                        index=RelevanceIndex(tmp_path / "index.json"))
+    assert focus == {"store.py"}
+    outlined = outline_sources(sources, focus)
+    assert outlined["store.py"] == MODULE
+    assert outlined["api.py"].startswith(OUTLINE_HEADER)
+    assert outlined["notes.md"] == "# Notes\n"
@@ -0,0 +1,47 @@
+from aye.relevance import RelevanceIndex, select_sources, tokenize
+
+
+SOURCES = {
+    "src/auth.py": "def get_token():\n    return read_token_file()\n",
+    "src/api.py": "def cli_invoke(payload):\n    headers = auth_headers()\n    return post(payload, headers)\n",
+    "src/snapshot.py": "def create_snapshot(files):\n    copy_files(files)\n",
+    "README.md": "Aye is a terminal assistant.\n",
+}
+
+
+def test_tokenize_splits_identifiers():
+    assert tokenize("createSnapshot(file_paths)") == ["createsnapshot", "create", "snapshot", "file_paths", "file", "paths"]
+
+
+def test_select_by_relevance_within_budget(tmp_path):
+    index = RelevanceIndex(tmp_path / "index.json")
+    selected = select_sources("how is the snapshot created?", SOURCES, top_k=1, index=index)
+    assert list(selected) == ["src/snapshot.py"]
+
+
+def test_named_files_always_included(tmp_path):
+    index = RelevanceIndex(tmp_path / "index.json")
+    selected = select_sources("fix the token lookup in README.md", SOURCES,
+                              budget_bytes=100, index=index)
+    assert "README.md" in selected
+    assert "src/auth.py" in selected
+    assert "src/api.py" not in selected
+
+
+def test_index_is_incremental_and_persisted(tmp_path):
+    index_file = tmp_path / "index.json"
+    index = RelevanceIndex(index_file)
+    index.update(SOURCES)
+    index.save()
+
+    reloaded = RelevanceIndex(index_file)
+    changed = dict(SOURCES, **{"src/api.py": "def upload_snapshot():\n    pass\n"})
+    del changed["README.md"]
+    reloaded.update(changed)
+    scores = reloaded.score("snapshot upload")
+    assert max(scores, key=scores.get) == "src/api.py"
+    assert "README.md" not in reloaded.score("terminal assistant")
+
+
+def test_no_budget_returns_everything():
+    assert select_sources("anything", SOURCES, index=None) is SOURCES
@@ -0,0 +1,67 @@
+import json
+import os
+
+import httpx
+
+from aye.response_cache import ResponseCache, merkle_root, response_key
+
+
+def test_merkle_root_tracks_paths_and_content():
+    tree = {"src/a.py": "a = 1\n", "src/pkg/b.py": "b = 2\n", "README": "hi\n"}
+    assert merkle_root(tree) == merkle_root(dict(reversed(list(tree.items()))))
+    assert merkle_root(tree) != merkle_root({**tree, "src/pkg/b.py": "b = 3\n"})
+    assert merkle_root(tree) != merkle_root({"src/a.py": "a = 1\n", "src/b.py": "b = 2\n", "README": "hi\n"})
+    assert response_key("p", -1, tree) != response_key("p", 5, tree)
+
+
+def test_entries_expire_and_least_recently_used_are_evicted(tmp_path, monkeypatch):
+    cache = ResponseCache(tmp_path, ttl=60, max_bytes=250)
+    cache.put("a", {"x": "a" * 50})
+    cache.put("b", {"x": "b" * 50})
+    os.utime(tmp_path / "a.json", (1, 1))
+    os.utime(tmp_path / "b.json", (2, 2))
+    assert cache.get("a") == {"x": "a" * 50}  # Now the most recently used
+    cache.put("c", {"x": "c" * 50})
+    assert cache.get("b") is None and cache.get("a") is not None
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["evictions"] == 1 and stats["hits"] == 2
+
+    import aye.response_cache as response_cache
+    now = response_cache.time.time()
+    monkeypatch.setattr(response_cache.time, "time", lambda: now + 61)
+    assert cache.get("a") is None
+    assert cache.clear() == 1
+
+
+def test_repeated_chat_turn_is_answered_from_cache(tmp_path, monkeypatch):
+    from aye import api, config, response_cache
+    from aye.service import process_chat_message
+    from aye.turn import TurnEngine
+
+    (tmp_path / "a.py").write_text("a = 1\n")
+    calls = []
+
+    def handle(request):
+        calls.append(1)
+        answer = {"answer_summary": "done", "source_files": []}
+        return httpx.Response(200, json={"chat_id": 5, "assistant_response": json.dumps(answer)})
+
+    monkeypatch.setattr(api, "_auth_headers", lambda: {})
+    monkeypatch.setattr(response_cache, "CACHE_DIR", tmp_path / ".aye" / "response_cache")
+    monkeypatch.setitem(config._config, "response_cache", True)
+    engine = TurnEngine()
+    monkeypatch.setattr(api, "_async_client", httpx.AsyncClient(transport=httpx.MockTransport(handle)))
+    monkeypatch.setattr(api, "_async_client_loop", None)
+    try:
+        first = process_chat_message("hi", None, tmp_path, "*.py", engine=engine)
+        summaries = []
+        second = process_chat_message("hi", None, tmp_path, "*.py", engine=engine,
+                                      on_summary=summaries.append)
+        (tmp_path / "a.py").write_text("a = 2\n")
+        third = process_chat_message("hi", None, tmp_path, "*.py", engine=engine)
+    finally:
+        engine.close()
+
+    assert not first["cached"] and second["cached"] and not third["cached"]
+    assert second["summary"] == summaries[0] == "done"
+    assert len(calls) == 2
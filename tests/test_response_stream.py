@@ -0,0 +1,53 @@
+import json
+
+import httpx
+
+from aye.response_stream import IncrementalJSONParser, read_streamed_response
+
+
+ANSWER = {
+    "answer_summary": "Renamed \"x\" → y 😀\n",
+    "source_files": [
+        {"file_name": "a.py", "file_content": "y = 1\n\t\\"},
+        {"file_name": "b.py", "file_content": ""},
+    ],
+    "meta": [1, -2.5e3, True, None, {}],
+}
+
+
+def test_parser_handles_any_fragmentation():
+    text = json.dumps(ANSWER)  # ASCII escapes, including a surrogate pair
+    for size in (1, 2, 3, 7, len(text)):
+        chunks, values = [], []
+        parser = IncrementalJSONParser(lambda path, t: chunks.append((path, t)),
+                                       lambda path, v: values.append(path))
+        for start in range(0, len(text), size):
+            parser.feed(text[start:start + size])
+        assert parser.close() == ANSWER
+        assert "".join(t for p, t in chunks if p == ("answer_summary",)) == ANSWER["answer_summary"]
+        assert values.index(("source_files", 0)) < values.index(("source_files", 1)) < values.index(())
+
+
+def _stream_response(content_type, lines):
+    def handle(request):
+        return httpx.Response(200, headers={"Content-Type": content_type},
+                              content=iter(line.encode() for line in lines))
+    client = httpx.Client(transport=httpx.MockTransport(handle))
+    return client.stream("POST", "http://test/invoke_cli")
+
+
+def test_ndjson_and_sse_streams():
+    text = json.dumps(ANSWER, ensure_ascii=False)
+    deltas = [{"type": "delta", "text": text[i:i + 10]} for i in range(0, len(text), 10)]
+    done = {"type": "done", "chat_id": 7}
+    formats = {
+        "application/x-ndjson": [json.dumps(e) + "\n" for e in deltas + [done]],
+        "text/event-stream": [": keep-alive\n\n"] + [f"data: {json.dumps(e)}\n\n" for e in deltas + [done]],
+    }
+    for content_type, lines in formats.items():
+        summary, files = [], []
+        with _stream_response(content_type, lines) as resp:
+            result = read_streamed_response(resp, summary.append, files.append)
+        assert result == {"chat_id": 7, "assistant_response": ANSWER}
+        assert "".join(summary) == ANSWER["answer_summary"]
+        assert files == ANSWER["source_files"]
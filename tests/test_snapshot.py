@@ -0,0 +1,203 @@
+import errno
+import json
+import shutil
+
+import pytest
+
+from aye import config, snapshot, snapshot_link, snapshot_pack, snapshot_store
+
+
+@pytest.fixture
+def snap_root(tmp_path, monkeypatch):
+    root = tmp_path / ".aye" / "snapshots"
+    monkeypatch.setattr(snapshot, "SNAP_ROOT", root)
+    monkeypatch.setattr(snapshot, "LATEST_SNAP_DIR", root / "latest")
+    return root
+
+
+def test_batches_reference_deduplicated_objects(tmp_path, snap_root):
+    a, b = tmp_path / "a.py", tmp_path / "b.py"
+    a.write_text("x = 1\n" * 500)
+    b.write_text("x = 1\n" * 500)  # Same content as a.py
+
+    snapshot.apply_updates([{"file_name": str(a), "file_content": "x = 2\n"},
+                            {"file_name": str(b), "file_content": "x = 2\n"}])
+    a.write_text("x = 1\n" * 500)
+    assert snapshot.create_snapshot([a]) == ""  # Same as in the latest batch
+    a.write_text("x = 2\n")
+    snapshot.apply_updates([{"file_name": str(a), "file_content": "x = 1\n" * 500}])
+
+    objects = [p for p in (snap_root / "objects").rglob("*") if p.is_file()]
+    assert len(objects) == 2  # "x = 1" * 500 once, "x = 2" once
+    assert sum(p.stat().st_size for p in objects) < 200  # Compressed
+    assert not (snap_root / "latest").exists()
+    batches = sorted(p for p in snap_root.iterdir() if p.name != "objects")
+    assert [p.name for p in batches[0].iterdir()] == ["metadata.json"]
+
+    history = snapshot.list_snapshots(a)
+    assert [snapshot.snapshot_content(entry) for _, entry in history] == ["x = 2\n", "x = 1\n" * 500]
+    snapshot.restore_snapshot(history[0][0].split("_")[0])
+    assert a.read_text() == "x = 2\n"
+    snapshot.restore_snapshot(history[1][0].split("_")[0], "a.py")
+    assert a.read_text() == "x = 1\n" * 500
+
+
+def test_migrate_moves_copies_into_the_object_store(tmp_path, snap_root):
+    src = tmp_path / "m.py"
+    src.write_text("current\n")
+    old, older = "old\n" * 300, "older\n" * 300
+    for ordinal, content in ((1, old), (2, old), (3, older)):
+        batch = snap_root / f"{ordinal:03d}_20250101T00000{ordinal}"
+        batch.mkdir(parents=True)
+        (batch / "m.py").write_text(content)
+        meta = {"timestamp": batch.name.split("_")[1],
+                "files": [{"original": str(src), "snapshot": str(batch / "m.py")}]}
+        (batch / "metadata.json").write_text(json.dumps(meta))
+    (snap_root / "latest").mkdir()
+    (snap_root / "latest" / "m.py").write_text(older)
+
+    migrated, before, after = snapshot.migrate_snapshots()
+    assert migrated == 3 and after < before
+    assert snapshot.migrate_snapshots()[0] == 0  # Idempotent
+    assert not (snap_root / "latest").exists()
+    assert len([p for p in (snap_root / "objects").rglob("*") if p.is_file()]) == 2
+    snapshot.restore_snapshot("001")
+    assert src.read_text() == old
+
+    assert snapshot.prune_snapshots(1) == 2
+    assert [snapshot.snapshot_content(e) for _, e in snapshot.list_snapshots(src)] == [older]
+
+
+def test_index_tracks_batches_and_external_changes(tmp_path, snap_root):
+    src = tmp_path / "f.py"
+    src.write_text("v0\n")
+    for i in range(1, 1002):  # Ordinals past 999 keep sorting numerically
+        snapshot.apply_updates([{"file_name": str(src), "file_content": f"v{i}\n"}])
+    assert snapshot._index().latest()[1].startswith("1001_")
+    history = snapshot.list_snapshots(src)
+    assert len(history) == 1001 and snapshot.snapshot_content(history[0][1]) == "v1000\n"
+    snapshot.restore_snapshot("1000")
+    assert src.read_text() == "v999\n"
+
+    # Batches deleted behind the index's back are noticed without a reindex
+    shutil.rmtree(snap_root / history[0][0])
+    assert snapshot._index().latest()[0] == 1000
+    assert len(snapshot.list_snapshots(src)) == 1000
+
+    snapshot._index().close()
+    (snap_root / "index" / "snapshots.sqlite").unlink()
+    assert snapshot.reindex_snapshots() == 1000
+    assert snapshot.prune_snapshots(2) == 998
+    assert [name.split("_")[0] for name, _ in snapshot.list_snapshots(src)] == ["1000", "999"]
+
+
+def test_reverse_deltas_keep_newest_full_and_bound_chains(tmp_path, snap_root, monkeypatch):
+    monkeypatch.setitem(config._config, "snapshot_delta_depth", 2)
+    src = tmp_path / "big.py"
+    lines = [f"line {i} {i * 7919 % 10007}\n" for i in range(3000)]
+    versions = ["".join(lines)]
+    src.write_text(versions[0])
+    for turn in range(1, 8):
+        lines[turn * 300] = f"# edited in turn {turn}\n"
+        versions.append("".join(lines))
+        snapshot.apply_updates([{"file_name": str(src), "file_content": versions[-1]}])
+
+    store = snapshot._store()
+    history = snapshot.list_snapshots(src)
+    assert [snapshot.snapshot_content(e) for _, e in history] == versions[-2::-1]
+    chains = []
+    for _, entry in history:
+        digest, depth = entry["blob"], 0
+        while store.base_of(digest) is not None:
+            digest, depth = store.base_of(digest), depth + 1
+        chains.append(depth)
+    assert chains == [0, 0, 1, 2, 0, 1, 2]  # Newest full; keyframes stop chains at 2
+    snapshot.restore_snapshot("002")
+    assert src.read_text() == versions[1]
+
+    # Pruning the batches that reference a delta's base must keep the base
+    snapshot.prune_snapshots(1)
+    monkeypatch.setattr(snapshot_store, "GC_GRACE_SECONDS", -1)
+    snapshot_store.collect_garbage(snap_root)
+    assert snapshot.snapshot_content(snapshot.list_snapshots(src)[0][1]) == versions[-2]
+
+
+def test_uncompressed_objects_are_cloned_and_capabilities_cached(tmp_path, snap_root, monkeypatch):
+    monkeypatch.setattr(snapshot_link, "_capabilities", {})
+    reflinks = []
+
+    def no_reflink(src, dst):
+        reflinks.append(src)
+        raise OSError(errno.EOPNOTSUPP, "reflink not supported")
+
+    monkeypatch.setattr(snapshot_link, "_reflink", no_reflink)
+    monkeypatch.setattr(snapshot_link, "fcntl", object())  # Pretend FICLONE is available
+    monkeypatch.setitem(config._config, "snapshot_compression", "none")
+    src = tmp_path / "r.py"
+    src.write_text("before\n")
+    snapshot.apply_updates([{"file_name": str(src), "file_content": "after\n"}])
+    snapshot.restore_snapshot("001")
+    assert src.read_text() == "before\n"
+    assert snapshot._store().raw_path(snapshot.list_snapshots(src)[0][1]["blob"]).read_text() == "before\n"
+    assert len(reflinks) == 1  # Learned once for this filesystem, not retried on restore
+
+    copy = tmp_path / "v1-copy.py"
+    copy.write_text("frozen\n")
+    assert snapshot_link.clone_file(copy, tmp_path / "linked.py", immutable=True) == "hardlink"
+    assert (tmp_path / "linked.py").stat().st_ino == copy.stat().st_ino
+    assert snapshot_link.clone_file(copy, tmp_path / "copied.py") == "copy"
+    assert len(reflinks) == 1
+
+
+def test_pack_moves_cold_batches_and_objects_into_a_readable_pack(tmp_path, snap_root, monkeypatch):
+    monkeypatch.setitem(config._config, "snapshot_delta_depth", 3)
+    src, other = tmp_path / "p.py", tmp_path / "q.py"
+    lines = [f"row {i} {i * 31 % 997}\n" for i in range(1000)]
+    versions = ["".join(lines)]
+    src.write_text(versions[0])
+    other.write_text("q0\n")
+    for turn in range(1, 13):
+        lines[turn * 50] = f"# turn {turn}\n"
+        versions.append("".join(lines))
+        snapshot.apply_updates([{"file_name": str(src), "file_content": versions[-1]},
+                                {"file_name": str(other), "file_content": f"q{turn}\n"}])
+    loose_before = len([p for p in (snap_root / "objects").rglob("*") if p.is_file()])
+
+    assert snapshot.pack_snapshots(keep=4)[0] == 8
+    assert sorted(p.name.split("_")[0] for p in snap_root.iterdir() if "_" in p.name) == ["009", "010", "011", "012"]
+    assert sorted(p.suffix for p in (snap_root / "packs").iterdir()) == [".idx", ".pack"]
+    assert len([p for p in (snap_root / "objects").rglob("*") if p.is_file()]) * 2 < loose_before
+    assert snapshot.pack_snapshots(keep=4)[0] == 0  # Nothing new is cold
+
+    history = snapshot.list_snapshots(src)
+    assert [snapshot.snapshot_content(e) for _, e in history] == versions[-2::-1]
+    snapshot.restore_snapshot("002")  # Packed batch, delta chain through packed objects
+    assert src.read_text() == versions[1] and other.read_text() == "q1\n"
+
+    packed_objects = len(snapshot_pack.load_packs(snap_root).packs[0].objects)
+    assert snapshot.prune_snapshots(6) == 6  # Drops packed batches from the pack index
+    snapshot.apply_updates([{"file_name": str(src), "file_content": versions[-1]}])
+    assert snapshot.pack_snapshots(keep=4, consolidate=True)[0] == 1  # Batch 009
+    assert len(list((snap_root / "packs").glob("*.idx"))) == 1
+    assert len(snapshot_pack.load_packs(snap_root).packs[0].objects) < packed_objects
+    assert snapshot.reindex_snapshots() == 7
+    assert [snapshot.snapshot_content(e) for _, e in snapshot.list_snapshots(src)] == \
+        [versions[1]] + versions[-2:5:-1]
+
+
+def test_restore_keeps_permissions_and_writes_through_symlinks(tmp_path, snap_root):
+    script, link = tmp_path / "run.sh", tmp_path / "run-link.sh"
+    script.write_text("#!/bin/sh\necho old\n")
+    script.chmod(0o755)
+    link.symlink_to(script)
+    mode = script.stat().st_mode
+
+    snapshot.apply_updates([{"file_name": str(script), "file_content": "#!/bin/sh\necho new\n"}])
+    entry = snapshot.list_snapshots(script)[0][1]
+    snapshot_store.restore_entry(snapshot._store(), entry, link)
+    assert link.is_symlink() and script.read_text() == "#!/bin/sh\necho old\n"
+    assert script.stat().st_mode == mode
+
+    script.unlink()  # Gone: the recorded mode is used
+    snapshot.restore_snapshot("001")
+    assert script.stat().st_mode == mode
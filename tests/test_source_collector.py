@@ -0,0 +1,280 @@
+import os
+
+from aye import source_collector
+from aye.source_cache import SourceCache
+from aye.source_collector import collect_sources
+
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+    # Push mtime into the past so the cache does not treat the file as racy
+    old = path.stat().st_mtime_ns - 10_000_000_000
+    os.utime(path, ns=(old, old))
+
+
+def test_collect_sources_basic(tmp_path):
+    _write(tmp_path / "a.py", "print('a')\n")
+    _write(tmp_path / "pkg" / "b.py", "print('b')\n")
+    _write(tmp_path / "notes.txt", "ignored by mask\n")
+
+    sources = collect_sources(str(tmp_path), "*.py")
+
+    assert sources == {"a.py": "print('a')\n", "pkg/b.py": "print('b')\n"}
+
+
+def test_cache_reuses_unchanged_files(tmp_path, monkeypatch):
+    _write(tmp_path / "a.py", "one\n")
+    _write(tmp_path / "b.py", "two\n")
+    cache = SourceCache(tmp_path / ".aye" / "source_cache.json")
+
+    first = collect_sources(str(tmp_path), "*.py", cache=cache)
+    assert len(cache) == 2
+
+    # Any read on the second pass would mean the cache was bypassed
+    reads = []
+    original_read_file = source_collector._read_file
+    monkeypatch.setattr(source_collector, "_read_file",
+                        lambda path, *a: reads.append(path) or original_read_file(path, *a))
+    second = collect_sources(str(tmp_path), "*.py", cache=cache)
+    assert second == first
+    assert reads == []
+
+
+def test_cache_detects_changes_and_persists(tmp_path):
+    cache_file = tmp_path / ".aye" / "source_cache.json"
+    _write(tmp_path / "a.py", "one\n")
+    _write(tmp_path / "b.py", "two\n")
+
+    cache = SourceCache(cache_file)
+    collect_sources(str(tmp_path), "*.py", cache=cache)
+    cache.save()
+
+    _write(tmp_path / "a.py", "changed\n")
+    (tmp_path / "b.py").unlink()
+
+    reloaded = SourceCache(cache_file)
+    assert len(reloaded) == 2
+    sources = collect_sources(str(tmp_path), "*.py", cache=reloaded)
+    assert sources == {"a.py": "changed\n"}
+    assert len(reloaded) == 1
+
+
+def test_walk_prunes_ignored_and_hidden_dirs(tmp_path, monkeypatch):
+    _write(tmp_path / ".gitignore", "node_modules/\n")
+    _write(tmp_path / "app.py", "a\n")
+    _write(tmp_path / "web" / "main.js", "b\n")
+    _write(tmp_path / "node_modules" / "dep" / "index.js", "c\n")
+    _write(tmp_path / ".venv" / "lib" / "site.py", "d\n")
+
+    scanned = []
+    original_scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda p: scanned.append(os.path.basename(p)) or original_scandir(p))
+
+    sources = collect_sources(str(tmp_path), "*.py, *.js")
+
+    assert sources == {"app.py": "a\n", "web/main.js": "b\n"}
+    assert "node_modules" not in scanned
+    assert ".venv" not in scanned
+
+
+def test_mask_with_directory_component(tmp_path):
+    _write(tmp_path / "tests" / "test_a.py", "t\n")
+    _write(tmp_path / "pkg" / "tests" / "test_b.py", "u\n")
+    _write(tmp_path / "pkg" / "mod.py", "m\n")
+
+    sources = collect_sources(str(tmp_path), "tests/*.py")
+
+    assert sorted(sources) == ["pkg/tests/test_b.py", "tests/test_a.py"]
+
+
+def test_parallel_read_is_deterministic(tmp_path):
+    for i in range(40):
+        _write(tmp_path / f"d{i % 5}" / f"m{i}.py", f"x = {i}\n")
+
+    serial = collect_sources(str(tmp_path), "*.py", max_workers=1)
+    parallel = collect_sources(str(tmp_path), "*.py", max_workers=8)
+
+    assert list(parallel.items()) == list(serial.items())
+    assert list(serial) == sorted(serial)
+
+
+def test_size_caps_binary_sniffing_and_budget(tmp_path):
+    _write(tmp_path / "a.py", "a" * 100)
+    _write(tmp_path / "b.py", "b" * 100)
+    _write(tmp_path / "c.py", "c" * 100)
+    _write(tmp_path / "big.py", "x" * 5000)
+    (tmp_path / "blob.py").write_bytes(b"\x00\x01binary")
+    (tmp_path / "latin.py").write_bytes("caf\xe9".encode("latin-1"))
+
+    skipped = {}
+    sources = collect_sources(str(tmp_path), "*.py", max_file_bytes=1000,
+                              max_total_bytes=250, skipped=skipped)
+
+    assert sorted(sources) == ["a.py", "b.py"]
+    assert skipped == {
+        "big.py": source_collector.SKIP_TOO_LARGE,
+        "blob.py": source_collector.SKIP_BINARY,
+        "c.py": source_collector.SKIP_OVER_BUDGET,
+        "latin.py": source_collector.SKIP_NON_UTF8,
+    }
+
+
+def test_rejected_files_give_their_budget_back(tmp_path):
+    (tmp_path / "a.py").write_bytes(b"\x00" * 100)
+    _write(tmp_path / "b.py", "b" * 100)
+    _write(tmp_path / "c.py", "c" * 40)
+    cache = SourceCache(tmp_path / "cache.json")
+
+    for _turn in range(2):  # Same selection once the cache knows a.py is binary
+        skipped, streamed = {}, []
+        sources = collect_sources(str(tmp_path), "*.py", max_total_bytes=150, skipped=skipped,
+                                  cache=cache, on_source=lambda path, _: streamed.append(path))
+        assert sorted(sources) == ["b.py", "c.py"]
+        assert sorted(streamed) == ["b.py", "c.py"]
+        assert skipped == {"a.py": source_collector.SKIP_BINARY}
+
+
+def test_large_files_are_collected_as_lazy_references(tmp_path):
+    from aye.lazy_source import LazySource
+    from aye.source_cache import content_hash
+
+    text = "line\r\n" * 40000
+    _write(tmp_path / "big.py", text)
+    _write(tmp_path / "small.py", "x = 1\n")
+    (tmp_path / "big_latin.py").write_bytes(b"a" * 300000 + "\xe9".encode("latin-1"))
+    cache = SourceCache(tmp_path / ".aye" / "source_cache.json")
+
+    skipped = {}
+    sources = collect_sources(str(tmp_path), "*.py", cache=cache, lazy_bytes=1000, skipped=skipped)
+    assert skipped == {"big_latin.py": source_collector.SKIP_NON_UTF8}
+    assert sources["small.py"] == "x = 1\n"
+    lazy = sources["big.py"]
+    assert isinstance(lazy, LazySource)
+    assert lazy.read() == text.replace("\r\n", "\n")
+    assert lazy.sha256 == content_hash(lazy.read())
+
+    again = collect_sources(str(tmp_path), "*.py", cache=cache, lazy_bytes=1000, skipped={})
+    assert again["big.py"].sha256 == lazy.sha256
+
+
+def test_skip_summary_is_printed_once(tmp_path, capsys):
+    for i in range(3):
+        (tmp_path / f"bin{i}.py").write_bytes(b"\x00" * 10)
+
+    collect_sources(str(tmp_path), "*.py")
+
+    out = capsys.readouterr().out
+    assert out.count("Skipped 3 file(s)") == 1
+
+
+def test_watcher_follows_changes(tmp_path):
+    from aye.source_watcher import SourceWatcher
+
+    _write(tmp_path / "a.py", "one\n")
+    _write(tmp_path / ".gitignore", "build/\n")
+    cache = SourceCache(tmp_path / ".aye" / "source_cache.json")
+    watcher = SourceWatcher(tmp_path, "*.py", cache, poll_interval=0.05).start()
+    try:
+        assert watcher.get_sources() == {"a.py": "one\n"}
+
+        (tmp_path / "a.py").write_text("two\n")
+        (tmp_path / "pkg").mkdir()
+        (tmp_path / "pkg" / "b.py").write_text("new\n")
+        (tmp_path / "build").mkdir()
+        (tmp_path / "build" / "gen.py").write_text("ignored\n")
+
+        assert watcher.get_sources() == {"a.py": "two\n", "pkg/b.py": "new\n"}
+        assert watcher.read_current(tmp_path / "pkg" / "b.py") in (None, "new\n")
+
+        (tmp_path / "a.py").unlink()
+        assert watcher.get_sources() == {"pkg/b.py": "new\n"}
+    finally:
+        watcher.stop()
+
+
+def test_watcher_reports_the_same_sources_and_skips_as_a_collection(tmp_path, monkeypatch):
+    from aye import config
+    from aye.source_watcher import SourceWatcher
+
+    monkeypatch.setitem(config._config, "max_total_bytes", 30)
+    _write(tmp_path / "a.py", "a = 1\n")
+    _write(tmp_path / "b.py", "b" * 40 + "\n")
+    _write(tmp_path / "bin.py", "\0\1")
+    _write(tmp_path / "c.py", "c = 1\n")
+    cache = SourceCache(tmp_path / ".aye" / "source_cache.json")
+    watcher = SourceWatcher(tmp_path, "*.py", cache, poll_interval=0.05).start()
+    try:
+        collected, watched = {}, {}
+        expected = collect_sources(str(tmp_path), "*.py", skipped=collected)
+        assert watcher.get_sources(skipped=watched) == expected == {"a.py": "a = 1\n", "c.py": "c = 1\n"}
+        assert watched == collected == {"b.py": "over total budget", "bin.py": "binary"}
+    finally:
+        watcher.stop()
+
+
+def test_git_index_backend_matches_walk_and_reuses_blobs(tmp_path, monkeypatch):
+    import subprocess
+
+    def git(*args):
+        subprocess.run(["git", *args], cwd=tmp_path, check=True, capture_output=True)
+
+    _write(tmp_path / "a.py", "tracked\n")
+    _write(tmp_path / "pkg" / "b.py", "also tracked\n")
+    _write(tmp_path / ".gitignore", "*.log\n")
+    git("init", "-q")
+    git("add", "-A")
+    _write(tmp_path / "new.py", "untracked\n")
+    _write(tmp_path / "debug.log", "ignored\n")
+
+    walked = collect_sources(str(tmp_path), "*.py,*.log", backend="walk")
+    indexed = collect_sources(str(tmp_path), "*.py,*.log", backend="git")
+    assert indexed == walked == {"a.py": "tracked\n", "new.py": "untracked\n", "pkg/b.py": "also tracked\n"}
+
+    cache = SourceCache(tmp_path / ".aye" / "source_cache.json")
+    collect_sources(str(tmp_path), "*.py", cache=cache, backend="git")
+
+    # New mtime, same content: the refreshed index still vouches for the blob
+    earlier = (tmp_path / "a.py").stat().st_mtime_ns - 5_000_000_000
+    (tmp_path / "a.py").write_text("tracked\n")
+    os.utime(tmp_path / "a.py", ns=(earlier, earlier))
+    git("update-index", "--refresh")
+    reads = []
+    original_read_file = source_collector._read_file
+    monkeypatch.setattr(source_collector, "_read_file",
+                        lambda path, *a: reads.append(path) or original_read_file(path, *a))
+    again = collect_sources(str(tmp_path), "*.py", cache=cache, backend="git")
+    assert again == indexed
+    assert reads == []
+
+
+def test_git_backend_lists_only_directories_modified_since_last_scan(tmp_path, monkeypatch):
+    import subprocess
+
+    _write(tmp_path / "a.py", "tracked\n")
+    _write(tmp_path / "pkg" / "b.py", "tracked\n")
+    _write(tmp_path / "pkg" / "sub" / "c.py", "tracked\n")
+    subprocess.run(["git", "init", "-q"], cwd=tmp_path, check=True)
+    subprocess.run(["git", "add", "-A"], cwd=tmp_path, check=True)
+    _write(tmp_path / "pkg" / "new.py", "untracked\n")
+    for d in (tmp_path, tmp_path / "pkg", tmp_path / "pkg" / "sub"):
+        old = d.stat().st_mtime_ns - 10_000_000_000
+        os.utime(d, ns=(old, old))
+
+    listed = []
+    scandir = os.scandir
+    monkeypatch.setattr(source_collector.os, "scandir", lambda p: listed.append(p) or scandir(p))
+    first = collect_sources(str(tmp_path), "*.py", backend="git")
+    assert first == {"a.py": "tracked\n", "pkg/b.py": "tracked\n", "pkg/new.py": "untracked\n",
+                     "pkg/sub/c.py": "tracked\n"}
+    assert len(listed) == 3
+
+    # Unchanged tree: no directory is listed again
+    listed.clear()
+    assert collect_sources(str(tmp_path), "*.py", backend="git") == first
+    assert listed == []
+
+    # A file added to one directory: only that directory is listed again
+    (tmp_path / "pkg" / "sub" / "d.py").write_text("new\n")
+    assert collect_sources(str(tmp_path), "*.py", backend="git")["pkg/sub/d.py"] == "new\n"
+    assert listed == [str(tmp_path / "pkg" / "sub")]
@@ -0,0 +1,61 @@
+import json
+
+import httpx
+import pytest
+
+from aye.turn import TurnCancelled, TurnEngine
+
+
+def test_turn_streams_collected_files_and_reports_timings(tmp_path, monkeypatch):
+    from aye import api
+    from aye.service import process_chat_message
+
+    for i in range(20):
+        (tmp_path / f"m{i:02}.py").write_text(f"x = {i}\n")
+    (tmp_path / "m00.py").write_text("old = 1\n")
+    bodies = []
+
+    def handle(request):
+        # Negotiated gzip, but the tiny tree stays under compression_min_bytes
+        assert "Content-Encoding" not in request.headers
+        bodies.append(json.loads(request.read()))
+        answer = {"answer_summary": "done",
+                  "source_files": [{"file_name": str(tmp_path / "m00.py"), "file_content": "new = 1\n"},
+                                   {"file_name": str(tmp_path / "m01.py"), "file_content": "x = 1\n"}]}
+        return httpx.Response(200, json={"chat_id": 5, "assistant_response": json.dumps(answer)})
+
+    monkeypatch.setattr(api, "_auth_headers", lambda: {})
+    monkeypatch.setattr(api, "_server_encodings", {api.BASE_URL: ("gzip",)})
+    engine = TurnEngine()
+    monkeypatch.setattr(api, "_async_client", httpx.AsyncClient(transport=httpx.MockTransport(handle)))
+    monkeypatch.setattr(api, "_async_client_loop", None)
+    try:
+        result = process_chat_message("hi", None, tmp_path, "*.py", engine=engine)
+        client = api._async_client
+        process_chat_message("again", 5, tmp_path, "*.py", engine=engine)
+        assert api._async_client is client  # Kept alive between turns
+    finally:
+        engine.close()
+
+    assert sorted(bodies[0]["source_files"]) == [f"m{i:02}.py" for i in range(20)]
+    assert bodies[0]["source_files"]["m03.py"] == "x = 3\n"
+    assert result["new_chat_id"] == 5
+    assert [f["file_content"] for f in result["changed_files"]] == ["new = 1\n"]
+    assert set(result["timings"]) == {"collect", "upload", "wait", "response", "total"}
+
+
+def test_interrupted_turn_raises_turn_cancelled_and_engine_survives():
+    engine = TurnEngine()
+
+    async def interrupted():
+        raise KeyboardInterrupt
+
+    async def answer():
+        return 42
+
+    try:
+        with pytest.raises(TurnCancelled):
+            engine.run(interrupted())
+        assert engine.run(answer()) == 42
+    finally:
+        engine.close()